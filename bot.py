@@ -45,6 +45,7 @@ class CustomDiscordClient(discord.Client):
         self.command_guilds = command_guilds
         self.command_tree = app_commands.CommandTree(self)
         self.event_calendar = None
+        self.database_registry = None
 
         # Add copy pasta / meme commands
         if self.feature_tracker is not None and self.feature_tracker.isEnabled(
@@ -119,8 +120,9 @@ class CustomDiscordClient(discord.Client):
         # Add commands for the Database features.
         if self.feature_tracker is not None and self.feature_tracker.isEnabled(
                 'database'):
-            self.restaraunt_database = database.RestaurantDatabase()
-            for command_group in self.restaraunt_database.getDiscordCommands():
+            self.database_registry = database.DatabaseRegistry()
+            self.restaraunt_database = database.RestaurantDatabase(registry=self.database_registry)
+            for command_group in self.database_registry.getDiscordCommands():
                 self.command_tree.add_command(command_group, guilds=self.command_guilds)
 
         if self.feature_tracker is not None and self.feature_tracker.isEnabled('hockey_calendar'):
@@ -154,6 +156,9 @@ class CustomDiscordClient(discord.Client):
                                                        self.twitch_manager)
         if self.event_calendar is not None:
             self.event_calendar.start()
+        # Close the databases that aren't being used.
+        if self.database_registry is not None:
+            self.database_registry.start()
 
     async def on_message(self, message):
         if message.author == self.user:
@@ -12,6 +12,8 @@ import typing
 import re
 import logging
 
+import edit_distance
+
 ONE_TIME = 'One-Time'
 DAILY = 'Daily'
 WEEKLY = 'Weekly'
@@ -25,29 +27,11 @@ CHORES_FILENAME = 'data/chores.pickle'
 AUTOCOMPLETE_LIMIT = 25
 
 
-# TODO Move this to a central util file.
-def customEditDistance(v1, v2):
-    # Convert to lower case
-    v1 = v1.lower()
-    v2 = v2.lower()
-
-    # Swap the strings if v1 is longer.
-    if len(v1) > len(v2):
-        v1, v2 = v2, v1
-
-    best_score = None
-    for ind in range(0, len(v2) - len(v1) + 1):
-        this_score = 0
-        for c1, c2 in zip(v1, v2[ind:ind + len(v1)]):
-            # TODO handle special characters
-            if c1 != c2:
-                this_score += 1
-        if best_score is None or this_score < best_score:
-            best_score = this_score
-        if best_score == 0:
-            return best_score
-    return best_score
-
+EDIT_DISTANCE_OPTIONS = edit_distance.Options(
+    edit_distance_type=edit_distance.Options.CONTAINED,
+    char_distance_type=edit_distance.Options.CHAR_EQUALITY,
+    ignore_case=True,
+    ignore_accents=False)
 
 # TODO split this off into its own bot.
 class ChoreCalendarDiscordCommands(app_commands.Group):
@@ -172,17 +156,12 @@ class ChoreCalendarDiscordCommands(app_commands.Group):
     async def chore_autocomplete(
             self, interaction: discord.Interaction,
             current: str) -> typing.List[app_commands.Choice[str]]:
-        chores = await self.chore_calendar.getAllChores()
-        chores_with_score = [(customEditDistance(current, c.name), c)
-                             for c in chores]
-        chores_with_score.sort(key=lambda x: (x[0], x[1].name))
-
-        if len(chores_with_score) > AUTOCOMPLETE_LIMIT:
-            chores_with_score = chores_with_score[:AUTOCOMPLETE_LIMIT]
+        closest_chore_names = await self.chore_calendar.getClosestChoreNames(
+            current, AUTOCOMPLETE_LIMIT)
 
         chore_choices = [
-            app_commands.Choice(name=c.name, value=c.name)
-            for _, c in chores_with_score
+            app_commands.Choice(name=name, value=name)
+            for _, name in closest_chore_names
         ]
         return chore_choices
 
@@ -403,6 +382,9 @@ class ChoreCalendar:
         self.chores = {}  # Key is Chore.emote, and value is Chore
         self.cached_chore_list = None
         self.chores_lock = asyncio.Lock()
+        # Autocomplete index of the names of the chores in self.chores.
+        self.chore_name_index = edit_distance.AutocompleteIndex(
+            options=EDIT_DISTANCE_OPTIONS)
         self.chores_filename = CHORES_FILENAME
         self._loadChores()
 
@@ -485,6 +467,7 @@ class ChoreCalendar:
                 return False
 
             self.chores[new_chore.emote] = new_chore
+            self.chore_name_index.add(new_chore.name)
         logging.info("Release lock: addChore")
 
         if not skip_save:
@@ -496,6 +479,7 @@ class ChoreCalendar:
         async with self.chores_lock:
             self.cached_chore_list = None
             if chore.emote in self.chores:
+                self.chore_name_index.remove(self.chores[chore.emote].name)
                 del self.chores[chore.emote]
             else:
                 print("ERROR IN REMOVE CHORE! Problem with self.chore")
@@ -512,6 +496,16 @@ class ChoreCalendar:
             logging.info("Release lock: getAllChores")
             return self.cached_chore_list
 
+    # Returns a list of (edit distance, chore name) for the closest distinct chore names.
+    # The lock is only held to wait out any chore mutation in progress, not
+    # during the budgeted scan. The scan stops at the first change to the
+    # index's version, so it only ever reads the version that it started with.
+    async def getClosestChoreNames(self, current, limit):
+        async with self.chores_lock:
+            chore_name_index = self.chore_name_index
+        return await edit_distance.top_k_async(current, chore_name_index,
+                                               limit)
+
     async def postDailyUpdate(self, schedule_new_post=True, channel=None):
         if channel is None:
             channel = self.channel
@@ -604,6 +598,7 @@ class ChoreCalendar:
                 # If it is a one-time chore, delete it.
                 if completed_chore.chore_frequency.frequency == ONE_TIME:
                     del self.chores[str_reaction]
+                    self.chore_name_index.remove(completed_chore.name)
 
                 await self.discord_client.get_channel(self.channel).send(
                     'Marked chore as completed: {}'.format(
@@ -6,6 +6,8 @@ import os.path
 import re
 import typing
 
+import edit_distance
+
 CUSTOM_COMMAND_FILENAME = 'data/custom_commands.txt'
 
 
@@ -19,7 +21,10 @@ class CustomCommands(app_commands.Group):
     async def autocomplete(
             self, interaction: discord.Interaction,
             current: str) -> typing.List[app_commands.Choice[str]]:
-        return await self.custom_command_manager.commandAutocomplete(current)
+        return await self.custom_command_manager.commandAutocomplete(
+            current,
+            session_key=(interaction.user.id,
+                         interaction.command.qualified_name, 'name'))
 
     # Basic command to replay stuff
     @app_commands.command(name='command', description='Run a command!')
@@ -66,7 +71,10 @@ class CustomCommandsAdmin(app_commands.Group):
 
     async def autocomplete(self, interaction: discord.Interaction,
                            current: str):
-        return await self.custom_command_manager.commandAutocomplete(current)
+        return await self.custom_command_manager.commandAutocomplete(
+            current,
+            session_key=(interaction.user.id,
+                         interaction.command.qualified_name, 'name'))
 
     # Add / update command
     @app_commands.command(
@@ -128,6 +136,12 @@ class CustomCommandManager:
             NAME_RE_FORMAT, NAME_RE_FORMAT, NAME_RE_FORMAT, NAME_RE_FORMAT,
             NAME_RE_FORMAT))
 
+    EDIT_DISTANCE_OPTIONS = edit_distance.Options(
+        edit_distance_type=edit_distance.Options.CONTAINED,
+        char_distance_type=edit_distance.Options.CHAR_EQUALITY,
+        ignore_case=True,
+        ignore_accents=False)
+
     def __init__(self, filename=CUSTOM_COMMAND_FILENAME):
         self.filename = filename
 
@@ -136,6 +150,12 @@ class CustomCommandManager:
         self.commands = {}
         self.commands_lock = asyncio.Lock()
 
+        # Autocomplete index of the names in self.commands.
+        self.command_name_index = edit_distance.AutocompleteIndex(
+            options=CustomCommandManager.EDIT_DISTANCE_OPTIONS,
+            ngram_size=edit_distance.NGRAM_SIZE)
+        self.autocomplete_sessions = edit_distance.AutocompleteSessions()
+
         asyncio.run(self._loadCommands())
 
     def getDiscordCommands(self):
@@ -169,6 +189,7 @@ class CustomCommandManager:
                         if current_command.name not in self.commands:
                             self.commands[
                                 current_command.name] = current_command
+                            self.command_name_index.add(current_command.name)
                         else:
                             logging.info('Duplicate command name: %s',
                                          current_command.name)
@@ -193,6 +214,7 @@ class CustomCommandManager:
             if current_command is not None:
                 if current_command.name not in self.commands:
                     self.commands[current_command.name] = current_command
+                    self.command_name_index.add(current_command.name)
                 else:
                     logging.info('Duplicate command name: %s',
                                  current_command.name)
@@ -249,6 +271,7 @@ class CustomCommandManager:
                 msg = 'Command "{}" updated successfully'.format(command.name)
             else:
                 msg = 'Command "{}" added successfully'.format(command.name)
+                self.command_name_index.add(command.name)
             self.commands[command.name] = command
         await self._saveCommands()
         return True, msg
@@ -261,6 +284,7 @@ class CustomCommandManager:
         # Remove the command.
         async with self.commands_lock:
             del self.commands[name]
+            self.command_name_index.remove(name)
         await self._saveCommands()
         return True, 'Command "{}" removed successfully'.format(name)
 
@@ -271,49 +295,26 @@ class CustomCommandManager:
             else:
                 return None
 
-    def customEditDistance(v1, v2):
-        # Convert to lower case
-        v1 = v1.lower()
-        v2 = v2.lower()
-
-        # Swap the strings if v1 is longer.
-        if len(v1) > len(v2):
-            v1, v2 = v2, v1
-
-        best_score = None
-        for ind in range(0, len(v2) - len(v1) + 1):
-            this_score = 0
-            for c1, c2 in zip(v1, v2[ind:ind + len(v1)]):
-                # TODO handle special characters
-                if c1 != c2:
-                    this_score += 1
-            if best_score is None or this_score < best_score:
-                best_score = this_score
-            if best_score == 0:
-                return best_score
-        return best_score
-
     AUTOCOMPLETE_LIMIT = 25
 
-    async def commandAutocomplete(self, current):
+    # If session_key is set, then the work from the session's previous
+    # keystroke is reused. The lock is only held to read the index, not
+    # during the scan (see ChoreCalendar.getClosestChoreNames).
+    async def commandAutocomplete(self, current, session_key=None):
         async with self.commands_lock:
-            command_names = [
-                app_commands.Choice(name=n, value=n)
-                for n, _ in self.commands.items()
-            ]
-
-        command_edit_distace = {
-            n.name: CustomCommandManager.customEditDistance(n.name, current)
-            for n in command_names
-        }
-
-        command_names.sort(
-            key=lambda n: (command_edit_distace[n.name], n.name))
-
-        if len(command_names) > CustomCommandManager.AUTOCOMPLETE_LIMIT:
-            command_names = command_names[:CustomCommandManager.
-                                          AUTOCOMPLETE_LIMIT]
-        return command_names
+            command_name_index = self.command_name_index
+        if session_key is None:
+            closest_names = await edit_distance.top_k_async(
+                current, command_name_index,
+                CustomCommandManager.AUTOCOMPLETE_LIMIT)
+        else:
+            closest_names = await self.autocomplete_sessions.topKAsync(
+                session_key, current, command_name_index,
+                CustomCommandManager.AUTOCOMPLETE_LIMIT)
+
+        return [
+            app_commands.Choice(name=n, value=n) for _, n in closest_names
+        ]
 
 
 class Command:
@@ -1,24 +1,71 @@
 
 import asyncio
+import bisect
 from collections.abc import Callable
-import copy
+import csv
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import math
 import os.path
 import pickle
+import re
+import sqlite3
+import tempfile
 import traceback
 import typing
 import random
+import time
+
+import pytz
 
 import discord
 from discord import app_commands
+from discord.ext import tasks
 
 import edit_distance
 
 AUTOCOMPLETE_LIMIT = 25
+# Number of compiled query plans that each database keeps.
+QUERY_PLAN_CACHE_SIZE = 256
+# Number of records that are read from the database at a time when exporting it.
+EXPORT_BATCH_SIZE = 500
+AUTOCOMPLETE_OPTIONS = edit_distance.Options(
+    edit_distance_type = edit_distance.Options.WORD,
+    char_distance_type = edit_distance.Options.CHAR_KEYBORAD_DISTANCE,
+    ignore_case = True,
+)
 
 # Helper function for parsing comma separated lists to lists of strings.
 def parseDiscordList(discord_list: str, separator: str = ",") -> list[str]:
     return list(map(lambda v: v.strip(), discord_list.split(separator)))
 
+# Returns the limit combinations, with one value from each slot, that have the lowest total score, in order. Each slot
+# must be a list of (score, value) sorted by score. Combinations are generated lazily from a min heap of positions in
+# the slots, where each popped combination pushes the combinations that move one slot to its next value.
+def kBestCombinations(slots: list[list[(float, typing.Any)]], limit: int) -> list[tuple[typing.Any]]:
+    if any(len(slot) == 0 for slot in slots):
+        return []
+
+    first = (0,) * len(slots)
+    heap = [(sum(slot[0][0] for slot in slots), first)]
+    visited = {first}
+    combinations = []
+    while len(heap) > 0 and len(combinations) < limit:
+        total, positions = heapq.heappop(heap)
+        combinations.append(tuple(slot[position][1] for slot, position in zip(slots, positions)))
+        for i, (slot, position) in enumerate(zip(slots, positions)):
+            if position + 1 >= len(slot):
+                continue
+            next_positions = positions[:i] + (position + 1,) + positions[i+1:]
+            if next_positions in visited:
+                continue
+            visited.add(next_positions)
+            heapq.heappush(heap, (total + slot[position+1][0] - slot[position][0], next_positions))
+    return combinations
+
 
 # ----------------------------------------
 # |                                      |
@@ -26,20 +73,322 @@ def parseDiscordList(discord_list: str, separator: str = ",") -> list[str]:
 # |                                      |
 # ----------------------------------------
 
+# ----------------------------------------
+# Hours
+# ----------------------------------------
+
+# Times are in minutes since Monday 00:00, and intervals are [start, end).
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+DAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+DAY_ALIASES = {
+    'daily': DAY_NAMES,
+    'everyday': DAY_NAMES,
+    'weekdays': DAY_NAMES[:5],
+    'weekends': DAY_NAMES[5:],
+    'weds': ['wednesday'],
+}
+HOURS_CACHE = edit_distance.LruCache()
+
+_HOURS_ENTRY_REGEX = re.compile(r'^(?P<days>[a-z ,/&-]*?)\s*(?P<times>closed|open 24 hours|24 ?h(?:ours|rs)?|\d.*)?$')
+_TIME_RANGE_REGEX = re.compile(r'^(?P<start>\d{1,2}(?::\d{2})?\s*(?:am|pm)?)\s*(?:-|to)\s*(?P<end>\d{1,2}(?::\d{2})?\s*(?:am|pm)?)$')
+_TIME_REGEX = re.compile(r'^(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<suffix>am|pm)?$')
+
+def minuteOfWeek(t: datetime.datetime) -> int:
+    return t.weekday() * MINUTES_PER_DAY + t.hour * 60 + t.minute
+
+# Returns the days in a days string like "mon-fri", "sat & sun", or "weekdays", or None if it can't be parsed.
+def _parseDays(days_str: str) -> list[int] | None:
+    days = []
+    for token in re.split(r'\s*(?:,|/|&|\band\b|\s)\s*', re.sub(r'\s*-\s*', '-', days_str.strip())):
+        if token == '':
+            continue
+        if token in DAY_ALIASES:
+            days.extend(DAY_NAMES.index(day) for day in DAY_ALIASES[token])
+            continue
+        ends = []
+        for day_token in token.split('-'):
+            matching_days = [i for i, day in enumerate(DAY_NAMES) if len(day_token) >= 2 and day.startswith(day_token)]
+            if len(matching_days) != 1:
+                return None
+            ends.append(matching_days[0])
+        if len(ends) > 2:
+            return None
+        # Ranges can wrap around the week, e.g. "fri-mon".
+        first, last = ends[0], ends[-1]
+        days.extend((first + i) % 7 for i in range((last - first) % 7 + 1))
+    return days
+
+def _parseTime(time_str: str, suffix: str | None) -> int | None:
+    match = _TIME_REGEX.match(time_str.strip())
+    if match is None:
+        return None
+    hour = int(match.group('hour'))
+    minute = int(match.group('minute') or 0)
+    suffix = match.group('suffix') or suffix
+    if minute >= 60 or hour > 24 or (suffix is not None and not 1 <= hour <= 12):
+        return None
+    if suffix is not None:
+        hour = hour % 12 + (12 if suffix == 'pm' else 0)
+    return hour * 60 + minute
+
+# Returns the [start, end) minutes of the day of a time range like "11am-9pm", "11-9pm", "11-9", or "17:00-02:00".
+# Ranges that end at or before their start end on the next day.
+def _parseTimeRange(time_range_str: str) -> tuple[int, int] | None:
+    match = _TIME_RANGE_REGEX.match(time_range_str.strip())
+    if match is None:
+        return None
+    end_suffix = _TIME_REGEX.match(match.group('end').strip()).group('suffix')
+    end = _parseTime(match.group('end'), None)
+    start = _parseTime(match.group('start'), None)
+    if end_suffix is not None and _TIME_REGEX.match(match.group('start').strip()).group('suffix') is None:
+        # A start without am/pm, like "5-9pm", shares the end's unless that would start after the end, like "11-9pm".
+        start = _parseTime(match.group('start'), end_suffix)
+        if start is not None and end is not None and start > end:
+            start = _parseTime(match.group('start'), 'am' if end_suffix == 'pm' else 'pm')
+    if start is None or end is None:
+        return None
+    if end_suffix is None and ':' not in match.group('end') and start >= end and end + 12 * 60 > start:
+        # Without am/pm, "11-9" and "10-10" are more likely to close in the evening than the next morning.
+        end += 12 * 60
+    if end <= start:
+        end += MINUTES_PER_DAY
+    return start, end
+
+# Parses opening hours like "Mon-Fri 11am-9pm; Sat & Sun 10-2, 5-10pm; Tue closed" into sorted, disjoint
+# [start, end) minute of week intervals. Entries without days apply to every day, and days listed on their own apply to
+# the next times, e.g. "Sat, Sun 10-10". Returns () if the hours can't be parsed.
+def parseHours(hours: str) -> tuple[(int, int)]:
+    intervals = HOURS_CACHE.get(hours)
+    if intervals is None:
+        intervals = _parseHours(hours.lower().strip())
+        HOURS_CACHE.put(hours, intervals)
+    return intervals
+
+# Returns the union of the intervals that each of the hours are open, like for a REPEATED HOURS field.
+def hoursIntervals(hours_values: set[str]) -> tuple[(int, int)]:
+    return tuple(interval for hours in hours_values for interval in parseHours(hours))
+
+def _parseHours(hours: str) -> tuple[(int, int)]:
+    if hours in ('24/7', 'open 24/7', 'open 24 hours'):
+        return ((0, MINUTES_PER_WEEK),)
+
+    intervals = []
+    pending_days = []
+    for entry in re.split(r'[;,\n]', hours):
+        entry = entry.strip()
+        if entry == '':
+            continue
+        match = _HOURS_ENTRY_REGEX.match(entry)
+        if match is None:
+            return ()
+        days = _parseDays(match.group('days'))
+        if days is None:
+            return ()
+        if match.group('times') is None:
+            pending_days.extend(days)
+            continue
+        days = pending_days + days
+        pending_days = []
+        if len(days) == 0:
+            days = list(range(7))
+
+        times = match.group('times')
+        if times == 'closed':
+            continue
+        if not times[0].isdigit() or times.startswith('24h') or times.startswith('24 h'):
+            time_ranges = [(0, MINUTES_PER_DAY)]
+        else:
+            time_ranges = [_parseTimeRange(time_range) for time_range in re.split(r'&|\band\b', times)]
+            if None in time_ranges:
+                return ()
+        for day in days:
+            for start, end in time_ranges:
+                start += day * MINUTES_PER_DAY
+                end += day * MINUTES_PER_DAY
+                # Split intervals that wrap around the end of the week.
+                if end > MINUTES_PER_WEEK:
+                    intervals.append((0, end - MINUTES_PER_WEEK))
+                    end = MINUTES_PER_WEEK
+                intervals.append((start, end))
+    if len(pending_days) > 0:
+        return ()
+
+    # Merge the overlapping intervals.
+    merged = []
+    for start, end in sorted(intervals):
+        if len(merged) > 0 and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+# Index of the keys that have weekly intervals, to find the ones that contain a given minute of the week. The week is
+# split into segments at every interval boundary, and each segment has the set of keys whose intervals cover it, so a
+# lookup is a bisect.
+class WeeklyIntervalIndex:
+    def __init__(self):
+        self.boundaries = [0]
+        self.segment_keys: list[set[typing.Any]] = [set()]
+
+    # Makes minute the start of a segment, and returns the segment.
+    def _split(self, minute: int) -> int:
+        segment = bisect.bisect_right(self.boundaries, minute) - 1
+        if self.boundaries[segment] == minute:
+            return segment
+        self.boundaries.insert(segment + 1, minute)
+        self.segment_keys.insert(segment + 1, set(self.segment_keys[segment]))
+        return segment + 1
+
+    # Segments are never merged again, but there are at most MINUTES_PER_WEEK of them.
+    def add(self, key: typing.Any, intervals: tuple[(int, int)]):
+        for start, end in intervals:
+            first = self._split(start)
+            last = self._split(end) if end < MINUTES_PER_WEEK else len(self.boundaries)
+            for segment in range(first, last):
+                self.segment_keys[segment].add(key)
+
+    def remove(self, key: typing.Any, intervals: tuple[(int, int)]):
+        for start, end in intervals:
+            first = bisect.bisect_right(self.boundaries, start) - 1
+            last = bisect.bisect_left(self.boundaries, end)
+            for segment in range(first, last):
+                self.segment_keys[segment].discard(key)
+
+    def keysAt(self, minute: int) -> set[typing.Any]:
+        return self.segment_keys[bisect.bisect_right(self.boundaries, minute % MINUTES_PER_WEEK) - 1]
+
+
+# ----------------------------------------
+# Full text search
+# ----------------------------------------
+
+# BM25 parameters: how quickly repeats of a term stop counting, and how much long records are penalized.
+BM25_K1 = 1.2
+BM25_B = 0.75
+SEARCH_LIMIT = 10
+
+_TERM_REGEX = re.compile(r'\w+')
+
+# Splits text into lower case terms without accents, so "Phở, Vietnamese" has the terms "pho" and "vietnamese".
+def searchTerms(text: str) -> list[str]:
+    return _TERM_REGEX.findall(edit_distance.remove_accents(text.lower()))
+
+# Returns the terms of a map of field name to the field's distinct values.
+def fieldSearchTerms(field_values: dict[str, set[str]]) -> list[str]:
+    return [term for values in field_values.values() for value in values for term in searchTerms(value)]
+
+# Inverted index from each term to the keys that have it, ranked with BM25. Records are added and removed one at a
+# time, and the corpus statistics are kept up to date along with them.
+class TextIndex:
+    def __init__(self):
+        # Map of term to a map of each key with the term to the number of times that the key has it.
+        self.postings: dict[str, dict[typing.Any, int]] = {}
+        # Map of key to its number of terms.
+        self.lengths: dict[typing.Any, int] = {}
+        self.total_length = 0
+
+    def add(self, key: typing.Any, terms: list[str]):
+        self.lengths[key] = len(terms)
+        self.total_length += len(terms)
+        for term in terms:
+            postings = self.postings.setdefault(term, {})
+            postings[key] = postings.get(key, 0) + 1
+
+    # terms must be the same as when key was added.
+    def remove(self, key: typing.Any, terms: list[str]):
+        self.total_length -= self.lengths.pop(key)
+        for term in set(terms):
+            postings = self.postings[term]
+            del postings[key]
+            if len(postings) == 0:
+                del self.postings[term]
+
+    # Returns the best limit (score, key) for the terms, best first. Keys without any of the terms aren't returned.
+    def search(self, terms: list[str], limit: int = SEARCH_LIMIT) -> list[(float, typing.Any)]:
+        if len(self.lengths) == 0:
+            return []
+        num_keys = len(self.lengths)
+        average_length = self.total_length / num_keys
+        scores = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            idf = math.log(1.0 + (num_keys - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, count in postings.items():
+                length_norm = 1.0 - BM25_B + BM25_B * self.lengths[key] / average_length
+                scores[key] = scores.get(key, 0.0) + idf * count * (BM25_K1 + 1.0) / (count + BM25_K1 * length_norm)
+        best = heapq.nsmallest(limit, scores.items(), key=lambda entry: (-entry[1], entry[0]))
+        return [(score, key) for key, score in best]
+
+
 # Helper classes for the database
+
+# The fields of the records of a database, in the order that Record stores their values. All of the records of a
+# database share one schema.
+class RecordSchema:
+    def __init__(self, field_names: typing.Iterable[str], repeated_field_names: typing.Iterable[str] = ()):
+        self.field_names = tuple(field_names)
+        self.positions = {field_name: i for i, field_name in enumerate(self.field_names)}
+        self.repeated_field_names = frozenset(repeated_field_names)
+
+    # REPEATED values are stored as tuples, so records never share mutable values.
+    def freeze(self, field_name: str, field_value: typing.Any) -> typing.Any:
+        if field_name in self.repeated_field_names and isinstance(field_value, list):
+            return tuple(field_value)
+        return field_value
+
+    # fields must have exactly the fields of the schema.
+    def record(self, fields: dict[str, typing.Any]) -> 'Record':
+        return Record(self, tuple(self.freeze(field_name, fields[field_name]) for field_name in self.field_names))
+
+
+# An immutable row of field values. Changes are made with replace, which copies only the tuple of values.
 class Record:
-    def __init__(self, fields: dict[str, typing.Any]):
-        self.fields = fields
+    __slots__ = ('schema', 'values')
+
+    def __init__(self, schema: RecordSchema, values: tuple[typing.Any]):
+        self.schema = schema
+        self.values = values
+
+    def __getitem__(self, field_name: str) -> typing.Any:
+        return self.values[self.schema.positions[field_name]]
+
+    # A new dict of the fields, so changing it doesn't change the record.
+    @property
+    def fields(self) -> dict[str, typing.Any]:
+        return dict(zip(self.schema.field_names, self.values))
 
     def getKey(self, keys: tuple[str]) -> tuple[typing.Any]:
-        return tuple(map(lambda k: self.fields[k], keys))
+        return tuple(map(lambda k: self[k], keys))
+
+    # Returns a copy of the record with the given fields changed. The values of the other fields are shared.
+    def replace(self, **kwargs) -> 'Record':
+        values = list(self.values)
+        for field_name, field_value in kwargs.items():
+            values[self.schema.positions[field_name]] = self.schema.freeze(field_name, field_value)
+        return Record(self.schema, tuple(values))
+
+    def __getstate__(self) -> tuple[RecordSchema, tuple[typing.Any]]:
+        return self.schema, self.values
+
+    def __setstate__(self, state: tuple[RecordSchema, tuple[typing.Any]] | dict[str, typing.Any]):
+        if isinstance(state, dict):
+            # Records pickled before they had a schema only have their fields. DatabaseImpl moves them to its schema.
+            self.schema = RecordSchema(state['fields'])
+            self.values = tuple(state['fields'].values())
+        else:
+            self.schema, self.values = state
 
 
 class FieldType:
     INT = 'int'
     STR = 'str'
     ENUM = 'enum'
-    ALL_TYPES = [INT, STR, ENUM]
+    HOURS = 'hours'  # A free form str of opening hours, which is indexed by parseHours when it can be parsed
+    ALL_TYPES = [INT, STR, ENUM, HOURS]
 
     REQUIRED = 'required'  # field must be specfieid as the base_type
     OPTIONAL = 'optional'  # Field can be the base_type or None
@@ -66,27 +415,34 @@ class FieldType:
         # TODO Add a is_key field.
 
     # The enum field_type should directly know what its possible enum values are
-    def validate(self, value: typing.Any, enum_values: list[str] | None = None) -> bool:
-        if value is None:
-            return self.mode == FieldType.OPTIONAL
-
-        # Check INT types
-        if self.base_type == FieldType.INT:
-            if self.mode == FieldType.REPEATED:
-                return isinstance(value, list) and all(map(lambda v: isinstance(v, int), value))
-            return isinstance(value, int)
-        # Check STR types
-        if self.base_type == FieldType.STR:
-            if self.mode == FieldType.REPEATED:
-                return isinstance(value, list) and all(map(lambda v: isinstance(v, str), value))
-            return isinstance(value, str)
-        # Check ENUM types
+    def validate(self, value: typing.Any, enum_values: typing.Collection[str] | None = None) -> bool:
+        return self.compileValidator()(value, enum_values)
+
+    # Returns a function of (value, enum_values) that checks whether value is valid for this field type. The checks for
+    # the base_type and mode are picked once here, instead of for every value. enum_values should be a set, since every
+    # ENUM value is looked up in it.
+    def compileValidator(self) -> Callable[[typing.Any, typing.Collection[str] | None], bool]:
         if self.base_type == FieldType.ENUM:
-            if enum_values is None:
-                raise Exception(f'When validating field_type of "{self.enum_name}", unexpected enum_values: None')
-            if self.mode == FieldType.REPEATED:
-                return isinstance(value, list) and all(map(lambda v: v in enum_values, value))
-            return v in enum_values
+            enum_name = self.enum_name
+            def validValue(v: typing.Any, enum_values: typing.Collection[str] | None) -> bool:
+                if enum_values is None:
+                    raise Exception(f'When validating field_type of "{enum_name}", unexpected enum_values: None')
+                return isinstance(v, str) and v in enum_values
+        else:
+            value_type = int if self.base_type == FieldType.INT else str
+            def validValue(v: typing.Any, enum_values: typing.Collection[str] | None) -> bool:
+                return isinstance(v, value_type)
+
+        if self.mode == FieldType.REPEATED:
+            def validator(value: typing.Any, enum_values: typing.Collection[str] | None) -> bool:
+                return isinstance(value, (list, tuple)) and all(validValue(v, enum_values) for v in value)
+        else:
+            optional = self.mode == FieldType.OPTIONAL
+            def validator(value: typing.Any, enum_values: typing.Collection[str] | None) -> bool:
+                if value is None:
+                    return optional
+                return validValue(value, enum_values)
+        return validator
 
     def query(self, value: typing.Any, pos_values: list[typing.Any] | None) -> bool:
         if pos_values is None:
@@ -104,8 +460,125 @@ class FieldType:
             return value in pos_values
 
 
+# Search fields must be text, so that their values can be split into terms.
+def checkSearchFields(search_fields: tuple[str], record_struct: dict[str, FieldType]):
+    for field_name in search_fields:
+        if field_name not in record_struct:
+            raise Exception(f'Unknown search field "{field_name}".')
+        if record_struct[field_name].base_type not in (FieldType.STR, FieldType.HOURS, FieldType.ENUM):
+            raise Exception(f'Search field "{field_name}" is not a text field.')
+
+
+def recordSchema(record_struct: dict[str, FieldType]) -> RecordSchema:
+    return RecordSchema(
+        record_struct,
+        [field_name for field_name, field_type in record_struct.items() if field_type.mode == FieldType.REPEATED])
+
+
+# Query conditions for DatabaseImpl.query. A condition's shape is the structure of the condition without its values, and
+# conditions with the same shape share a compiled query plan. Plans read the values from the condition's leaves, which
+# are the AnyOf, Range and OpenAt conditions in the order they appear.
+
+# Matches records where the field has one of the values, or for REPEATED fields where any element does.
+class AnyOf:
+    def __init__(self, field_name: str, values: typing.Iterable[typing.Any]):
+        self.field_name = field_name
+        self.values = tuple(values)
+        self.value_set = frozenset(self.values)
+
+    def shape(self) -> tuple:
+        return ('any_of', self.field_name)
+
+    def leaves(self) -> list:
+        return [self]
+
+
+# Matches records where the INT field is between low and high inclusive, or for REPEATED fields where any element is.
+# Either bound can be None to leave that side open.
+class Range:
+    def __init__(self, field_name: str, low: int | None = None, high: int | None = None):
+        self.field_name = field_name
+        self.low = low
+        self.high = high
+
+    def shape(self) -> tuple:
+        return ('range', self.field_name, self.low is None, self.high is None)
+
+    def leaves(self) -> list:
+        return [self]
+
+
+# Matches records where the HOURS field is open at the minute of the week, see parseHours.
+class OpenAt:
+    def __init__(self, field_name: str, minute: int):
+        self.field_name = field_name
+        self.minute = minute % MINUTES_PER_WEEK
+
+    def shape(self) -> tuple:
+        return ('open_at', self.field_name)
+
+    def leaves(self) -> list:
+        return [self]
+
+
+class And:
+    def __init__(self, *conditions):
+        self.conditions = conditions
+
+    def shape(self) -> tuple:
+        return ('and',) + tuple(condition.shape() for condition in self.conditions)
+
+    def leaves(self) -> list:
+        return [leaf for condition in self.conditions for leaf in condition.leaves()]
+
+
+class Or:
+    def __init__(self, *conditions):
+        self.conditions = conditions
+
+    def shape(self) -> tuple:
+        return ('or',) + tuple(condition.shape() for condition in self.conditions)
+
+    def leaves(self) -> list:
+        return [leaf for condition in self.conditions for leaf in condition.leaves()]
+
+
+class Not:
+    def __init__(self, condition):
+        self.condition = condition
+
+    def shape(self) -> tuple:
+        return ('not', self.condition.shape())
+
+    def leaves(self) -> list:
+        return self.condition.leaves()
+
+
+# A compiled condition. match(record, leaves) checks a record, and keys(leaves) returns the keys of the records that can
+# match using the indexes, or None if every record has to be checked.
+class QueryPlan:
+    def __init__(self, match: Callable, keys: Callable):
+        self.match = match
+        self.keys = keys
+
+
+def _noKeys(leaves: list) -> None:
+    return None
+
+# The base type of the fields that each kind of leaf condition can be used on, if it is restricted.
+_LEAF_FIELD_TYPES = {
+    Range: FieldType.INT,
+    OpenAt: FieldType.HOURS,
+}
+
+
 # Main Database class
 class DatabaseImpl:
+    # Whether query is answered from in memory posting indexes.
+    USE_POSTING_INDEXES = True
+    # The attributes that are pickled. Everything else is derived from them, and is rebuilt on load.
+    PERSISTENT_FIELDS = ('name', 'records', 'keys', 'record_struct', 'schema', 'enums', 'search_fields', 'log_sequence')
+
     def __init__(
             self,
             name: str,
@@ -117,65 +590,302 @@ class DatabaseImpl:
             record_struct: dict[str, FieldType],
             # Map of enum name to enum values
             enums: dict[str, list[str]],
+            # Tuple of the text field names that search looks through
+            search_fields: tuple[str] = (),
     ):
         self.name = name
 
         # Validate that the keys appear in record_struct
         if not all(key in record_struct for key in keys):
             raise Exception('Invalid set of keys.')
+        checkSearchFields(search_fields, record_struct)
 
         self.keys = keys
         self.record_struct = record_struct
+        self.schema = recordSchema(record_struct)
         self.enums = enums
+        self.search_fields = search_fields
 
         # Map the records to their key
+        records = [self.makeRecord(record.fields) for record in records]
         self.records: dict[tuple[typing.Any], Record] = {record.getKey(self.keys): record for record in records}
 
+        self._compileValidators()
         for _, record in self.records.items():
             self.validateRecord(record)
 
-    # TODO have this return a str error which can either be raised or sent to the user.
-    def validateRecord(self, record: Record):
+        # Sequence number of the last mutation log entry applied to this database, see AsyncDatabaseWrapper.
+        self.log_sequence = 0
+
+        self._buildIndexes()
+
+    def __getstate__(self) -> dict[str, typing.Any]:
+        return {field: getattr(self, field) for field in DatabaseImpl.PERSISTENT_FIELDS}
+
+    def __setstate__(self, state: dict[str, typing.Any]):
+        self.__dict__.update(state)
+        # Databases saved before the mutation log was added haven't applied any of it.
+        self.__dict__.setdefault('log_sequence', 0)
+        # Databases saved before search was added don't search any fields.
+        self.__dict__.setdefault('search_fields', ())
+        if 'schema' not in state:
+            # Databases saved before records had a schema.
+            self.schema = recordSchema(self.record_struct)
+            self.records = {key: self.makeRecord(record.fields) for key, record in self.records.items()}
+        self._compileValidators()
+        self._buildIndexes()
+
+    # The validators are derived from record_struct and the enums, so like the indexes they are compiled again on load.
+    def _compileValidators(self):
+        # Map of field name to its (validator, enum name), see validateRecord.
+        self.field_validators = {
+            field_name: (field_type.compileValidator(), field_type.enum_name if field_type.base_type == FieldType.ENUM else None)
+            for field_name, field_type in self.record_struct.items()
+        }
+        # The values of each enum as a frozenset, for validation and membership checks. Rebuilt by _enumChanged.
+        self.enum_value_sets = {enum_name: frozenset(enum_values) for enum_name, enum_values in self.enums.items()}
+
+    def _buildIndexes(self):
+        self.enum_name_index = edit_distance.AutocompleteIndex(self.enums, AUTOCOMPLETE_OPTIONS)
+        self.enum_value_indexes = {
+            enum_name: edit_distance.AutocompleteIndex(enum_values, AUTOCOMPLETE_OPTIONS)
+            for enum_name, enum_values in self.enums.items()
+        }
+        # Autocomplete indexes of the distinct values of each STR field. The indexes count how many records have each
+        # value, so they always hold exactly the values that are in use.
+        self.field_value_indexes = {
+            field_name: edit_distance.AutocompleteIndex(options=AUTOCOMPLETE_OPTIONS, ngram_size=edit_distance.NGRAM_SIZE)
+            for field_name, field_type in self.record_struct.items()
+            if field_type.base_type in (FieldType.STR, FieldType.HOURS)
+        }
+        # Inverted indexes from each value of each STR and ENUM field to the keys of the records with that value.
+        self.posting_indexes: dict[str, dict[str, set[tuple[typing.Any]]]] = {
+            field_name: {}
+            for field_name, field_type in self.record_struct.items()
+            if field_type.base_type in (FieldType.STR, FieldType.HOURS, FieldType.ENUM) and self.USE_POSTING_INDEXES
+        }
+        # Sorted lists of (value, key) for each INT field, for range queries.
+        self.range_indexes: dict[str, list[(int, tuple[typing.Any])]] = {
+            field_name: []
+            for field_name, field_type in self.record_struct.items()
+            if field_type.base_type == FieldType.INT and self.USE_POSTING_INDEXES
+        }
+        # The opening hours of each HOURS field, for OpenAt queries.
+        self.interval_indexes: dict[str, WeeklyIntervalIndex] = {
+            field_name: WeeklyIntervalIndex()
+            for field_name, field_type in self.record_struct.items()
+            if field_type.base_type == FieldType.HOURS and self.USE_POSTING_INDEXES
+        }
+        # The terms of the search_fields of each record, for search.
+        self.text_index = TextIndex()
+        self._indexAllRecords()
+        # Plans refer to the indexes, so they are compiled again along with them.
+        self.query_plans = edit_distance.LruCache(QUERY_PLAN_CACHE_SIZE)
+        # The sessions refer to the indexes, so they are reset along with them.
+        self.autocomplete_sessions = edit_distance.AutocompleteSessions()
+
+    def _indexAllRecords(self):
+        for _, record in self.records.items():
+            self._indexRecord(record)
+
+    # Returns the distinct values of the field in record, so REPEATED fields have one per element and None has none.
+    def _fieldValues(self, record: Record, field_name: str) -> set[typing.Any]:
+        field_value = record[field_name]
+        if field_value is None:
+            return set()
+        if self.record_struct[field_name].mode == FieldType.REPEATED:
+            return set(field_value)
+        return {field_value}
+
+    # Returns the intervals that the HOURS field of the record is open, or the union of them for REPEATED fields.
+    def _recordIntervals(self, record: Record, field_name: str) -> tuple[(int, int)]:
+        return hoursIntervals(self._fieldValues(record, field_name))
+
+    # Returns the terms of the search_fields of the record.
+    def _searchTerms(self, record: Record) -> list[str]:
+        return fieldSearchTerms({field_name: self._fieldValues(record, field_name) for field_name in self.search_fields})
+
+    # Adds the record to all of the indexes.
+    def _indexRecord(self, record: Record):
+        for field_name, index in self.field_value_indexes.items():
+            for value in self._fieldValues(record, field_name):
+                index.add(value)
+        key = record.getKey(self.keys)
+        for field_name, postings in self.posting_indexes.items():
+            for value in self._fieldValues(record, field_name):
+                postings.setdefault(value, set()).add(key)
+        for field_name, index in self.range_indexes.items():
+            for value in self._fieldValues(record, field_name):
+                bisect.insort(index, (value, key))
+        for field_name, index in self.interval_indexes.items():
+            index.add(key, self._recordIntervals(record, field_name))
+        if len(self.search_fields) > 0:
+            self.text_index.add(key, self._searchTerms(record))
+
+    # Removes the record from all of the indexes.
+    def _unindexRecord(self, record: Record):
+        for field_name, index in self.field_value_indexes.items():
+            for value in self._fieldValues(record, field_name):
+                index.remove(value)
+        key = record.getKey(self.keys)
+        for field_name, postings in self.posting_indexes.items():
+            for value in self._fieldValues(record, field_name):
+                postings[value].discard(key)
+                if len(postings[value]) == 0:
+                    del postings[value]
+        for field_name, index in self.range_indexes.items():
+            for value in self._fieldValues(record, field_name):
+                del index[bisect.bisect_left(index, (value, key))]
+        for field_name, index in self.interval_indexes.items():
+            index.remove(key, self._recordIntervals(record, field_name))
+        if len(self.search_fields) > 0:
+            self.text_index.remove(key, self._searchTerms(record))
+
+    # Returns a record with the given fields, in the schema of the database.
+    def makeRecord(self, fields: dict[str, typing.Any]) -> Record:
         for key in self.keys:
-            if key not in record.fields:
+            if key not in fields:
                 # Record is missing a field that is required for the key.
                 raise Exception(f'DB "{self.name}": Record is missing key field "{key}"')
 
-        for field_name, field_type in self.record_struct.items():
-            if field_name not in record.fields:
+        for field_name in self.record_struct:
+            if field_name not in fields:
                 # Record is missing a field (Note that optional fields need to be specified but can be None).
                 raise Exception(f'DB "{self.name}": Record is missing required field "{field_name}"')
 
-            field_value = record.fields[field_name]
-            enum_values = None
-            if field_type.base_type == FieldType.ENUM:
-                if field_type.enum_name not in self.enums:
-                    # The enum of the field_type doesn't exist
-                    raise Exception(f'DB "{self.name}": Unknown enum "{field_type.enum_name}"')
-                enum_values = self.enums[field_type.enum_name]
-            if not field_type.validate(field_value, enum_values):
-                # Field value doesn't match field type
-                raise Exception(f'DB "{self.name}": Record has invalid value for field "{field_name}": {field_value}')
+        self._checkFieldNames(fields)
+        return self.schema.record(fields)
 
+    def _checkFieldNames(self, fields: typing.Iterable[str]):
         # Record has a field that it isn't supposed to
-        for field_name, _ in record.fields.items():
+        for field_name in fields:
             if field_name not in self.record_struct:
                 raise Exception(f'DB "{self.name}": Record has extra field "{field_name}"')
 
+    # TODO have this return a str error which can either be raised or sent to the user.
+    # Checks the fields with the validators compiled from record_struct. If field_names is set, then only those fields
+    # are checked, e.g. the ones that an update changed. If enum_value_sets is set, then it's used instead of
+    # self.enum_value_sets, e.g. to include enum values that are about to be added.
+    def validateRecord(self, record: Record, enum_value_sets: dict[str, typing.Collection[str]] | None = None, field_names: typing.Iterable[str] | None = None):
+        if enum_value_sets is None:
+            enum_value_sets = self.enum_value_sets
+        if field_names is None:
+            field_names = self.record_struct
+        for field_name in field_names:
+            validator, enum_name = self.field_validators[field_name]
+            enum_values = None
+            if enum_name is not None:
+                if enum_name not in enum_value_sets:
+                    # The enum of the field_type doesn't exist
+                    raise Exception(f'DB "{self.name}": Unknown enum "{enum_name}"')
+                enum_values = enum_value_sets[enum_name]
+            field_value = record[field_name]
+            if not validator(field_value, enum_values):
+                # Field value doesn't match field type
+                raise Exception(f'DB "{self.name}": Record has invalid value for field "{field_name}": {field_value}')
+
         # Everntyhing has been validated
 
+    # Must be called after every change to the values of an enum.
+    def _enumChanged(self, enum_name: str):
+        self.enum_value_sets[enum_name] = frozenset(self.enums[enum_name])
+
+    def getRecordByKey(self, key: tuple[typing.Any]) -> Record | None:
+        return self.records.get(key)
+
+    # In memory databases don't hold anything open.
+    def close(self):
+        pass
+
     def addRecord(self, **kwargs) -> (Record | None, str | None):
-        record = Record(kwargs)
+        record = self.makeRecord(kwargs)
         if record.getKey(self.keys) in self.records:
             key_str = ', '.join(record.getKey(self.keys))
             return None, f'Record with key "{key_str}" already exists'
         self.validateRecord(record)
         self.records[record.getKey(self.keys)] = record
+        self._indexRecord(record)
         return record, None
 
+    # Returns the records of the rows, and the values that they need to add to each enum. Each row is a dict of field name
+    # to value like the kwargs of addRecord, and they're checked in a single pass as they are read. Returns an error for
+    # the first invalid row. If create_enum_values is False, then enum values that don't exist yet are invalid.
+    def _prepareRecords(self, rows: typing.Iterable[dict[str, typing.Any]], create_enum_values: bool) -> (list[Record], dict[str, list[str]], str | None):
+        enum_value_sets = {enum_name: set(enum_values) for enum_name, enum_values in self.enums.items()}
+        new_enum_values = {enum_name: [] for enum_name in self.enums}
+        enum_fields = [
+            (field_name, field_type) for field_name, field_type in self.record_struct.items()
+            if field_type.base_type == FieldType.ENUM and field_type.enum_name in self.enums
+        ]
+        records = []
+        keys = set()
+        rows = iter(rows)
+        row_number = 0
+        try:
+            while True:
+                # Counted before reading, so that errors from reading the row have its number too.
+                row_number += 1
+                fields = next(rows, None)
+                if fields is None:
+                    break
+                record = self.makeRecord(fields)
+                key = record.getKey(self.keys)
+                if key in keys or self.getRecordByKey(key) is not None:
+                    key_str = ', '.join(map(str, key))
+                    raise Exception(f'Record with key "{key_str}" already exists')
+
+                if create_enum_values:
+                    for field_name, field_type in enum_fields:
+                        field_value = record[field_name]
+                        field_values = field_value if field_type.mode == FieldType.REPEATED else (field_value,)
+                        # Values of the wrong type are left for validateRecord to reject.
+                        if not isinstance(field_values, tuple):
+                            continue
+                        for value in field_values:
+                            if isinstance(value, str) and value not in enum_value_sets[field_type.enum_name]:
+                                enum_value_sets[field_type.enum_name].add(value)
+                                new_enum_values[field_type.enum_name].append(value)
+
+                self.validateRecord(record, enum_value_sets)
+                keys.add(key)
+                records.append(record)
+        except Exception as e:
+            return [], {}, f'Row {row_number}: {e}'
+        return records, {enum_name: values for enum_name, values in new_enum_values.items() if len(values) > 0}, None
+
+    # Adds the records of all of the rows, or none of them if any row is invalid. See _prepareRecords. Returns the number
+    # of records added.
+    def addRecords(self, rows: typing.Iterable[dict[str, typing.Any]], create_enum_values: bool = False) -> (int, str | None):
+        records, new_enum_values, err = self._prepareRecords(rows, create_enum_values)
+        if err is not None:
+            return 0, err
+        self._extendEnums(new_enum_values)
+        for record in records:
+            self.records[record.getKey(self.keys)] = record
+            self._indexRecord(record)
+        return len(records), None
+
+    # Appends the values to the in memory enums and their indexes.
+    def _extendEnums(self, new_enum_values: dict[str, list[str]]):
+        for enum_name, enum_values in new_enum_values.items():
+            self.enums[enum_name].extend(enum_values)
+            self._enumChanged(enum_name)
+            for enum_value in enum_values:
+                self.enum_value_indexes[enum_name].add(enum_value)
+
+    # Yields all of the records, batch_size at a time. The database must not change until it's done.
+    def recordBatches(self, batch_size: int = EXPORT_BATCH_SIZE) -> typing.Iterator[list[Record]]:
+        records = iter(self.records.values())
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if len(batch) == 0:
+                return
+            yield batch
+
     def removeRecordByKey(self, key: tuple[typing.Any]) -> str | None:
         if key not in self.records:
             return f'Record with key "{key}" does not exist'
+        self._unindexRecord(self.records[key])
         del self.records[key]
         return None
 
@@ -183,15 +893,12 @@ class DatabaseImpl:
         if key not in self.records:
             return None, f'Record with key "{key}" does not exist'
 
-        # Copy the record
-        new_record = copy.deepcopy(self.records[key])
+        # Copy the record with the updated fields.
+        self._checkFieldNames(kwargs)
+        new_record = self.records[key].replace(**kwargs)
 
-        # Update the copy
-        for field_name, field_value in kwargs.items():
-            new_record.fields[field_name] = field_value
-
-        # Validate the record
-        self.validateRecord(new_record)
+        # Validate the updated fields, the rest were validated when they were set.
+        self.validateRecord(new_record, field_names = kwargs)
 
         
         new_key = new_record.getKey(self.keys)
@@ -199,76 +906,221 @@ class DatabaseImpl:
             # If the key changed, check that the new key doesn't exist then remove the old version.
             if new_key in self.records:
                 return None, f'Record with key "{new_key}" already exists'
+        self._unindexRecord(self.records[key])
+        if new_key != key:
             del self.records[key]
         # Update the entry for the new record.
         self.records[new_key] = new_record
+        self._indexRecord(new_record)
         return new_record, None
         
     def addEnumValue(self, enum_name: str, enum_value: str) -> str | None:
         if enum_name not in self.enums:
             return f'Unknown enum "{enum_name}"'
-        if enum_value in self.enums[enum_name]:
+        if enum_value in self.enum_value_sets[enum_name]:
             return f'Enum value "{enum_value}" already exists in enum "{enum_name}"'
         self.enums[enum_name].append(enum_value)
+        self._enumChanged(enum_name)
+        self.enum_value_indexes[enum_name].add(enum_value)
+        return None
+
+    # Returns the fields that use the enum.
+    def _enumFields(self, enum_name: str) -> list[str]:
+        return [
+            field_name for field_name, field_type in self.record_struct.items()
+            if field_type.base_type == FieldType.ENUM and field_type.enum_name == enum_name
+        ]
+
+    # Returns a REQUIRED field that has enum_value in some record, or None if there isn't one.
+    def _requiredFieldUsing(self, enum_name: str, enum_value: str) -> str | None:
+        for field_name in self._enumFields(enum_name):
+            if self.record_struct[field_name].mode == FieldType.REQUIRED and enum_value in self.posting_indexes[field_name]:
+                return field_name
         return None
 
+    # Replaces each record whose field has value with replace_value(record[field_name]). The posting indexes are used as
+    # the reverse index from value to records, so only the affected records are touched.
+    def _replaceFieldValue(self, field_name: str, value: typing.Any, replace_value: Callable[[typing.Any], typing.Any]):
+        # Copy the keys, since the postings change as the records are replaced.
+        for key in list(self.posting_indexes[field_name].get(value, ())):
+            record = self.records[key]
+            self._unindexRecord(record)
+            self.records[key] = record.replace(**{field_name: replace_value(record[field_name])})
+            self._indexRecord(self.records[key])
+
+    # The value is removed from REPEATED fields and OPTIONAL fields are cleared. It can't be removed while a REQUIRED
+    # field still has it.
     def removeEnumValue(self, enum_name: str, enum_value: str) -> str | None:
         if enum_name not in self.enums:
             return f'Unknown enum "{enum_name}"'
-        if enum_value not in self.enums[enum_name]:
+        if enum_value not in self.enum_value_sets[enum_name]:
             return f'Enum value "{enum_value}" is not in enum "{enum_name}"'
-        
+        field_name = self._requiredFieldUsing(enum_name, enum_value)
+        if field_name is not None:
+            return f'Enum value "{enum_value}" is still used by field "{field_name}"'
+
         # Remove the enum value from the enum.
         self.enums[enum_name].remove(enum_value)
+        self._enumChanged(enum_name)
+        self.enum_value_indexes[enum_name].remove(enum_value)
 
-        # Remove the enum_value from all records
-        for _, record in self.records.items():
-            if enum_value in record.fields[enum_name]:
-                record.fields[enum_name].remove(enum_value)
+        # Remove the enum_value from the records that have it.
+        for field_name in self._enumFields(enum_name):
+            if self.record_struct[field_name].mode == FieldType.REPEATED:
+                self._replaceFieldValue(field_name, enum_value, lambda field_value: [v for v in field_value if v != enum_value])
+            else:
+                self._replaceFieldValue(field_name, enum_value, lambda field_value: None)
 
         return None
 
     def updateEnumValue(self, enum_name: str, old_enum_value: str, new_enum_value: str) -> str | None:
         if enum_name not in self.enums:
             return f'Unknown enum "{enum_name}"'
-        if old_enum_value not in self.enums[enum_name]:
+        if old_enum_value not in self.enum_value_sets[enum_name]:
             return f'Old enum value "{old_enum_value}" is not in enum "{enum_name}"'
-        if new_enum_value in self.enums[enum_name]:
+        if new_enum_value in self.enum_value_sets[enum_name]:
             return f'New enum value "{new_enum_value}" already exists in enum "{enum_name}"'
 
         # Update enum value in self.enums[enum_name]
-        for i in range(len(self.enums[enum_name])):
-            if self.enums[enum_name][i] == old_enum_value:
-                self.enums[enum_name][i] = new_enum_value
-
-        # Update all records that have the old_enum_value
-        for _, record in self.records.items():
-            if old_enum_value in record.fields[enum_name]:
-                for i in range(len(record.fields[enum_name])):
-                    if record.fields[enum_name][i] == old_enum_value:
-                        record.fields[enum_name][i] = new_enum_value
+        self.enums[enum_name][self.enums[enum_name].index(old_enum_value)] = new_enum_value
+        self._enumChanged(enum_name)
+        self.enum_value_indexes[enum_name].remove(old_enum_value)
+        self.enum_value_indexes[enum_name].add(new_enum_value)
+
+        # Update the records that have the old_enum_value.
+        for field_name in self._enumFields(enum_name):
+            if self.record_struct[field_name].mode == FieldType.REPEATED:
+                self._replaceFieldValue(
+                    field_name, old_enum_value,
+                    lambda field_value: [new_enum_value if v == old_enum_value else v for v in field_value])
+            else:
+                self._replaceFieldValue(field_name, old_enum_value, lambda field_value: new_enum_value)
 
         return None
 
-    def query(self, **kwargs) -> list[Record]:
-        rv = []
-
-        query_args = {}
-        for field_name, pos_values in kwargs.items():
-            if field_name not in self.record_struct:
-                raise Exception(f'DB "{self.name}": Unknown field name "{field_name}"')
-            query_args[field_name] = (pos_values, self.record_struct[field_name])
-
-        for _, record in self.records.items():
-            match = True
-            for field_name, (pos_values, field_type) in query_args.items():
-                if not field_type.query(record.fields[field_name], pos_values):
-                    match = False
-                    break
-            if match:
-                rv.append(record)
+    # Returns the records matching all of the conditions (AnyOf, Range, And, Or, Not). Each keyword argument field_name =
+    # values is short for AnyOf(field_name, values), and is skipped if values is None. If the indexes narrow down the
+    # records, then they are returned in key order, otherwise they're in insertion order.
+    def query(self, *conditions, **kwargs) -> list[Record]:
+        condition = And(*conditions, *(AnyOf(field_name, values) for field_name, values in kwargs.items() if values is not None))
+        for field_name in kwargs:
+            self._checkQueryField(field_name)
+        plan = self._queryPlan(condition)
+        leaves = condition.leaves()
+
+        keys = plan.keys(leaves)
+        if keys is None:
+            records = self.records.values()
+        else:
+            records = [self.records[key] for key in sorted(keys)]
+        return [record for record in records if plan.match(record, leaves)]
 
-        return rv
+    def _checkQueryField(self, field_name: str, base_type: str | None = None):
+        if field_name not in self.record_struct:
+            raise Exception(f'DB "{self.name}": Unknown field name "{field_name}"')
+        if base_type is not None and self.record_struct[field_name].base_type != base_type:
+            raise Exception(f'DB "{self.name}": Field "{field_name}" is not of type "{base_type}"')
+
+    # Returns the plan for the shape of condition, compiling it if it isn't cached.
+    def _queryPlan(self, condition) -> typing.Any:
+        plan_key = self._planKey(condition)
+        plan = self.query_plans.get(plan_key)
+        if plan is None:
+            plan, _ = self._compileQuery(condition, 0)
+            self.query_plans.put(plan_key, plan)
+        return plan
+
+    # Returns what the plans are cached by. The plans read the values from the leaves, so only the shape matters.
+    def _planKey(self, condition) -> tuple:
+        return condition.shape()
+
+    # Compiles condition, whose first leaf is leaves[leaf_index]. Returns the plan and the index of the next leaf.
+    def _compileQuery(self, condition, leaf_index: int) -> (QueryPlan, int):
+        if isinstance(condition, (AnyOf, Range, OpenAt)):
+            return self._compileLeaf(condition, leaf_index), leaf_index + 1
+
+        if isinstance(condition, Not):
+            plan, leaf_index = self._compileQuery(condition.condition, leaf_index)
+            return QueryPlan(lambda record, leaves: not plan.match(record, leaves), _noKeys), leaf_index
+
+        plans = []
+        for child in condition.conditions:
+            plan, leaf_index = self._compileQuery(child, leaf_index)
+            plans.append(plan)
+        matches = [plan.match for plan in plans]
+
+        if isinstance(condition, And):
+            # Only the children that can use the indexes narrow down the records.
+            keys_fns = [plan.keys for plan in plans if plan.keys is not _noKeys]
+            def keys(leaves: list) -> set | None:
+                key_sets = sorted((keys_fn(leaves) for keys_fn in keys_fns), key=len)
+                if len(key_sets) == 0:
+                    return None
+                return key_sets[0].intersection(*key_sets[1:])
+            return QueryPlan(lambda record, leaves: all(match(record, leaves) for match in matches), keys if len(keys_fns) > 0 else _noKeys), leaf_index
+
+        if isinstance(condition, Or):
+            # Every child must use the indexes, otherwise any record could match.
+            keys_fns = [plan.keys for plan in plans]
+            def keys(leaves: list) -> set | None:
+                return set().union(*(keys_fn(leaves) for keys_fn in keys_fns))
+            use_keys = all(keys_fn is not _noKeys for keys_fn in keys_fns)
+            return QueryPlan(lambda record, leaves: any(match(record, leaves) for match in matches), keys if use_keys else _noKeys), leaf_index
+
+        raise Exception(f'DB "{self.name}": Unknown query condition "{condition}"')
+
+    # The field's mode and position are looked up once here instead of for every record.
+    def _compileLeaf(self, condition, leaf_index: int) -> QueryPlan:
+        field_name = condition.field_name
+        self._checkQueryField(field_name, _LEAF_FIELD_TYPES.get(type(condition)))
+        position = self.schema.positions[field_name]
+        repeated = self.record_struct[field_name].mode == FieldType.REPEATED
+
+        if isinstance(condition, OpenAt):
+            def isOpen(hours: str | None, leaves: list) -> bool:
+                return hours is not None and any(start <= leaves[leaf_index].minute < end for start, end in parseHours(hours))
+            if repeated:
+                match = lambda record, leaves: any(isOpen(hours, leaves) for hours in record.values[position])
+            else:
+                match = lambda record, leaves: isOpen(record.values[position], leaves)
+            keys = _noKeys
+            if field_name in self.interval_indexes:
+                index = self.interval_indexes[field_name]
+                keys = lambda leaves: set(index.keysAt(leaves[leaf_index].minute))
+            return QueryPlan(match, keys)
+
+        if isinstance(condition, AnyOf):
+            if repeated:
+                match = lambda record, leaves: not leaves[leaf_index].value_set.isdisjoint(record.values[position])
+            else:
+                match = lambda record, leaves: record.values[position] is not None and record.values[position] in leaves[leaf_index].value_set
+            keys = _noKeys
+            if field_name in self.posting_indexes:
+                postings = self.posting_indexes[field_name]
+                keys = lambda leaves: set().union(*(postings.get(value, ()) for value in leaves[leaf_index].value_set))
+            return QueryPlan(match, keys)
+
+        def inRange(value: int | None, leaves: list) -> bool:
+            low, high = leaves[leaf_index].low, leaves[leaf_index].high
+            return value is not None and (low is None or low <= value) and (high is None or value <= high)
+        if repeated:
+            match = lambda record, leaves: any(inRange(value, leaves) for value in record.values[position])
+        else:
+            match = lambda record, leaves: inRange(record.values[position], leaves)
+        keys = _noKeys
+        if field_name in self.range_indexes:
+            index = self.range_indexes[field_name]
+            def keys(leaves: list) -> set:
+                low, high = leaves[leaf_index].low, leaves[leaf_index].high
+                start = 0 if low is None else bisect.bisect_left(index, low, key=lambda entry: entry[0])
+                end = len(index) if high is None else bisect.bisect_right(index, high, key=lambda entry: entry[0])
+                return set(key for _, key in index[start:end])
+        return QueryPlan(match, keys)
+
+    # Returns the best limit (score, record) for text, ranked with BM25 over the terms of the search_fields. Records that
+    # don't have any of the terms of text aren't returned.
+    def search(self, text: str, limit: int = SEARCH_LIMIT) -> list[(float, Record)]:
+        return [(score, self.getRecordByKey(key)) for score, key in self.text_index.search(searchTerms(text), limit)]
 
     def getEnumValuesFromFieldName(self, field_name: str) -> list[str]:
         if field_name not in self.record_struct:
@@ -285,91 +1137,58 @@ class DatabaseImpl:
 
         return self.enums[enum_name]
 
-    def autocompleteList(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
+    # Returns the best limit candidates in index for current, or the best found within budget seconds. If session_key is
+    # set, then the work from the session's previous keystroke is reused.
+    async def _topK(self, current: str, index: edit_distance.AutocompleteIndex, limit: int, session_key: typing.Hashable = None, budget: float = edit_distance.AUTOCOMPLETE_BUDGET) -> list[(float, str)]:
+        if session_key is None:
+            return await edit_distance.top_k_async(current, index, limit, budget = budget)
+        return await self.autocomplete_sessions.topKAsync(session_key, current, index, limit, budget = budget)
+
+    async def autocompleteList(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
         if field_name not in self.record_struct:
             raise Exception(f'DB "{self.name}": Unknown field name "{field_name}"')
         if self.record_struct[field_name].base_type == FieldType.ENUM:
-            pos_field_values = self.getEnumValuesFromFieldName(field_name)
+            index = self.enum_value_indexes[self.record_struct[field_name].enum_name]
+        elif field_name in self.field_value_indexes:
+            index = self.field_value_indexes[field_name]
         else:
-            # These can probably be cached.
-            pos_field_values = list(set(record.fields[field_name] for _, record in self.records.items() if record.fields[field_name] is not None))
+            raise Exception(f'DB "{self.name}": Field "{field_name}" does not support autocomplete')
+        # The index counts its candidates, so this is a ready made set of the possible values.
+        pos_field_values = index.counts
 
         # Split the current string by commas
         current_values = parseDiscordList(current)
 
         # If an entry is already an enum_value, then there is nothing to do for that entry
         # If an entry isn't an enum_value, then find the edit distance between the entry and all of the differnet enum_values
-        options = edit_distance.Options(
-            edit_distance_type = edit_distance.Options.WORD,
-            char_distance_type = edit_distance.Options.CHAR_KEYBORAD_DISTANCE,
-            ignore_case = True,
-        )
+        # All of the entries share one time budget.
+        deadline = time.monotonic() + edit_distance.AUTOCOMPLETE_BUDGET
         pos_values = []
-        for current_value in current_values:
+        for i, current_value in enumerate(current_values):
             if current_value in pos_field_values:
                 pos_values.append([(0.0, current_value)])
             else:
-                this_pos_values = []
-                for pos_field_value in pos_field_values:
-                    this_pos_values.append((edit_distance.compute(current_value, pos_field_value, options), pos_field_value))
-                this_pos_values.sort()
-                pos_values.append(this_pos_values)
-
-        # TODO use a min heap here instead of checking everything
-        current_indexes = [0] * len(pos_values)
-        sorted_combinations = []
-        while len(sorted_combinations) <= limit:
-            sorted_combinations.append(", ".join(map(lambda v: v[1], [vs[i] for i, vs in zip(current_indexes, pos_values)])))
-            increment_index = None
-            increment_value = None  # The minimum amount that would increase the combo total by incrementing one index.
-            for i, (ci, pvs) in enumerate(zip(current_indexes, pos_values)):
-                if ci >= len(pvs)-1:
-                    continue
-                if increment_value is None or pvs[ci+1][0]-pvs[ci][0] < increment_value:
-                    increment_index = i
-                    increment_value = pvs[ci+1][0]-pvs[ci][0]
+                # Only the best limit values for each entry can be part of the best limit combinations.
+                entry_session_key = None if session_key is None else (session_key, i)
+                budget = max(0.0, deadline - time.monotonic())
+                pos_values.append(await self._topK(current_value, index, limit, entry_session_key, budget))
 
-            if increment_index is None:
-                break
-            current_indexes[increment_index] += 1
+        return [", ".join(combination) for combination in kBestCombinations(pos_values, limit)]
 
-        return sorted_combinations
-
-    def autocompleteSingle(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
+    async def autocompleteSingle(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
         if field_name not in self.record_struct:
             raise Exception(f'DB "{self.name}": Unknown field name "{field_name}"')
-        pos_values = [record.fields[field_name] for _, record in self.records.items()]
-        options = edit_distance.Options(
-            edit_distance_type = edit_distance.Options.WORD,
-            char_distance_type = edit_distance.Options.CHAR_KEYBORAD_DISTANCE,
-            ignore_case = True,
-        )
-        weighted_values = [(edit_distance.compute(current, value, options), value) for value in pos_values]
-        # TODO Use a min heap instead of sorting the whole list.
-        return [value for _, value in sorted(weighted_values)[:limit]]
-
-    def autocompleteEnumNames(self, current: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
-        pos_values = [enum_name for enum_name, _ in self.enums.items()]
-        options = edit_distance.Options(
-            edit_distance_type = edit_distance.Options.WORD,
-            char_distance_type = edit_distance.Options.CHAR_KEYBORAD_DISTANCE,
-            ignore_case = True,
-        )
-        weighted_values = [(edit_distance.compute(current, value, options), value) for value in pos_values]
-        return [value for _, value in sorted(weighted_values)[:limit]]
-
-    def autocompleteEnumValues(self, current: str, enum_name: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
+        if field_name not in self.field_value_indexes:
+            raise Exception(f'DB "{self.name}": Field "{field_name}" does not support autocomplete')
+        return [value for _, value in await self._topK(current, self.field_value_indexes[field_name], limit, session_key)]
+
+    async def autocompleteEnumNames(self, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return [value for _, value in await self._topK(current, self.enum_name_index, limit, session_key)]
+
+    async def autocompleteEnumValues(self, current: str, enum_name: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
         if enum_name not in self.enums:
             raise Exception(f'DB "{self.name}": Unknown enum name "{enum_name}"')
-        pos_values = self.enums[enum_name]
-        options = edit_distance.Options(
-            edit_distance_type = edit_distance.Options.WORD,
-            char_distance_type = edit_distance.Options.CHAR_KEYBORAD_DISTANCE,
-            ignore_case = True,
-        )
-        weighted_values = [(edit_distance.compute(current, value, options), value) for value in pos_values]
-        # TODO Use a min heap instead of sorting the whole list.
-        return [value for _, value in sorted(weighted_values)[:limit]]
+        return [value for _, value in await self._topK(current, self.enum_value_indexes[enum_name], limit, session_key)]
 
 # Helpers for loading and saving a DatabaseImpl
 def loadDatabase(filenname) -> DatabaseImpl | None:
@@ -382,82 +1201,947 @@ def loadDatabase(filenname) -> DatabaseImpl | None:
 
 
 def saveDatabase(filename, database_impl):
-    f = open(filename, 'wb')
-    pickle.dump(database_impl, f)
+    writeDatabase(filename, pickle.dumps(database_impl))
+
+
+# Writes an already pickled database. Write to a temporary file and then replace the old one, so a crash can't leave a
+# partially written database.
+def writeDatabase(filename, data: bytes):
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+# Mutations are appended to a log next to the pickled database, and the database is only re-pickled once the log gets
+# this long.
+LOG_COMPACTION_ENTRIES = 1000
+# Seconds to wait before fsyncing the log, so that a burst of mutations shares a single fsync.
+LOG_FSYNC_DELAY = 1.0
+
+def logFilename(filename: str) -> str:
+    return filename + '.log'
+
+# Applies the entries of the mutation log that are newer than database_impl, and returns the number of entries in the
+# log. Each entry is a pickled (sequence, method name, args, kwargs) of a successful DatabaseImpl mutation.
+def replayLog(log_filename: str, database_impl: DatabaseImpl) -> int:
+    if not os.path.exists(log_filename):
+        return 0
+
+    num_entries = 0
+    with open(log_filename, 'r+b') as f:
+        end = 0
+        while True:
+            try:
+                sequence, method_name, args, kwargs = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                break
+            end = f.tell()
+            num_entries += 1
+            # Entries can already be in the database if it was saved but the log wasn't truncated before a crash.
+            if sequence > database_impl.log_sequence:
+                getattr(database_impl, method_name)(*args, **kwargs)
+                database_impl.log_sequence = sequence
+        # Drop a partially written entry, so new entries aren't appended after it.
+        f.truncate(end)
+    return num_entries
+
+
+# Bulk imports and exports are CSV or JSONL files, depending on their extension. Each line of a JSONL file is an object
+# of field name to value. CSV files have a header of the field names, and the values of REPEATED fields are separated by
+# CSV_LIST_SEPARATOR. In both, missing fields are None, or [] for REPEATED fields.
+CSV_LIST_SEPARATOR = '|'
+
+def isCsvFilename(filename: str) -> bool:
+    return filename.lower().endswith('.csv')
+
+def _csvValue(field_type: FieldType, cell: str) -> typing.Any:
+    # Values that aren't ints are left for validateRecord to reject.
+    if field_type.base_type == FieldType.INT and re.fullmatch(r'\s*-?\d+\s*', cell):
+        return int(cell)
+    return cell
+
+def _csvFieldValue(field_type: FieldType, cell: str | None) -> typing.Any:
+    if field_type.mode == FieldType.REPEATED:
+        if cell is None or cell.strip() == '':
+            return []
+        return [_csvValue(field_type, value) for value in parseDiscordList(cell, CSV_LIST_SEPARATOR)]
+    if cell is None or cell == '':
+        return None
+    return _csvValue(field_type, cell)
+
+def _csvCell(field_type: FieldType, field_value: typing.Any) -> str:
+    if field_value is None:
+        return ''
+    if field_type.mode == FieldType.REPEATED:
+        return CSV_LIST_SEPARATOR.join(map(str, field_value))
+    return str(field_value)
+
+# Yields the rows of the file one at a time, as dicts of field name to value for DatabaseImpl.addRecords. Fields that
+# aren't in record_struct are kept, so that addRecords rejects them.
+def readRecordFile(filename: str, record_struct: dict[str, FieldType]) -> typing.Iterator[dict[str, typing.Any]]:
+    with open(filename, 'r', newline='', encoding='utf-8') as f:
+        if isCsvFilename(filename):
+            for row in csv.DictReader(f):
+                fields = dict(row)
+                for field_name, field_type in record_struct.items():
+                    fields[field_name] = _csvFieldValue(field_type, row.get(field_name))
+                yield fields
+        else:
+            for line in f:
+                if line.strip() == '':
+                    continue
+                fields = json.loads(line)
+                if not isinstance(fields, dict):
+                    raise Exception(f'Expected a JSON object of field name to value, got: {line.strip()}')
+                for field_name, field_type in record_struct.items():
+                    fields.setdefault(field_name, [] if field_type.mode == FieldType.REPEATED else None)
+                yield fields
+
+# Writes records to a file one at a time. Like saveDatabase, the file is only replaced once all of them are written.
+class RecordFileWriter:
+    def __init__(self, filename: str, record_struct: dict[str, FieldType]):
+        self.filename = filename
+        self.record_struct = record_struct
+        self.file = open(filename + '.tmp', 'w', newline='', encoding='utf-8')
+        self.csv_writer = None
+        if isCsvFilename(filename):
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(record_struct)
+
+    def __enter__(self) -> 'RecordFileWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.filename + '.tmp', self.filename)
+
+    def write(self, record: Record):
+        if self.csv_writer is None:
+            self.file.write(json.dumps(record.fields, ensure_ascii = False) + '\n')
+        else:
+            self.csv_writer.writerow(
+                _csvCell(field_type, record[field_name]) for field_name, field_type in self.record_struct.items())
 
 
-# Wraps DatabaseImpl with a lock and async accessors.
+# Wraps DatabaseImpl with a lock and async accessors. If filename is None, then database_impl saves its own changes
+# (e.g. SqliteDatabaseImpl), otherwise it is pickled to filename along with a log of the mutations since.
+#
+# Only writers take the lock, so that they are applied and saved one at a time. Readers don't wait for it: every
+# DatabaseImpl mutation runs without awaiting, so between awaits readers always see the last published version of the
+# database, and records are immutable so the ones returned to them never change. Autocompletes span several awaits, but
+# their scans stop at the first change to the index they read, so they only use a single version of it.
 class AsyncDatabaseWrapper:
-    def __init__(self, database_impl: DatabaseImpl, filename: str):
+    def __init__(self, database_impl: DatabaseImpl, filename: str | None = None):
         self.database_impl = database_impl
         self.filename = filename
         self.lock = asyncio.Lock()
 
+        self.log_file = None
+        self.sync_task = None
+        if filename is not None:
+            self.log_filename = logFilename(filename)
+            self.log_entries = replayLog(self.log_filename, database_impl)
+            self.log_file = open(self.log_filename, 'ab')
+
+    # Appends a successful mutation to the log. Must be called while holding the lock.
+    async def _logMutation(self, method_name: str, *args, **kwargs):
+        if self.log_file is None:
+            return
+        self.database_impl.log_sequence += 1
+        pickle.dump((self.database_impl.log_sequence, method_name, args, kwargs), self.log_file)
+        self.log_file.flush()
+        self.log_entries += 1
+
+        if self.log_entries >= LOG_COMPACTION_ENTRIES:
+            await self._compactLog()
+        elif self.sync_task is None:
+            self.sync_task = asyncio.create_task(self._syncLog())
+
+    async def _syncLog(self):
+        await asyncio.sleep(LOG_FSYNC_DELAY)
+        # Mutations logged from here on need another fsync.
+        self.sync_task = None
+        await asyncio.to_thread(os.fsync, self.log_file.fileno())
+
+    # Saves the whole database and empties the log. Must be called while holding the lock. The database is pickled on
+    # the event loop, so that only the write to disk happens while readers keep using it.
+    async def _compactLog(self):
+        data = pickle.dumps(self.database_impl)
+        await asyncio.to_thread(writeDatabase, self.filename, data)
+        self.log_file.truncate(0)
+        self.log_entries = 0
+
+    # Waits for the log to be synced, then closes it and the database. Must be called while holding the lock, and the
+    # wrapper can't be used afterwards.
+    async def close(self):
+        if self.sync_task is not None:
+            await self.sync_task
+        if self.log_file is not None:
+            self.log_file.close()
+        self.database_impl.close()
+
     async def addRecord(self, **kwargs) -> (Record | None, str | None):
         async with self.lock:
             record, err = self.database_impl.addRecord(**kwargs)
             if err is None:
-                saveDatabase(self.filename, self.database_impl)
+                await self._logMutation('addRecord', **kwargs)
             return record, err
 
     async def removeRecordByKey(self, key: tuple[typing.Any]) -> str | None:
         async with self.lock:
             err = self.database_impl.removeRecordByKey(key)
             if err is None:
-                saveDatabase(self.filename, self.database_impl)
+                await self._logMutation('removeRecordByKey', key)
             return err
 
     async def updateRecordByKey(self, key: tuple[typing.Any], **kwargs) -> (Record | None, str | None):
         async with self.lock:
             record, err = self.database_impl.updateRecordByKey(key, **kwargs)
             if err is None:
-                saveDatabase(self.filename, self.database_impl)
+                await self._logMutation('updateRecordByKey', key, **kwargs)
             return record, err
 
     async def addEnumValue(self, enum_name: str, enum_value: str) -> str | None:
         async with self.lock:
             err = self.database_impl.addEnumValue(enum_name, enum_value)
             if err is None:
-                saveDatabase(self.filename, self.database_impl)
+                await self._logMutation('addEnumValue', enum_name, enum_value)
             return err
     
     async def removeEnumValue(self, enum_name: str, enum_value: str) -> str | None:
         async with self.lock:
             err = self.database_impl.removeEnumValue(enum_name, enum_value)
             if err is None:
-                saveDatabase(self.filename, self.database_impl)
+                await self._logMutation('removeEnumValue', enum_name, enum_value)
             return err
 
     async def updateEnumValue(self, enum_name: str, old_enum_value: str, new_enum_value: str) -> str | None:
         async with self.lock:
             err = self.database_impl.updateEnumValue(enum_name, old_enum_value, new_enum_value)
             if err is None:
-                saveDatabase(self.filename, self.database_impl)
+                await self._logMutation('updateEnumValue', enum_name, old_enum_value, new_enum_value)
             return err
 
-    async def query(self, **kwargs) -> list[Record]:
+    # Adds the records of a CSV or JSONL file, or none of them if any row is invalid, see DatabaseImpl.addRecords. The file
+    # is read as it's added, and the whole import is saved with a single write. Returns the number of records added.
+    async def importRecords(self, filename: str, create_enum_values: bool = False) -> (int, str | None):
+        if not os.path.exists(filename):
+            return 0, f'File "{filename}" does not exist'
         async with self.lock:
-            return self.database_impl.query(**kwargs)
+            rows = readRecordFile(filename, self.database_impl.record_struct)
+            num_records, err = self.database_impl.addRecords(rows, create_enum_values)
+            if err is None and self.log_file is not None:
+                # Saving the database replaces logging every row.
+                await self._compactLog()
+            return num_records, err
+
+    # Writes all of the records to a CSV or JSONL file, a batch at a time. Returns the number of records written.
+    async def exportRecords(self, filename: str) -> int:
+        num_records = 0
+        # Writers wait for the export, so every batch is from the same version of the database.
+        async with self.lock:
+            with RecordFileWriter(filename, self.database_impl.record_struct) as writer:
+                for batch in self.database_impl.recordBatches():
+                    for record in batch:
+                        writer.write(record)
+                    num_records += len(batch)
+                    # Let readers run between batches.
+                    await asyncio.sleep(0)
+        return num_records
+
+    # Reads don't take the lock, see above.
+    async def query(self, *conditions, **kwargs) -> list[Record]:
+        return self.database_impl.query(*conditions, **kwargs)
     
+    async def search(self, text: str, limit: int = SEARCH_LIMIT) -> list[(float, Record)]:
+        return self.database_impl.search(text, limit = limit)
+
     async def getEnumValuesFromFieldName(self, field_name: str) -> list[str]:
-        async with self.lock:
-            return self.database_impl.getEnumValuesFromFieldName(field_name)
+        # Copied since later writes change the enum in place.
+        return list(self.database_impl.getEnumValuesFromFieldName(field_name))
 
-    async def autocompleteList(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
-        async with self.lock:
-            return self.database_impl.autocompleteList(field_name, current, limit = limit)
+    async def autocompleteList(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self.database_impl.autocompleteList(field_name, current, limit = limit, session_key = session_key)
 
-    async def autocompleteSingle(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
-        async with self.lock:
-            return self.database_impl.autocompleteSingle(field_name, current, limit = limit)
+    async def autocompleteSingle(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self.database_impl.autocompleteSingle(field_name, current, limit = limit, session_key = session_key)
 
-    async def autocompleteEnumNames(self, current: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
-        async with self.lock:
-            return self.database_impl.autocompleteEnumNames(current, limit = limit)
+    async def autocompleteEnumNames(self, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self.database_impl.autocompleteEnumNames(current, limit = limit, session_key = session_key)
 
-    async def autocompleteEnumValues(self, current: str, enum_name: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
-        async with self.lock:
-            return self.database_impl.autocompleteEnumValues(current, enum_name, limit = limit)
+    async def autocompleteEnumValues(self, current: str, enum_name: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self.database_impl.autocompleteEnumValues(current, enum_name, limit = limit, session_key = session_key)
+
+
+# ----------------------------------------
+# |                                      |
+# |            SQLite Database           |
+# |                                      |
+# ----------------------------------------
+
+SQLITE_COLUMN_TYPES = {
+    FieldType.INT: 'INTEGER',
+    FieldType.STR: 'TEXT',
+    FieldType.ENUM: 'TEXT',
+    FieldType.HOURS: 'TEXT',
+}
+
+def sqliteName(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+# A DatabaseImpl that stores its records and enums in a SQLite file instead of in memory, and writes every change to it
+# as it happens. Single valued fields are columns of the records table, and each REPEATED field has a child table of
+# (record_id, position, value). Each HOURS field also has a child table of its parsed (record_id, start_minute,
+# end_minute) intervals. Only the autocomplete and search indexes are kept in memory, and queries are answered by
+# SQLite. Search uses the same TextIndex as DatabaseImpl rather than FTS5, so that both rank records the same way.
+class SqliteDatabaseImpl(DatabaseImpl):
+    USE_POSTING_INDEXES = False
+
+    def __init__(
+            self,
+            name: str,
+            filename: str,
+            keys: tuple[str],
+            record_struct: dict[str, FieldType],
+            # Map of enum name to the enum values to start with, for enums that aren't in the file yet.
+            enums: dict[str, list[str]],
+            # Tuple of the text field names that search looks through
+            search_fields: tuple[str] = (),
+    ):
+        self.name = name
+
+        # Validate that the keys appear in record_struct
+        if not all(key in record_struct for key in keys):
+            raise Exception('Invalid set of keys.')
+        if any(record_struct[key].mode == FieldType.REPEATED for key in keys):
+            raise Exception('Key fields cannot be repeated.')
+        checkSearchFields(search_fields, record_struct)
+
+        self.keys = keys
+        self.record_struct = record_struct
+        self.schema = recordSchema(record_struct)
+        self.search_fields = search_fields
+        self.single_fields = [field_name for field_name, field_type in record_struct.items() if field_type.mode != FieldType.REPEATED]
+        self.repeated_fields = [field_name for field_name, field_type in record_struct.items() if field_type.mode == FieldType.REPEATED]
+        self.hours_fields = [field_name for field_name, field_type in record_struct.items() if field_type.base_type == FieldType.HOURS]
+
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self._createTables(enums)
+        self.enums = self._loadEnums()
+
+        self._compileValidators()
+        self._buildIndexes()
+
+    def close(self):
+        self.connection.close()
+
+    def _childTable(self, field_name: str) -> str:
+        return sqliteName(f'records_{field_name}')
+
+    def _intervalTable(self, field_name: str) -> str:
+        return sqliteName(f'records_{field_name}_intervals')
+
+    def _createTables(self, enums: dict[str, list[str]]):
+        with self.connection:
+            columns = ''.join(
+                f', {sqliteName(field_name)} {SQLITE_COLUMN_TYPES[self.record_struct[field_name].base_type]}'
+                for field_name in self.single_fields)
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY{columns})')
+            key_columns = ', '.join(map(sqliteName, self.keys))
+            self.connection.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS index_records_key ON records ({key_columns})')
+            for field_name in self.single_fields:
+                if self.record_struct[field_name].base_type in (FieldType.ENUM, FieldType.INT):
+                    self.connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS {sqliteName(f"index_records_{field_name}")} ON records ({sqliteName(field_name)})')
+            for field_name in self.repeated_fields:
+                column_type = SQLITE_COLUMN_TYPES[self.record_struct[field_name].base_type]
+                self.connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {self._childTable(field_name)} ('
+                    'record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE, '
+                    f'position INTEGER NOT NULL, value {column_type}, PRIMARY KEY (record_id, position))')
+                self.connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS {sqliteName(f"index_records_{field_name}_value")} ON {self._childTable(field_name)} (value)')
+            for field_name in self.hours_fields:
+                interval_table = self._intervalTable(field_name)
+                exists = self.connection.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f'records_{field_name}_intervals',)).fetchone()
+                self.connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {interval_table} ('
+                    'record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE, '
+                    'start_minute INTEGER NOT NULL, end_minute INTEGER NOT NULL)')
+                self.connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS {sqliteName(f"index_records_{field_name}_intervals")} ON {interval_table} (start_minute, end_minute)')
+                self.connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS {sqliteName(f"index_records_{field_name}_intervals_record")} ON {interval_table} (record_id)')
+                if exists is None:
+                    # The intervals are derived from the field, so fill them in for records added before the table was.
+                    self.connection.executemany(
+                        f'INSERT INTO {interval_table} (record_id, start_minute, end_minute) VALUES (?, ?, ?)',
+                        [(record_id, start, end)
+                         for record_id, _, field_values in self._streamFieldValues([field_name])
+                         for start, end in hoursIntervals(field_values[field_name])])
+
+            self.connection.execute('CREATE TABLE IF NOT EXISTS enum_names (enum_name TEXT PRIMARY KEY)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS enum_values ('
+                'enum_name TEXT NOT NULL REFERENCES enum_names(enum_name), position INTEGER NOT NULL, '
+                'enum_value TEXT NOT NULL, PRIMARY KEY (enum_name, enum_value))')
+            # Only add the starting values of new enums, so that removed values don't come back.
+            existing_enum_names = set(row[0] for row in self.connection.execute('SELECT enum_name FROM enum_names'))
+            for enum_name, enum_values in enums.items():
+                if enum_name in existing_enum_names:
+                    continue
+                self.connection.execute('INSERT INTO enum_names (enum_name) VALUES (?)', (enum_name,))
+                self.connection.executemany(
+                    'INSERT INTO enum_values (enum_name, position, enum_value) VALUES (?, ?, ?)',
+                    [(enum_name, position, enum_value) for position, enum_value in enumerate(enum_values)])
+
+    def _loadEnums(self) -> dict[str, list[str]]:
+        enums = {row[0]: [] for row in self.connection.execute('SELECT enum_name FROM enum_names ORDER BY rowid')}
+        for enum_name, enum_value in self.connection.execute('SELECT enum_name, enum_value FROM enum_values ORDER BY enum_name, position'):
+            enums[enum_name].append(enum_value)
+        return enums
+
+    # The STR fields values are read straight from the tables, since only the autocomplete indexes need them. Each value
+    # is counted once per record, like in _fieldValues.
+    def _indexAllRecords(self):
+        for field_name, index in self.field_value_indexes.items():
+            if field_name in self.repeated_fields:
+                rows = self.connection.execute(f'SELECT DISTINCT record_id, value FROM {self._childTable(field_name)}')
+                field_values = (field_value for _, field_value in rows)
+            else:
+                rows = self.connection.execute(
+                    f'SELECT {sqliteName(field_name)} FROM records WHERE {sqliteName(field_name)} IS NOT NULL')
+                field_values = (field_value for (field_value,) in rows)
+            for field_value in field_values:
+                index.add(field_value)
+        if len(self.search_fields) > 0:
+            for _, key, field_values in self._streamFieldValues(self.search_fields):
+                self.text_index.add(key, fieldSearchTerms(field_values))
+
+    # Yields (record id, key, {field name: set of values}) for every record, reading only the keys and the given fields
+    # rather than whole records. The child table rows are merged in by record id, so only one record is held at a time.
+    def _streamFieldValues(self, field_names: list[str]) -> typing.Iterator[tuple[int, tuple[typing.Any], dict[str, set[typing.Any]]]]:
+        single_fields = [field_name for field_name in field_names if field_name in self.single_fields]
+        repeated_fields = [field_name for field_name in field_names if field_name in self.repeated_fields]
+        columns = ''.join(f', {sqliteName(field_name)}' for field_name in list(self.keys) + single_fields)
+        rows = self.connection.execute(f'SELECT id{columns} FROM records ORDER BY id')
+        child_cursors = {
+            field_name: self.connection.execute(f'SELECT record_id, value FROM {self._childTable(field_name)} ORDER BY record_id')
+            for field_name in repeated_fields
+        }
+        child_rows = {field_name: cursor.fetchone() for field_name, cursor in child_cursors.items()}
+        for row in rows:
+            record_id = row[0]
+            key = tuple(row[1:len(self.keys) + 1])
+            field_values = {
+                field_name: set() if field_value is None else {field_value}
+                for field_name, field_value in zip(single_fields, row[len(self.keys) + 1:])
+            }
+            for field_name, cursor in child_cursors.items():
+                field_values[field_name] = set()
+                # Every child row has a record, so the rows of earlier records were all used already.
+                while child_rows[field_name] is not None and child_rows[field_name][0] == record_id:
+                    field_values[field_name].add(child_rows[field_name][1])
+                    child_rows[field_name] = cursor.fetchone()
+            yield record_id, key, field_values
+
+    # Returns the records matching the where clause, in key order.
+    def _selectRecords(self, where: str, params: list[typing.Any]) -> list[Record]:
+        columns = ''.join(f', {sqliteName(field_name)}' for field_name in self.single_fields)
+        key_columns = ', '.join(map(sqliteName, self.keys))
+        rows = self.connection.execute(f'SELECT id{columns} FROM records WHERE {where} ORDER BY {key_columns}', params)
+        fields_by_id = {row[0]: dict(zip(self.single_fields, row[1:])) for row in rows}
+
+        for field_name in self.repeated_fields:
+            for fields in fields_by_id.values():
+                fields[field_name] = []
+            child_rows = self.connection.execute(
+                f'SELECT record_id, value FROM {self._childTable(field_name)} '
+                f'WHERE record_id IN (SELECT id FROM records WHERE {where}) ORDER BY record_id, position', params)
+            for record_id, value in child_rows:
+                fields_by_id[record_id][field_name].append(value)
+
+        return [self.schema.record(fields) for fields in fields_by_id.values()]
+
+    # Returns the records whose field has value, by key.
+    def _recordsWithValue(self, field_name: str, value: typing.Any) -> dict[tuple[typing.Any], Record]:
+        if field_name in self.repeated_fields:
+            records = self._selectRecords(f'id IN (SELECT record_id FROM {self._childTable(field_name)} WHERE value = ?)', [value])
+        else:
+            records = self._selectRecords(f'{sqliteName(field_name)} = ?', [value])
+        return {record.getKey(self.keys): record for record in records}
+
+    # Returns the records that a change to the enum value changes the search terms of, by key.
+    def _searchedRecordsWithEnumValue(self, enum_name: str, enum_value: str) -> dict[tuple[typing.Any], Record]:
+        records = {}
+        for field_name in self._enumFields(enum_name):
+            if field_name in self.search_fields:
+                records.update(self._recordsWithValue(field_name, enum_value))
+        return records
+
+    # Indexes the records for search again after SQL changed them in place. records are the versions from before.
+    def _reindexSearchTerms(self, records: dict[tuple[typing.Any], Record]):
+        for key, record in records.items():
+            self.text_index.remove(key, self._searchTerms(record))
+            self.text_index.add(key, self._searchTerms(self.getRecordByKey(key)))
+
+    def _keyWhere(self) -> str:
+        return ' AND '.join(f'{sqliteName(key)} = ?' for key in self.keys)
+
+    def getRecordByKey(self, key: tuple[typing.Any]) -> Record | None:
+        records = self._selectRecords(self._keyWhere(), list(key))
+        return records[0] if len(records) > 0 else None
+
+    # Must be called inside of a transaction.
+    def _insertRecord(self, record: Record):
+        columns = ', '.join(map(sqliteName, self.single_fields))
+        placeholders = ', '.join('?' * len(self.single_fields))
+        cursor = self.connection.execute(
+            f'INSERT INTO records ({columns}) VALUES ({placeholders})',
+            [record[field_name] for field_name in self.single_fields])
+        for field_name in self.repeated_fields:
+            self.connection.executemany(
+                f'INSERT INTO {self._childTable(field_name)} (record_id, position, value) VALUES (?, ?, ?)',
+                [(cursor.lastrowid, position, value) for position, value in enumerate(record[field_name])])
+        self._insertIntervals(cursor.lastrowid, record)
+
+    # Must be called inside of a transaction.
+    def _insertIntervals(self, record_id: int, record: Record):
+        for field_name in self.hours_fields:
+            self.connection.executemany(
+                f'INSERT INTO {self._intervalTable(field_name)} (record_id, start_minute, end_minute) VALUES (?, ?, ?)',
+                [(record_id, start, end) for start, end in self._recordIntervals(record, field_name)])
+
+    def _recordId(self, key: tuple[typing.Any]) -> int:
+        return self.connection.execute(f'SELECT id FROM records WHERE {self._keyWhere()}', list(key)).fetchone()[0]
+
+    # Must be called inside of a transaction. The child rows are deleted by the foreign keys.
+    def _deleteRecord(self, key: tuple[typing.Any]):
+        self.connection.execute(f'DELETE FROM records WHERE {self._keyWhere()}', list(key))
+
+    def addRecord(self, **kwargs) -> (Record | None, str | None):
+        record = self.makeRecord(kwargs)
+        if self.getRecordByKey(record.getKey(self.keys)) is not None:
+            key_str = ', '.join(record.getKey(self.keys))
+            return None, f'Record with key "{key_str}" already exists'
+        self.validateRecord(record)
+        with self.connection:
+            self._insertRecord(record)
+        self._indexRecord(record)
+        return record, None
+
+    # All of the records and enum values are added in a single transaction.
+    def addRecords(self, rows: typing.Iterable[dict[str, typing.Any]], create_enum_values: bool = False) -> (int, str | None):
+        records, new_enum_values, err = self._prepareRecords(rows, create_enum_values)
+        if err is not None:
+            return 0, err
+        with self.connection:
+            for enum_name, enum_values in new_enum_values.items():
+                self.connection.executemany(
+                    'INSERT INTO enum_values (enum_name, position, enum_value) '
+                    'SELECT ?, COALESCE(MAX(position) + 1, 0), ? FROM enum_values WHERE enum_name = ?',
+                    [(enum_name, enum_value, enum_name) for enum_value in enum_values])
+            for record in records:
+                self._insertRecord(record)
+        self._extendEnums(new_enum_values)
+        for record in records:
+            self._indexRecord(record)
+        return len(records), None
+
+    # Reads the records in key order, starting each batch after the last key of the previous one.
+    def recordBatches(self, batch_size: int = EXPORT_BATCH_SIZE) -> typing.Iterator[list[Record]]:
+        key_columns = ', '.join(map(sqliteName, self.keys))
+        key_params = ', '.join('?' for _ in self.keys)
+        batch = self._selectRecords(f'id IN (SELECT id FROM records ORDER BY {key_columns} LIMIT ?)', [batch_size])
+        while len(batch) > 0:
+            yield batch
+            batch = self._selectRecords(
+                f'id IN (SELECT id FROM records WHERE ({key_columns}) > ({key_params}) ORDER BY {key_columns} LIMIT ?)',
+                list(batch[-1].getKey(self.keys)) + [batch_size])
+
+    def removeRecordByKey(self, key: tuple[typing.Any]) -> str | None:
+        record = self.getRecordByKey(key)
+        if record is None:
+            return f'Record with key "{key}" does not exist'
+        with self.connection:
+            self._deleteRecord(key)
+        self._unindexRecord(record)
+        return None
+
+    def updateRecordByKey(self, key: tuple[typing.Any], **kwargs) -> (Record | None, str | None):
+        record = self.getRecordByKey(key)
+        if record is None:
+            return None, f'Record with key "{key}" does not exist'
+
+        self._checkFieldNames(kwargs)
+        new_record = record.replace(**kwargs)
+        self.validateRecord(new_record, field_names = kwargs)
+
+        new_key = new_record.getKey(self.keys)
+        if new_key != key and self.getRecordByKey(new_key) is not None:
+            return None, f'Record with key "{new_key}" already exists'
+        with self.connection:
+            self._deleteRecord(key)
+            self._insertRecord(new_record)
+        self._unindexRecord(record)
+        self._indexRecord(new_record)
+        return new_record, None
+
+    def _requiredFieldUsing(self, enum_name: str, enum_value: str) -> str | None:
+        for field_name in self._enumFields(enum_name):
+            if self.record_struct[field_name].mode != FieldType.REQUIRED:
+                continue
+            if self.connection.execute(f'SELECT 1 FROM records WHERE {sqliteName(field_name)} = ? LIMIT 1', (enum_value,)).fetchone() is not None:
+                return field_name
+        return None
+
+    def addEnumValue(self, enum_name: str, enum_value: str) -> str | None:
+        err = super().addEnumValue(enum_name, enum_value)
+        if err is not None:
+            return err
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO enum_values (enum_name, position, enum_value) '
+                'SELECT ?, COALESCE(MAX(position) + 1, 0), ? FROM enum_values WHERE enum_name = ?',
+                (enum_name, enum_value, enum_name))
+        return None
+
+    def removeEnumValue(self, enum_name: str, enum_value: str) -> str | None:
+        if enum_name not in self.enums:
+            return f'Unknown enum "{enum_name}"'
+        if enum_value not in self.enum_value_sets[enum_name]:
+            return f'Enum value "{enum_value}" is not in enum "{enum_name}"'
+        field_name = self._requiredFieldUsing(enum_name, enum_value)
+        if field_name is not None:
+            return f'Enum value "{enum_value}" is still used by field "{field_name}"'
+
+        changed_records = self._searchedRecordsWithEnumValue(enum_name, enum_value)
+        with self.connection:
+            self.connection.execute('DELETE FROM enum_values WHERE enum_name = ? AND enum_value = ?', (enum_name, enum_value))
+            for field_name in self._enumFields(enum_name):
+                if self.record_struct[field_name].mode == FieldType.REPEATED:
+                    self.connection.execute(f'DELETE FROM {self._childTable(field_name)} WHERE value = ?', (enum_value,))
+                else:
+                    self.connection.execute(
+                        f'UPDATE records SET {sqliteName(field_name)} = NULL WHERE {sqliteName(field_name)} = ?', (enum_value,))
+        self.enums[enum_name].remove(enum_value)
+        self._enumChanged(enum_name)
+        self.enum_value_indexes[enum_name].remove(enum_value)
+        self._reindexSearchTerms(changed_records)
+        return None
+
+    def updateEnumValue(self, enum_name: str, old_enum_value: str, new_enum_value: str) -> str | None:
+        if enum_name not in self.enums:
+            return f'Unknown enum "{enum_name}"'
+        if old_enum_value not in self.enum_value_sets[enum_name]:
+            return f'Old enum value "{old_enum_value}" is not in enum "{enum_name}"'
+        if new_enum_value in self.enum_value_sets[enum_name]:
+            return f'New enum value "{new_enum_value}" already exists in enum "{enum_name}"'
+
+        changed_records = self._searchedRecordsWithEnumValue(enum_name, old_enum_value)
+        with self.connection:
+            self.connection.execute(
+                'UPDATE enum_values SET enum_value = ? WHERE enum_name = ? AND enum_value = ?',
+                (new_enum_value, enum_name, old_enum_value))
+            for field_name in self._enumFields(enum_name):
+                if self.record_struct[field_name].mode == FieldType.REPEATED:
+                    self.connection.execute(
+                        f'UPDATE {self._childTable(field_name)} SET value = ? WHERE value = ?', (new_enum_value, old_enum_value))
+                else:
+                    self.connection.execute(
+                        f'UPDATE records SET {sqliteName(field_name)} = ? WHERE {sqliteName(field_name)} = ?',
+                        (new_enum_value, old_enum_value))
+        self.enums[enum_name][self.enums[enum_name].index(old_enum_value)] = new_enum_value
+        self._enumChanged(enum_name)
+        self.enum_value_indexes[enum_name].remove(old_enum_value)
+        self.enum_value_indexes[enum_name].add(new_enum_value)
+        self._reindexSearchTerms(changed_records)
+        return None
+
+    # Same matching as DatabaseImpl.query, but as a single SQL statement so SQLite can pick the indexes to use. The plans
+    # are the SQL conditions, and the leaves hold their parameters.
+    def query(self, *conditions, **kwargs) -> list[Record]:
+        condition = And(*conditions, *(AnyOf(field_name, values) for field_name, values in kwargs.items() if values is not None))
+        for field_name in kwargs:
+            self._checkQueryField(field_name)
+        where = self._queryPlan(condition)
+        params = []
+        for leaf in condition.leaves():
+            if isinstance(leaf, AnyOf):
+                params.extend(leaf.values)
+            elif isinstance(leaf, OpenAt):
+                params.extend([leaf.minute, leaf.minute])
+            else:
+                params.extend(bound for bound in (leaf.low, leaf.high) if bound is not None)
+        return self._selectRecords(where, params)
+
+    # The SQL has a placeholder for each value of an AnyOf, so the plans also depend on the number of values.
+    def _planKey(self, condition) -> tuple:
+        return condition.shape(), tuple(len(leaf.values) for leaf in condition.leaves() if isinstance(leaf, AnyOf))
+
+    # Compiles condition to a SQL condition. Every condition is true or false, never NULL, so that Not works like it does
+    # for DatabaseImpl.
+    def _compileQuery(self, condition, leaf_index: int) -> (str, int):
+        if isinstance(condition, Not):
+            where, leaf_index = self._compileQuery(condition.condition, leaf_index)
+            return f'(NOT {where})', leaf_index
+        if isinstance(condition, (And, Or)):
+            wheres = []
+            for child in condition.conditions:
+                where, leaf_index = self._compileQuery(child, leaf_index)
+                wheres.append(where)
+            if len(wheres) == 0:
+                return '1' if isinstance(condition, And) else '0', leaf_index
+            operator = ' AND ' if isinstance(condition, And) else ' OR '
+            return f'({operator.join(wheres)})', leaf_index
+        if not isinstance(condition, (AnyOf, Range, OpenAt)):
+            raise Exception(f'DB "{self.name}": Unknown query condition "{condition}"')
+
+        field_name = condition.field_name
+        self._checkQueryField(field_name, _LEAF_FIELD_TYPES.get(type(condition)))
+        if isinstance(condition, OpenAt):
+            return (
+                f'id IN (SELECT record_id FROM {self._intervalTable(field_name)} WHERE start_minute <= ? AND ? < end_minute)',
+                leaf_index + 1)
+        if isinstance(condition, AnyOf):
+            placeholders = ', '.join('?' * len(condition.values))
+            value_conditions = [f'{{}} IN ({placeholders})']
+        else:
+            value_conditions = []
+            if condition.low is not None:
+                value_conditions.append('{} >= ?')
+            if condition.high is not None:
+                value_conditions.append('{} <= ?')
+
+        if self.record_struct[field_name].mode == FieldType.REPEATED:
+            value_where = ' AND '.join(['value IS NOT NULL'] + [c.format('value') for c in value_conditions])
+            return f'id IN (SELECT record_id FROM {self._childTable(field_name)} WHERE {value_where})', leaf_index + 1
+        column = sqliteName(field_name)
+        return '(' + ' AND '.join([f'{column} IS NOT NULL'] + [c.format(column) for c in value_conditions]) + ')', leaf_index + 1
+
+
+# Copies the pickled database at pickle_filename, including its mutation log, into a new SQLite database at
+# sqlite_filename. Does nothing if the SQLite database already exists or there is nothing to migrate.
+def migratePickleToSqlite(pickle_filename: str, sqlite_filename: str):
+    if os.path.exists(sqlite_filename):
+        return
+    database_impl = loadDatabase(pickle_filename)
+    if database_impl is None:
+        return
+    replayLog(logFilename(pickle_filename), database_impl)
+
+    # Build the SQLite database next to its final location, so a failed migration is retried from scratch.
+    tmp_filename = sqlite_filename + '.tmp'
+    if os.path.exists(tmp_filename):
+        os.remove(tmp_filename)
+    sqlite_impl = SqliteDatabaseImpl(database_impl.name, tmp_filename, database_impl.keys, database_impl.record_struct, database_impl.enums, database_impl.search_fields)
+    with sqlite_impl.connection:
+        for _, record in database_impl.records.items():
+            sqlite_impl._insertRecord(record)
+    sqlite_impl.close()
+    os.replace(tmp_filename, sqlite_filename)
+
+
+# ----------------------------------------
+# |                                      |
+# |           Database Registry          |
+# |                                      |
+# ----------------------------------------
+
+# Seconds without any use before a database is closed, and how often the registry checks for them.
+DATABASE_IDLE_SECONDS = 30 * 60
+DATABASE_UNLOAD_INTERVAL_SECONDS = 60
+
+# Everything that's needed to open one database of a DatabaseRegistry. Databases with a ".sqlite" filename are
+# SqliteDatabaseImpls, the rest are pickled DatabaseImpls with a mutation log. discord_commands returns the command
+# groups of the database, given the LazyDatabase to use.
+class DatabaseDefinition:
+    def __init__(
+            self,
+            name: str,
+            filename: str,
+            keys: tuple[str],
+            record_struct: dict[str, FieldType],
+            # Map of enum name to the enum values that a new database starts with
+            base_enums: dict[str, list[str]],
+            search_fields: tuple[str] = (),
+            # Pickled version of a SQLite database, which is copied over the first time that it's opened.
+            pickle_filename: str | None = None,
+            discord_commands: Callable[['LazyDatabase'], list[app_commands.Group]] | None = None,
+    ):
+        self.name = name
+        self.filename = filename
+        self.keys = keys
+        self.record_struct = record_struct
+        self.base_enums = base_enums
+        self.search_fields = search_fields
+        self.pickle_filename = pickle_filename
+        self.discord_commands = discord_commands
+
+    def isSqlite(self) -> bool:
+        return self.filename.endswith('.sqlite')
+
+    def open(self) -> AsyncDatabaseWrapper:
+        # Copied, since the in memory databases change their enums in place.
+        base_enums = {enum_name: list(enum_values) for enum_name, enum_values in self.base_enums.items()}
+        if self.isSqlite():
+            if self.pickle_filename is not None:
+                migratePickleToSqlite(self.pickle_filename, self.filename)
+            database_impl = SqliteDatabaseImpl(self.name, self.filename, self.keys, self.record_struct, base_enums, self.search_fields)
+            return AsyncDatabaseWrapper(database_impl)
+
+        database_impl = loadDatabase(self.filename)
+        if database_impl is None:
+            database_impl = DatabaseImpl(self.name, [], self.keys, self.record_struct, base_enums, self.search_fields)
+        return AsyncDatabaseWrapper(database_impl, self.filename)
+
+
+# One database of a DatabaseRegistry. It's opened by the first call that uses it, and closed again by the registry once
+# it has been idle for long enough. It has the same async methods as AsyncDatabaseWrapper.
+class LazyDatabase:
+    def __init__(self, definition: DatabaseDefinition, idle_seconds: float = DATABASE_IDLE_SECONDS):
+        self.definition = definition
+        self.idle_seconds = idle_seconds
+        self.async_database: AsyncDatabaseWrapper | None = None
+        self.last_used = 0.0
+        # The number of calls that are using async_database. Readers don't take its lock, so unload checks this instead.
+        self.active_calls = 0
+
+    def isLoaded(self) -> bool:
+        return self.async_database is not None
+
+    # Opening doesn't await, so concurrent calls can't open the database twice.
+    def _load(self) -> AsyncDatabaseWrapper:
+        self.last_used = time.monotonic()
+        if self.async_database is None:
+            logging.info('Loading database "%s"', self.definition.name)
+            self.async_database = self.definition.open()
+        return self.async_database
+
+    # Calls the method of the open database, and counts the call as active until it returns.
+    async def _call(self, method_name: str, *args, **kwargs):
+        async_database = self._load()
+        self.active_calls += 1
+        try:
+            return await getattr(async_database, method_name)(*args, **kwargs)
+        finally:
+            self.active_calls -= 1
+
+    def isIdle(self) -> bool:
+        return time.monotonic() - self.last_used >= self.idle_seconds
+
+    # Closes the database, if it hasn't been used for idle_seconds or only_if_idle is False. Either way, it's never
+    # closed under a call that is still using it. Returns whether it was closed. The next call that uses the database
+    # opens it again.
+    async def unload(self, only_if_idle: bool = True) -> bool:
+        async_database = self.async_database
+        if async_database is None or self.active_calls > 0 or (only_if_idle and not self.isIdle()):
+            return False
+        # Wait for any writes to finish.
+        async with async_database.lock:
+            # The database could have been used while waiting for the lock.
+            if self.async_database is not async_database or self.active_calls > 0 or (only_if_idle and not self.isIdle()):
+                return False
+            self.async_database = None
+            await async_database.close()
+        logging.info('Unloaded database "%s"', self.definition.name)
+        return True
+
+    async def addRecord(self, **kwargs) -> (Record | None, str | None):
+        return await self._call('addRecord', **kwargs)
+
+    async def removeRecordByKey(self, key: tuple[typing.Any]) -> str | None:
+        return await self._call('removeRecordByKey', key)
+
+    async def updateRecordByKey(self, key: tuple[typing.Any], **kwargs) -> (Record | None, str | None):
+        return await self._call('updateRecordByKey', key, **kwargs)
+
+    async def addEnumValue(self, enum_name: str, enum_value: str) -> str | None:
+        return await self._call('addEnumValue', enum_name, enum_value)
+
+    async def removeEnumValue(self, enum_name: str, enum_value: str) -> str | None:
+        return await self._call('removeEnumValue', enum_name, enum_value)
+
+    async def updateEnumValue(self, enum_name: str, old_enum_value: str, new_enum_value: str) -> str | None:
+        return await self._call('updateEnumValue', enum_name, old_enum_value, new_enum_value)
+
+    async def importRecords(self, filename: str, create_enum_values: bool = False) -> (int, str | None):
+        return await self._call('importRecords', filename, create_enum_values)
+
+    async def exportRecords(self, filename: str) -> int:
+        return await self._call('exportRecords', filename)
+
+    async def query(self, *conditions, **kwargs) -> list[Record]:
+        return await self._call('query', *conditions, **kwargs)
+
+    async def search(self, text: str, limit: int = SEARCH_LIMIT) -> list[(float, Record)]:
+        return await self._call('search', text, limit = limit)
+
+    async def getEnumValuesFromFieldName(self, field_name: str) -> list[str]:
+        return await self._call('getEnumValuesFromFieldName', field_name)
+
+    async def autocompleteList(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self._call('autocompleteList', field_name, current, limit = limit, session_key = session_key)
+
+    async def autocompleteSingle(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self._call('autocompleteSingle', field_name, current, limit = limit, session_key = session_key)
+
+    async def autocompleteEnumNames(self, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self._call('autocompleteEnumNames', current, limit = limit, session_key = session_key)
+
+    async def autocompleteEnumValues(self, current: str, enum_name: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self._call('autocompleteEnumValues', current, enum_name, limit = limit, session_key = session_key)
+
+
+# The databases of the bot, by name. Defining a database doesn't open it, see LazyDatabase, and start() begins closing
+# the ones that are idle.
+class DatabaseRegistry:
+    def __init__(self, idle_seconds: float = DATABASE_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self.databases: dict[str, LazyDatabase] = {}
+
+    def define(self, definition: DatabaseDefinition) -> LazyDatabase:
+        if definition.name in self.databases:
+            raise Exception(f'Database "{definition.name}" is already defined')
+        self.databases[definition.name] = LazyDatabase(definition, self.idle_seconds)
+        return self.databases[definition.name]
+
+    def getDatabase(self, name: str) -> LazyDatabase:
+        if name not in self.databases:
+            raise Exception(f'Unknown database "{name}"')
+        return self.databases[name]
+
+    def getDiscordCommands(self) -> list[app_commands.Group]:
+        return [
+            command_group
+            for database in self.databases.values() if database.definition.discord_commands is not None
+            for command_group in database.definition.discord_commands(database)
+        ]
+
+    # Can be called again, e.g. whenever the bot reconnects.
+    def start(self):
+        if not self.unloadIdleDatabases.is_running():
+            self.unloadIdleDatabases.start()
+
+    async def unloadAll(self):
+        for database in self.databases.values():
+            await database.unload(only_if_idle = False)
+
+    @tasks.loop(seconds=DATABASE_UNLOAD_INTERVAL_SECONDS)
+    async def unloadIdleDatabases(self):
+        for database in self.databases.values():
+            try:
+                await database.unload()
+            except Exception:
+                traceback.print_exc()
 
 
 # ----------------------------------------
@@ -471,30 +2155,34 @@ class RestaurantDiscordCommands(app_commands.Group):
         super(RestaurantDiscordCommands, self).__init__(name='restaurant-db', *args, **kwargs)
         self.restaurant_database = restaurant_database
 
+    # Identifies the user's autocomplete session for option, so that work can be reused between keystrokes.
+    def autocompleteSessionKey(self, interaction: discord.Interaction, option: str) -> typing.Hashable:
+        return (interaction.user.id, interaction.command.qualified_name, option)
+
     async def locationListAutocomplete(self, interaction: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
         try:
-            sorted_autocomplete_values = await self.restaurant_database.autocompleteList("locations", current)
+            sorted_autocomplete_values = await self.restaurant_database.autocompleteList("locations", current, session_key = self.autocompleteSessionKey(interaction, "locations"))
             return [app_commands.Choice(name=v, value=v) for v in sorted_autocomplete_values]
         except Exception:
             traceback.print_exc()
 
     async def cuisineListAutocomplete(self, interaction: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
         try:
-            sorted_autocomplete_values = await self.restaurant_database.autocompleteList("cuisines", current)
+            sorted_autocomplete_values = await self.restaurant_database.autocompleteList("cuisines", current, session_key = self.autocompleteSessionKey(interaction, "cuisines"))
             return [app_commands.Choice(name=v, value=v) for v in sorted_autocomplete_values]
         except Exception:
             traceback.print_exc()
 
     async def eatingOptionsListAutocomplete(self, interaction: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
         try:
-            sorted_autocomplete_values = await self.restaurant_database.autocompleteList("eating_options", current)
+            sorted_autocomplete_values = await self.restaurant_database.autocompleteList("eating_options", current, session_key = self.autocompleteSessionKey(interaction, "eating_options"))
             return [app_commands.Choice(name=v, value=v) for v in sorted_autocomplete_values]
         except Exception:
             traceback.print_exc()
 
     async def enumNameAutocomplete(self, interaction: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
         try:
-            sorted_enum_names = await self.restaurant_database.autocompleteEnumNames(current)
+            sorted_enum_names = await self.restaurant_database.autocompleteEnumNames(current, session_key = self.autocompleteSessionKey(interaction, "enum_name"))
             return [app_commands.Choice(name=v, value=v) for v in sorted_enum_names]
         except Exception as e:
             traceback.print_exc()
@@ -504,21 +2192,21 @@ class RestaurantDiscordCommands(app_commands.Group):
             enum_name = interaction.namespace["enum_name"]
             if enum_name is None or enum_name == "":
                 return [app_commands.Choice(name="Please select the enum name first!", value="")]
-            sorted_enum_values = await self.restaurant_database.autocompleteEnumValues(current, enum_name=enum_name)
+            sorted_enum_values = await self.restaurant_database.autocompleteEnumValues(current, enum_name=enum_name, session_key = self.autocompleteSessionKey(interaction, "enum_value"))
             return [app_commands.Choice(name=v, value=v) for v in sorted_enum_values]
         except Exception:
             traceback.print_exc()
 
     async def restaurantNameAutocomplete(self, interaction: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
         try:
-            sorted_restaurant_names = await self.restaurant_database.autocompleteSingle("name", current)
+            sorted_restaurant_names = await self.restaurant_database.autocompleteSingle("name", current, session_key = self.autocompleteSessionKey(interaction, "name"))
             return [app_commands.Choice(name=v, value=v) for v in sorted_restaurant_names]
         except Exception:
             traceback.print_exc()
 
     async def restaurantNameListAutocomplete(self, interaction: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
         try:
-            sorted_autocomplete_values = await self.restaurant_database.autocompleteList("name", current)
+            sorted_autocomplete_values = await self.restaurant_database.autocompleteList("name", current, session_key = self.autocompleteSessionKey(interaction, "names"))
             return [app_commands.Choice(name=v, value=v) for v in sorted_autocomplete_values]
         except Exception:
             traceback.print_exc()
@@ -529,7 +2217,7 @@ class RestaurantDiscordCommands(app_commands.Group):
         locations='Comma separated list of locations associated with the restaurant',
         cuisines='Comma separated list of cuisines that the restaurant serves',
         eating_options='Comma separated list of eating options that the restaurant offers',
-        hours='Free form string with the general hours of the restaurant',
+        hours='Free form string with the general hours of the restaurant. Use a format like "Mon-Fri 11am-9pm; Sat, Sun 10-10" to make it searchable with open_now.',
         url='URL of the restaurant',
     )
     @app_commands.autocomplete(
@@ -571,6 +2259,7 @@ class RestaurantDiscordCommands(app_commands.Group):
         locations='Comma separated list of locations. The returned restaurants will have at least one of these locations. If this option not set, then the locations field won\'t be checked.',
         cuisines='Comma separated list of cuisines. The returned restaurants will have at least one of these locations. If this option not set, then the cuisines field won\'t be checked.',
         eating_options='Comma separated list of eating options. The returned restaurants will have at least one of these locations. If this option not set, then the eating_options field won\'t be checked.',
+        open_now='If true, then only restaurants whose hours say that they are open right now are returned.',
         num_restaurants='The number of restaurants to include in the response (If less than zero, then all matching restaurants will be returned). The order of the restaurants will be random.',
         ephemeral='Whether or not to send the response as an ephemeral message (visible only to you).',
     )
@@ -587,10 +2276,14 @@ class RestaurantDiscordCommands(app_commands.Group):
         locations: typing.Optional[str] = None,
         cuisines: typing.Optional[str] = None,
         eating_options: typing.Optional[str] = None,
+        open_now: typing.Optional[bool] = None,
         num_restaurants: typing.Optional[int] = 5,
         ephemeral: typing.Optional[bool] = False,
     ):
         # CHECKED
+        conditions = []
+        if open_now:
+            conditions.append(self.restaurant_database.openNowCondition())
         kwargs = {}
         if names is not None:
             kwargs["name"] = parseDiscordList(names)
@@ -600,7 +2293,7 @@ class RestaurantDiscordCommands(app_commands.Group):
             kwargs["cuisines"] = parseDiscordList(cuisines)
         if eating_options is not None:
             kwargs["eating_options"] = parseDiscordList(eating_options)
-        matching_records = await self.restaurant_database.query(**kwargs)
+        matching_records = await self.restaurant_database.query(*conditions, **kwargs)
 
         total_matches = len(matching_records)
 
@@ -612,6 +2305,29 @@ class RestaurantDiscordCommands(app_commands.Group):
             msg += '\n' + self.restaurant_database.restaurantRecordToStr(record) + '\n'
         await interaction.response.send_message(msg, ephemeral = ephemeral)
 
+    @app_commands.command(name='search', description='Finds the restaurants that best match the search terms.')
+    @app_commands.describe(
+        text='The words to search for in the name, cuisines, locations, hours, and url of the restaurants.',
+        num_restaurants='The number of restaurants to include in the response. The best matches are first.',
+        ephemeral='Whether or not to send the response as an ephemeral message (visible only to you).',
+    )
+    async def search(
+        self,
+        interaction: discord.Interaction,
+        text: str,
+        num_restaurants: typing.Optional[int] = SEARCH_LIMIT,
+        ephemeral: typing.Optional[bool] = False,
+    ):
+        results = await self.restaurant_database.search(text, limit = max(num_restaurants, 1))
+
+        if len(results) == 0:
+            msg = f'Found no restaurants that matched "{text}"'
+        else:
+            msg = f'Found {len(results)} restaurants that matched "{text}":\n'
+            for _, record in results:
+                msg += '\n' + self.restaurant_database.restaurantRecordToStr(record) + '\n'
+        await interaction.response.send_message(msg, ephemeral = ephemeral)
+
     @app_commands.command(name='remove-restaurant', description='Removes a restaurant from the database.')
     @app_commands.describe(
         name='The name of the restaurant to remove.',
@@ -753,6 +2469,53 @@ class RestaurantDiscordCommands(app_commands.Group):
             msg = err
         await interaction.response.send_message(msg)
 
+    @app_commands.command(name='import-restaurants', description='Adds the restaurants in a CSV or JSONL file to the database.')
+    @app_commands.describe(
+        file=f'A CSV file with a header of the field names, or a JSONL file of objects. In CSV files, lists are separated by "{CSV_LIST_SEPARATOR}".',
+        create_enum_values='Whether to add new locations, cuisines, and eating options to their enums. If false, restaurants with unknown values are rejected.',
+    )
+    async def import_restaurants(
+        self,
+        interaction: discord.Interaction,
+        file: discord.Attachment,
+        create_enum_values: typing.Optional[bool] = True,
+    ):
+        if isCsvFilename(file.filename):
+            import_filename = 'restaurants.csv'
+        elif file.filename.lower().endswith('.jsonl'):
+            import_filename = 'restaurants.jsonl'
+        else:
+            await interaction.response.send_message(f'File "{file.filename}" is not a CSV or JSONL file')
+            return
+        # Large files can take longer than Discord waits for a response.
+        await interaction.response.defer()
+        with tempfile.TemporaryDirectory() as dirname:
+            import_filename = os.path.join(dirname, import_filename)
+            await file.save(import_filename)
+            num_restaurants, err = await self.restaurant_database.importRestaurants(import_filename, create_enum_values)
+        if err is None:
+            msg = f'Successfully imported {num_restaurants} restaurants from "{file.filename}"'
+        else:
+            msg = f'No restaurants were imported from "{file.filename}". {err}'
+        await interaction.followup.send(msg)
+
+    @app_commands.command(name='export-restaurants', description='Sends a file with all of the restaurants in the database.')
+    @app_commands.describe(
+        file_format='The format of the file, which import-restaurants can read back.',
+        ephemeral='Whether or not to send the response as an ephemeral message (visible only to you).',
+    )
+    async def export_restaurants(
+        self,
+        interaction: discord.Interaction,
+        file_format: typing.Literal['csv', 'jsonl'] = 'csv',
+        ephemeral: typing.Optional[bool] = False,
+    ):
+        await interaction.response.defer(ephemeral = ephemeral)
+        with tempfile.TemporaryDirectory() as dirname:
+            export_filename = os.path.join(dirname, f'restaurants.{file_format}')
+            num_restaurants = await self.restaurant_database.exportRestaurants(export_filename)
+            await interaction.followup.send(f'Exported {num_restaurants} restaurants', file = discord.File(export_filename), ephemeral = ephemeral)
+
 
 class RestaurantDatabase:
     # Field Names
@@ -768,15 +2531,27 @@ class RestaurantDatabase:
     CUISINES_ENUM = "cuisines"
     EATING_OPTIONS_ENUM = "eating_options"
 
+    # The timezone of the restaurants' hours.
+    TIMEZONE = "US/Pacific"
+
+    # The fields that search looks through.
+    SEARCH_FIELDS = (NAME_FIELD, CUISINES_FIELD, LOCATIONS_FIELD, HOURS_FIELD, URL_FIELD)
+
+
+    # The database is defined in registry, or in a registry of its own if it's None. If database is given, then it's the
+    # already defined restaurant database to use instead.
+    def __init__(self, filename = "data/restaurant_database.sqlite", pickle_filename = "data/restaurant_database.pickle", registry: DatabaseRegistry | None = None, database: LazyDatabase | None = None):
+        if database is not None:
+            self.async_database = database
+            return
 
-    def __init__(self, filename = "data/restaurant_database.pickle"):
         keys = (RestaurantDatabase.NAME_FIELD,)
         record_struct = {
             RestaurantDatabase.NAME_FIELD: FieldType(FieldType.STR, FieldType.REQUIRED),
             RestaurantDatabase.LOCATIONS_FIELD: FieldType(FieldType.ENUM, FieldType.REPEATED, RestaurantDatabase.LOCATIONS_ENUM),
             RestaurantDatabase.CUISINES_FIELD: FieldType(FieldType.ENUM, FieldType.REPEATED, RestaurantDatabase.CUISINES_ENUM),
             RestaurantDatabase.EATING_OPTIONS_FIELD: FieldType(FieldType.ENUM, FieldType.REPEATED, RestaurantDatabase.EATING_OPTIONS_ENUM),
-            RestaurantDatabase.HOURS_FIELD: FieldType(FieldType.STR, FieldType.OPTIONAL),
+            RestaurantDatabase.HOURS_FIELD: FieldType(FieldType.HOURS, FieldType.OPTIONAL),
             RestaurantDatabase.URL_FIELD: FieldType(FieldType.STR, FieldType.OPTIONAL),
 
             # TODO maybe add other fields: google maps URL, description, ...
@@ -789,21 +2564,19 @@ class RestaurantDatabase:
             ],
         }
 
-        # Try and load the database from file, if not initialize it to empty with the right fields.
-        database_impl = loadDatabase(filename)
-        if database_impl is None:
-            # Init the database if there isn't a saved version.
-            database_impl = DatabaseImpl("restaurants", [], keys, record_struct, base_enums)
-            saveDatabase(filename, database_impl)
+        if registry is None:
+            registry = DatabaseRegistry()
+        # The database is opened on first use, or created with the base_enums if it doesn't exist yet. It used to be
+        # pickled, so that is copied over the first time.
+        self.async_database = registry.define(DatabaseDefinition(
+            "restaurants", filename, keys, record_struct, base_enums,
+            search_fields = RestaurantDatabase.SEARCH_FIELDS,
+            pickle_filename = pickle_filename,
+            discord_commands = lambda database: [RestaurantDiscordCommands(RestaurantDatabase(database = database))],
+        ))
 
         # TODO Make sure that database_impl matches with keys, record_struct, and base_enums. It's okay if the loaded version has extra enum_values.
 
-        # Wrap the database_impl in an AsyncDatabaseWrapper.
-        self.async_database = AsyncDatabaseWrapper(database_impl, filename)
-
-    def getDiscordCommands(self):
-        return [RestaurantDiscordCommands(self)]
-
     # kwargs should match record_struct
     async def addRestaurant(self, **kwargs) -> (Record | None, str | None):
         return await self.async_database.addRecord(**kwargs)
@@ -823,32 +2596,47 @@ class RestaurantDatabase:
     async def updateEnumValue(self, enum_name: str, old_enum_value: str, new_enum_value: str) -> str | None:
         return await self.async_database.updateEnumValue(enum_name, old_enum_value, new_enum_value)
 
-    async def query(self, **kwargs) -> list[Record]:
-        return await self.async_database.query(**kwargs)
+    async def query(self, *conditions, **kwargs) -> list[Record]:
+        return await self.async_database.query(*conditions, **kwargs)
 
-    async def autocompleteList(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
-        return await self.async_database.autocompleteList(field_name, current, limit = limit)
+    async def search(self, text: str, limit: int = SEARCH_LIMIT) -> list[(float, Record)]:
+        return await self.async_database.search(text, limit = limit)
 
-    async def autocompleteSingle(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
-        return await self.async_database.autocompleteSingle(field_name, current, limit = limit)
+    # Locations and cuisines that the restaurants use are added to their enums.
+    async def importRestaurants(self, filename: str, create_enum_values: bool = True) -> (int, str | None):
+        return await self.async_database.importRecords(filename, create_enum_values)
 
-    def autocompleteEnumNames(self, current: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
-        rv = self.async_database.autocompleteEnumNames(current, limit = limit)
-        return rv
+    async def exportRestaurants(self, filename: str) -> int:
+        return await self.async_database.exportRecords(filename)
+
+    # Returns the query condition for restaurants that are open at t, or right now if t is None.
+    def openNowCondition(self, t: datetime.datetime | None = None) -> OpenAt:
+        if t is None:
+            t = datetime.datetime.now(pytz.timezone(RestaurantDatabase.TIMEZONE))
+        return OpenAt(RestaurantDatabase.HOURS_FIELD, minuteOfWeek(t))
+
+    async def autocompleteList(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self.async_database.autocompleteList(field_name, current, limit = limit, session_key = session_key)
+
+    async def autocompleteSingle(self, field_name: str, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self.async_database.autocompleteSingle(field_name, current, limit = limit, session_key = session_key)
+
+    async def autocompleteEnumNames(self, current: str, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self.async_database.autocompleteEnumNames(current, limit = limit, session_key = session_key)
 
-    async def autocompleteEnumValues(self, current: str, enum_name: str | None = None, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
-        return await self.async_database.autocompleteEnumValues(current, enum_name, limit = limit)
+    async def autocompleteEnumValues(self, current: str, enum_name: str | None = None, limit: int = AUTOCOMPLETE_LIMIT, session_key: typing.Hashable = None) -> list[str]:
+        return await self.async_database.autocompleteEnumValues(current, enum_name, limit = limit, session_key = session_key)
 
     async def getEnumValuesFromFieldName(self, field_name: str) -> list[str]:
         return await self.async_database.getEnumValuesFromFieldName(field_name)
 
     def restaurantRecordToStr(self, record: Record, line_prefix = "") -> str:
-        name = record.fields["name"]
-        locations = record.fields["locations"]
-        cuisines = record.fields["cuisines"]
-        eating_options = record.fields["eating_options"]
-        hours = record.fields["hours"]
-        url = record.fields["url"]
+        name = record["name"]
+        locations = record["locations"]
+        cuisines = record["cuisines"]
+        eating_options = record["eating_options"]
+        hours = record["hours"]
+        url = record["url"]
 
         rv = ""
         if url is None:
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import pickle
+import tempfile
+
+import database
+from database_test import newDatabase, state
+
+
+async def mutate(async_database):
+    await async_database.addRecord(name='Curry House', cuisines=['Thai'], hours=None, url=None, rating=2)
+    await async_database.updateRecordByKey(('Slice',), rating=5, cuisines=['Pizza', 'Tacos'])
+    await async_database.removeRecordByKey(('Pho Bar',))
+    await async_database.addEnumValue('cuisines', 'Curry')
+    await async_database.updateEnumValue('cuisines', 'Tacos', 'Mexican')
+    await async_database.removeEnumValue('cuisines', 'Pizza')
+
+
+def test_log_replay_after_crash():
+    with tempfile.TemporaryDirectory() as dirname:
+        filename = os.path.join(dirname, 'test.pickle')
+        database.saveDatabase(filename, newDatabase())
+        expected = newDatabase()
+        asyncio.run(mutate(database.AsyncDatabaseWrapper(expected)))
+
+        # The wrapper is never closed, like when the bot is killed.
+        asyncio.run(mutate(database.AsyncDatabaseWrapper(database.loadDatabase(filename), filename)))
+        # A torn write at the end of the log is dropped.
+        with open(database.logFilename(filename), 'ab') as f:
+            f.write(pickle.dumps((100, 'removeRecordByKey', (('Slice',),), {}))[:-3])
+
+        reloaded = database.loadDatabase(filename)
+        assert database.replayLog(database.logFilename(filename), reloaded) == 6
+        assert state(reloaded) == state(expected)
+        assert reloaded.log_sequence == 6
+        # Entries that are already in the database aren't applied twice.
+        assert database.replayLog(database.logFilename(filename), reloaded) == 6
+        assert state(reloaded) == state(expected)
+
+
+def test_log_compaction_matches_replay():
+    compaction_entries = database.LOG_COMPACTION_ENTRIES
+    database.LOG_COMPACTION_ENTRIES = 4
+    try:
+        with tempfile.TemporaryDirectory() as dirname:
+            compacted_filename = os.path.join(dirname, 'compacted.pickle')
+            async_database = database.AsyncDatabaseWrapper(newDatabase(), compacted_filename)
+            asyncio.run(mutate(async_database))
+            # The first 4 mutations were saved to the database, and the log only has the rest.
+            assert async_database.log_entries == 2
+            compacted = database.AsyncDatabaseWrapper(database.loadDatabase(compacted_filename), compacted_filename)
+
+            database.LOG_COMPACTION_ENTRIES = 1000
+            replayed_filename = os.path.join(dirname, 'replayed.pickle')
+            database.saveDatabase(replayed_filename, newDatabase())
+            asyncio.run(mutate(database.AsyncDatabaseWrapper(database.loadDatabase(replayed_filename), replayed_filename)))
+            replayed = database.AsyncDatabaseWrapper(database.loadDatabase(replayed_filename), replayed_filename)
+
+            assert state(compacted.database_impl) == state(replayed.database_impl)
+            assert compacted.database_impl.log_sequence == replayed.database_impl.log_sequence == 6
+    finally:
+        database.LOG_COMPACTION_ENTRIES = compaction_entries
+
+
+def test_pickle_rebuilds_indexes():
+    database_impl = newDatabase()
+    database_impl.updateEnumValue('cuisines', 'Tacos', 'Mexican')
+    database_impl.query(cuisines=['Pizza'])
+    assert list(database_impl.__getstate__()) == list(database.DatabaseImpl.PERSISTENT_FIELDS)
+
+    loaded = pickle.loads(pickle.dumps(database_impl))
+    assert loaded.posting_indexes == database_impl.posting_indexes
+    assert loaded.range_indexes == database_impl.range_indexes
+    assert loaded.posting_indexes['cuisines']['Mexican'] == {('Taco Truck',)}
+    assert [r['name'] for r in loaded.query(cuisines=['Pizza'])] == ['Slice', 'Taco Truck']
+    assert state(loaded) == state(database_impl)
+
+
+if __name__ == '__main__':
+    test_log_replay_after_crash()
+    test_log_compaction_matches_replay()
+    test_pickle_rebuilds_indexes()
@@ -0,0 +1,141 @@
+import asyncio
+import copyreg
+import os
+import pickle
+import tempfile
+
+import database
+from database import FieldType
+from database_test import CUISINES, KEYS, RECORD_STRUCT, RECORDS, SEARCH_FIELDS, newDatabase, newSqliteDatabase, state
+
+
+# The results of the same queries, searches and autocompletes on either engine.
+def results(database_impl):
+    async def autocompletes():
+        return [
+            await database_impl.autocompleteSingle('name', 'tha'),
+            await database_impl.autocompleteList('cuisines', 'thai, p'),
+            await database_impl.autocompleteEnumValues('mex', 'cuisines'),
+            await database_impl.autocompleteEnumNames('cus'),
+        ]
+
+    queries = [
+        {'cuisines': ['Pizza']},
+        {'cuisines': ['Mexican', 'Thai']},
+        {'name': ['Slice', 'Nowhere']},
+        {'rating': [5]},
+    ]
+    return (
+        [sorted(record['name'] for record in database_impl.query(**query)) for query in queries],
+        sorted(record['name'] for record in database_impl.query(database.Range('rating', 3, None))),
+        [(round(score, 6), record['name']) for score, record in database_impl.search('thai pizza')],
+        asyncio.run(autocompletes()),
+    )
+
+
+# Pickles like the objects that were saved before they had __getstate__, which only had their __dict__.
+class BaselinePickle:
+    def __init__(self, cls, state):
+        self.cls = cls
+        self.state = state
+
+    def __reduce__(self):
+        return copyreg._reconstructor, (self.cls, object, None), self.state
+
+
+# Returns the result of the method, or the message of the exception that it raised.
+def call(database_impl, method, args, kwargs):
+    try:
+        return getattr(database_impl, method)(*args, **kwargs)
+    except Exception as e:
+        return str(e)
+
+
+def test_sqlite_matches_in_memory():
+    with tempfile.TemporaryDirectory() as dirname:
+        sqlite_impl = newSqliteDatabase(os.path.join(dirname, 'test.sqlite'))
+        database_impl = newDatabase()
+        assert state(sqlite_impl) == state(database_impl)
+        operations = [
+            ('addRecord', (), {'name': 'Curry House', 'cuisines': ['Thai', 'Thai'], 'hours': None, 'url': None, 'rating': 2}),
+            ('addRecord', (), {'name': 'Slice', 'cuisines': [], 'hours': None, 'url': None, 'rating': 2}),
+            ('addRecord', (), {'name': 'Bad', 'cuisines': ['Nope'], 'hours': None, 'url': None, 'rating': 2}),
+            ('updateRecordByKey', (('Slice',),), {'rating': 5, 'cuisines': ['Tacos', 'Pizza', 'Thai']}),
+            ('updateRecordByKey', (('Slice',),), {'name': 'Big Slice'}),
+            ('updateRecordByKey', (('Big Slice',),), {'name': 'Thai Palace'}),
+            ('updateRecordByKey', (('Missing',),), {'rating': 1}),
+            ('removeRecordByKey', (('Pho Bar',),), {}),
+            ('removeRecordByKey', (('Pho Bar',),), {}),
+            ('addEnumValue', ('cuisines', 'Curry'), {}),
+            ('addEnumValue', ('cuisines', 'Curry'), {}),
+            ('updateEnumValue', ('cuisines', 'Tacos', 'Mexican'), {}),
+            ('updateEnumValue', ('cuisines', 'Tacos', 'Mexican'), {}),
+            ('removeEnumValue', ('cuisines', 'Pizza'), {}),
+            ('removeEnumValue', ('missing', 'Pizza'), {}),
+        ]
+        for method, args, kwargs in operations:
+            sqlite_result = call(sqlite_impl, method, args, kwargs)
+            expected = call(database_impl, method, args, kwargs)
+            if isinstance(expected, tuple):
+                sqlite_record, sqlite_err = sqlite_result
+                record, err = expected
+                assert sqlite_err == err, (method, args, kwargs)
+                assert (sqlite_record and sqlite_record.fields) == (record and record.fields)
+            else:
+                assert sqlite_result == expected, (method, args, kwargs)
+            assert state(sqlite_impl) == state(database_impl), (method, args, kwargs)
+            assert results(sqlite_impl) == results(database_impl), (method, args, kwargs)
+
+        # The REPEATED field is stored in its child table, in order.
+        child_rows = sqlite_impl.connection.execute(
+            'SELECT records.name, child.value FROM records_cuisines AS child JOIN records ON records.id = child.record_id '
+            'ORDER BY records.name, child.position').fetchall()
+        records = sorted(database_impl.query(), key=lambda record: record['name'])
+        assert child_rows == [(record['name'], value) for record in records for value in record['cuisines']]
+        assert ('Curry House', 'Thai') in child_rows
+
+        # Everything is still there after opening the file again.
+        sqlite_impl.close()
+        sqlite_impl = database.SqliteDatabaseImpl('test', os.path.join(dirname, 'test.sqlite'), KEYS, RECORD_STRUCT, {}, SEARCH_FIELDS)
+        assert state(sqlite_impl) == state(database_impl)
+        assert results(sqlite_impl) == results(database_impl)
+        sqlite_impl.close()
+
+
+def test_migrate_baseline_pickle_to_sqlite():
+    record_struct = {field_name: field_type for field_name, field_type in RECORD_STRUCT.items() if field_type.base_type != FieldType.HOURS}
+    records = [{field_name: fields[field_name] for field_name in record_struct} for fields in RECORDS]
+    with tempfile.TemporaryDirectory() as dirname:
+        pickle_filename = os.path.join(dirname, 'test.pickle')
+        baseline = BaselinePickle(database.DatabaseImpl, {
+            'name': 'test',
+            'keys': KEYS,
+            'record_struct': record_struct,
+            'enums': {'cuisines': list(CUISINES)},
+            'records': {(fields['name'],): BaselinePickle(database.Record, {'fields': fields}) for fields in records},
+        })
+        with open(pickle_filename, 'wb') as f:
+            pickle.dump(baseline, f)
+        # Changes made after the last save are in the log.
+        database_impl = database.loadDatabase(pickle_filename)
+        with open(database.logFilename(pickle_filename), 'wb') as f:
+            pickle.dump((1, 'updateEnumValue', ('cuisines', 'Tacos', 'Mexican'), {}), f)
+        database_impl.updateEnumValue('cuisines', 'Tacos', 'Mexican')
+
+        sqlite_filename = os.path.join(dirname, 'test.sqlite')
+        database.migratePickleToSqlite(pickle_filename, sqlite_filename)
+        assert not os.path.exists(sqlite_filename + '.tmp')
+        sqlite_impl = database.SqliteDatabaseImpl('test', sqlite_filename, KEYS, record_struct, {}, ())
+        assert state(sqlite_impl) == state(database_impl)
+        assert results(sqlite_impl) == results(database_impl)
+        sqlite_impl.close()
+
+        # The SQLite database is the source of truth once it exists.
+        os.remove(pickle_filename)
+        database.migratePickleToSqlite(pickle_filename, sqlite_filename)
+        assert os.path.exists(sqlite_filename)
+
+
+if __name__ == '__main__':
+    test_sqlite_matches_in_memory()
+    test_migrate_baseline_pickle_to_sqlite()
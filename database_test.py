@@ -0,0 +1,430 @@
+import asyncio
+import datetime
+import itertools
+import os
+import pickle
+import tempfile
+
+import pytz
+
+import database
+from database import AnyOf, And, FieldType, Not, OpenAt, Or, Range
+
+RECORD_STRUCT = {
+    'name': FieldType(FieldType.STR, FieldType.REQUIRED),
+    'cuisines': FieldType(FieldType.ENUM, FieldType.REPEATED, 'cuisines'),
+    'hours': FieldType(FieldType.HOURS, FieldType.OPTIONAL),
+    'url': FieldType(FieldType.STR, FieldType.OPTIONAL),
+    'rating': FieldType(FieldType.INT, FieldType.OPTIONAL),
+}
+KEYS = ('name',)
+SEARCH_FIELDS = ('name', 'cuisines', 'hours', 'url')
+CUISINES = ['Thai', 'Pizza', 'Tacos', 'Phở']
+RECORDS = [
+    {'name': 'Thai Palace', 'cuisines': ['Thai'], 'hours': 'Mon-Fri 11am-9pm', 'url': None, 'rating': 4},
+    {'name': 'Slice', 'cuisines': ['Pizza'], 'hours': 'daily 11-11', 'url': 'https://slice.example.com', 'rating': 3},
+    {'name': 'Taco Truck', 'cuisines': ['Tacos', 'Pizza'], 'hours': 'Fri-Sun 17:00-02:00', 'url': None, 'rating': None},
+    {'name': 'Pho Bar', 'cuisines': ['Phở'], 'hours': None, 'url': None, 'rating': 5},
+    {'name': 'Nowhere', 'cuisines': [], 'hours': 'closed', 'url': None, 'rating': 1},
+]
+
+
+def newDatabase(records=RECORDS):
+    records = [database.Record(database.recordSchema(RECORD_STRUCT), tuple(fields[f] for f in RECORD_STRUCT)) for fields in records]
+    return database.DatabaseImpl('test', records, KEYS, RECORD_STRUCT, {'cuisines': list(CUISINES)}, SEARCH_FIELDS)
+
+
+# Every record, as comparable tuples, along with the enums.
+def state(database_impl):
+    records = sorted(tuple(tuple(v) if isinstance(v, (list, tuple)) else v for v in record.values) for record in database_impl.query())
+    return records, database_impl.enums
+
+
+def newSqliteDatabase(filename, records=RECORDS):
+    sqlite_impl = database.SqliteDatabaseImpl('test', filename, KEYS, RECORD_STRUCT, {'cuisines': list(CUISINES)}, SEARCH_FIELDS)
+    count, err = sqlite_impl.addRecords(records)
+    assert err is None and count == len(records)
+    return sqlite_impl
+
+
+# Minute of the week of a time on a day, where Monday is 0.
+def minute(day, hour, minute=0):
+    return day * database.MINUTES_PER_DAY + hour * 60 + minute
+
+
+# Table of (condition, names of the matching records).
+QUERY_CASES = [
+    (AnyOf('cuisines', ['Pizza']), ['Slice', 'Taco Truck']),
+    (AnyOf('cuisines', ['Pizza', 'Thai']), ['Slice', 'Taco Truck', 'Thai Palace']),
+    (AnyOf('name', []), []),
+    (Range('rating', 3, 4), ['Slice', 'Thai Palace']),
+    (Range('rating', None, 3), ['Nowhere', 'Slice']),
+    (Range('rating', 4, None), ['Pho Bar', 'Thai Palace']),
+    (Range('rating', None, None), ['Nowhere', 'Pho Bar', 'Slice', 'Thai Palace']),
+    # Records without a rating aren't in any range, so Not matches them.
+    (Not(Range('rating', 3, None)), ['Nowhere', 'Taco Truck']),
+    (Not(AnyOf('cuisines', ['Pizza'])), ['Nowhere', 'Pho Bar', 'Thai Palace']),
+    (And(AnyOf('cuisines', ['Pizza']), Range('rating', 3, None)), ['Slice']),
+    (Or(AnyOf('name', ['Nowhere']), Range('rating', 5, 5)), ['Nowhere', 'Pho Bar']),
+    (Or(And(AnyOf('cuisines', ['Thai']), Not(Range('rating', 5, None))), AnyOf('cuisines', ['Phở'])), ['Pho Bar', 'Thai Palace']),
+    (And(), ['Nowhere', 'Pho Bar', 'Slice', 'Taco Truck', 'Thai Palace']),
+    (Or(), []),
+    (OpenAt('hours', minute(0, 11)), ['Slice', 'Thai Palace']),
+    (OpenAt('hours', minute(0, 10, 59)), []),
+    (OpenAt('hours', minute(0, 21)), ['Slice']),
+    (OpenAt('hours', minute(0, 23)), []),
+    (OpenAt('hours', minute(5, 1, 59)), ['Taco Truck']),
+    (OpenAt('hours', minute(5, 2)), []),
+    # Sunday night's hours wrap around to Monday morning.
+    (OpenAt('hours', minute(0, 1)), ['Taco Truck']),
+    (OpenAt('hours', -60), ['Taco Truck']),
+    (Not(OpenAt('hours', minute(0, 1))), ['Nowhere', 'Pho Bar', 'Slice', 'Thai Palace']),
+    (And(OpenAt('hours', minute(4, 18)), AnyOf('cuisines', ['Pizza'])), ['Slice', 'Taco Truck']),
+]
+
+
+def test_query_conditions():
+    with tempfile.TemporaryDirectory() as dirname:
+        sqlite_impl = newSqliteDatabase(os.path.join(dirname, 'test.sqlite'))
+        for database_impl in [newDatabase(), sqlite_impl]:
+            for condition, expected in QUERY_CASES:
+                assert sorted(record['name'] for record in database_impl.query(condition)) == expected, (database_impl, condition.shape())
+        sqlite_impl.close()
+
+
+# Table of (hours, the intervals that they parse to).
+HOURS_CASES = [
+    ('Mon-Fri 11am-9pm', tuple((minute(day, 11), minute(day, 21)) for day in range(5))),
+    ('24/7', ((0, database.MINUTES_PER_WEEK),)),
+    ('Mon-Sun 24 hours', ((0, database.MINUTES_PER_WEEK),)),
+    ('daily 11-11', tuple((minute(day, 11), minute(day, 23)) for day in range(7))),
+    ('Sat, Sun 10-10', ((minute(5, 10), minute(5, 22)), (minute(6, 10), minute(6, 22)))),
+    ('weekends 12-4', ((minute(5, 12), minute(5, 16)), (minute(6, 12), minute(6, 16)))),
+    ('Mon 11am-2pm & 5-10pm', ((minute(0, 11), minute(0, 14)), (minute(0, 17), minute(0, 22)))),
+    ('Mon 9am-5pm; Mon 4pm-8pm', ((minute(0, 9), minute(0, 20)),)),
+    ('Mon 9am-5pm; Tue closed', ((minute(0, 9), minute(0, 17)),)),
+    # Past midnight.
+    ('Mon 17:00-02:00', ((minute(0, 17), minute(1, 2)),)),
+    ('Sat 10pm-2am', ((minute(5, 22), minute(6, 2)),)),
+    # Sunday night wraps around to Monday morning.
+    ('Sun 10pm-2am', ((0, minute(0, 2)), (minute(6, 22), database.MINUTES_PER_WEEK))),
+    ('fri-mon 9-5', tuple((minute(day, 9), minute(day, 17)) for day in [0, 4, 5, 6])),
+    ('Tue closed', ()),
+    ('Mon', ()),
+    ('whenever', ()),
+    ('Mon 9am-25pm', ()),
+]
+
+
+def test_parse_hours():
+    for hours, expected in HOURS_CASES:
+        assert database.parseHours(hours) == expected, hours
+
+
+def test_weekly_interval_index():
+    index = database.WeeklyIntervalIndex()
+    index.add('late', database.parseHours('Sun 10pm-2am'))
+    index.add('early', database.parseHours('Mon 1am-3am'))
+    index.add('always', database.parseHours('24/7'))
+    # Table of (minute, keys open then). Intervals include their start and not their end.
+    cases = [
+        (0, {'late', 'always'}),
+        (minute(0, 1) - 1, {'late', 'always'}),
+        (minute(0, 1), {'late', 'early', 'always'}),
+        (minute(0, 2) - 1, {'late', 'early', 'always'}),
+        (minute(0, 2), {'early', 'always'}),
+        (minute(0, 3), {'always'}),
+        (minute(6, 22) - 1, {'always'}),
+        (minute(6, 22), {'late', 'always'}),
+        (database.MINUTES_PER_WEEK - 1, {'late', 'always'}),
+        (database.MINUTES_PER_WEEK, {'late', 'always'}),
+        (-1, {'late', 'always'}),
+    ]
+    for at, expected in cases:
+        assert index.keysAt(at) == expected, at
+
+    index.remove('late', database.parseHours('Sun 10pm-2am'))
+    index.remove('always', database.parseHours('24/7'))
+    for at, expected in [(0, set()), (minute(0, 1), {'early'}), (minute(0, 3) - 1, {'early'}), (minute(0, 3), set()), (-1, set())]:
+        assert index.keysAt(at) == expected, at
+
+
+def test_open_now():
+    timezone = pytz.timezone(database.RestaurantDatabase.TIMEZONE)
+    with tempfile.TemporaryDirectory() as dirname:
+        restaurant_database = database.RestaurantDatabase(os.path.join(dirname, 'test.sqlite'), os.path.join(dirname, 'test.pickle'))
+        # 2024-01-01 is a Monday. Table of (local time, names of the open restaurants).
+        cases = [
+            (datetime.datetime(2024, 1, 1, 0, 0), ['Taco Truck']),
+            (datetime.datetime(2024, 1, 1, 1, 59), ['Taco Truck']),
+            (datetime.datetime(2024, 1, 1, 2, 0), []),
+            (datetime.datetime(2024, 1, 1, 11, 0), ['Slice', 'Thai Palace']),
+            (datetime.datetime(2024, 1, 1, 20, 59), ['Slice', 'Thai Palace']),
+            (datetime.datetime(2024, 1, 1, 21, 0), ['Slice']),
+            (datetime.datetime(2024, 1, 1, 23, 0), []),
+            (datetime.datetime(2024, 1, 5, 16, 59), ['Slice', 'Thai Palace']),
+            (datetime.datetime(2024, 1, 5, 17, 0), ['Slice', 'Taco Truck', 'Thai Palace']),
+            (datetime.datetime(2024, 1, 7, 23, 59), ['Taco Truck']),
+        ]
+        database_impl = newDatabase()
+        for t, expected in cases:
+            condition = restaurant_database.openNowCondition(timezone.localize(t))
+            assert sorted(record['name'] for record in database_impl.query(condition)) == expected, t
+
+
+def test_query_plan_cache():
+    database_impl = newDatabase()
+    assert [r['name'] for r in database_impl.query(cuisines=['Pizza'])] == ['Slice', 'Taco Truck']
+    # Only the shape matters, not the values or how many there are.
+    assert [r['name'] for r in database_impl.query(cuisines=['Thai', 'Phở', 'Tacos'])] == ['Pho Bar', 'Taco Truck', 'Thai Palace']
+    assert (database_impl.query_plans.hits, database_impl.query_plans.misses) == (1, 1)
+    assert [r['name'] for r in database_impl.query(Range('rating', 5))] == ['Pho Bar']
+    assert [r['name'] for r in database_impl.query(Range('rating', None, 1))] == ['Nowhere']
+    assert [r['name'] for r in database_impl.query(Range('rating', 1, 3))] == ['Nowhere', 'Slice']
+    assert (database_impl.query_plans.hits, database_impl.query_plans.misses) == (1, 4)
+    assert [r['name'] for r in database_impl.query(Range('rating', 4, 4))] == ['Thai Palace']
+    assert (database_impl.query_plans.hits, database_impl.query_plans.misses) == (2, 4)
+
+    with tempfile.TemporaryDirectory() as dirname:
+        sqlite_impl = newSqliteDatabase(os.path.join(dirname, 'test.sqlite'))
+        assert [r['name'] for r in sqlite_impl.query(cuisines=['Pizza'])] == ['Slice', 'Taco Truck']
+        assert [r['name'] for r in sqlite_impl.query(cuisines=['Thai'])] == ['Thai Palace']
+        assert (sqlite_impl.query_plans.hits, sqlite_impl.query_plans.misses) == (1, 1)
+        # The SQL has a placeholder per value, so a different number of values is a different plan.
+        assert [r['name'] for r in sqlite_impl.query(cuisines=['Thai', 'Phở', 'Tacos'])] == ['Pho Bar', 'Taco Truck', 'Thai Palace']
+        assert (sqlite_impl.query_plans.hits, sqlite_impl.query_plans.misses) == (1, 2)
+        sqlite_impl.close()
+
+
+def test_import_export_round_trip():
+    async def roundTrip(async_database, filename):
+        num_exported = await async_database.exportRecords(filename)
+        num_imported, err = await async_database.importRecords(filename)
+        return num_exported, num_imported, err
+
+    with tempfile.TemporaryDirectory() as dirname:
+        for extension in ['csv', 'jsonl']:
+            filename = os.path.join(dirname, f'restaurants.{extension}')
+            exported = newDatabase()
+            imported = database.SqliteDatabaseImpl('test', os.path.join(dirname, f'{extension}.sqlite'), KEYS, RECORD_STRUCT, {'cuisines': list(CUISINES)}, SEARCH_FIELDS)
+            assert asyncio.run(database.AsyncDatabaseWrapper(exported).exportRecords(filename)) == len(RECORDS)
+            assert asyncio.run(database.AsyncDatabaseWrapper(imported).importRecords(filename)) == (len(RECORDS), None)
+            # None, [], ints, and accents all come back as they were.
+            assert state(imported) == state(exported)
+            # Importing the same records again would duplicate their keys, so none of them are added.
+            num_exported, num_imported, err = asyncio.run(roundTrip(database.AsyncDatabaseWrapper(imported), filename))
+            assert (num_exported, num_imported) == (len(RECORDS), 0)
+            assert err.startswith('Row 1: ') and err.endswith('already exists')
+            assert state(imported) == state(exported)
+            imported.close()
+
+
+def test_import_unknown_enum_values():
+    rows = [
+        {'name': 'Ramen Shop', 'cuisines': ['Ramen', 'Thai'], 'hours': None, 'url': None, 'rating': 4},
+        {'name': 'Noodle Bar', 'cuisines': ['Noodles', 'Ramen'], 'hours': 'daily 11-11', 'url': None, 'rating': None},
+    ]
+    with tempfile.TemporaryDirectory() as dirname:
+        for extension in ['csv', 'jsonl']:
+            filename = os.path.join(dirname, f'restaurants.{extension}')
+            with database.RecordFileWriter(filename, RECORD_STRUCT) as writer:
+                for fields in rows:
+                    writer.write(database.recordSchema(RECORD_STRUCT).record(fields))
+
+            database_impl = newDatabase()
+            async_database = database.AsyncDatabaseWrapper(database_impl)
+            num_imported, err = asyncio.run(async_database.importRecords(filename, create_enum_values = False))
+            assert num_imported == 0
+            assert err.startswith('Row 1: ') and 'cuisines' in err
+            # Nothing was added, not even the rows before the invalid one.
+            assert state(database_impl) == state(newDatabase())
+
+            assert asyncio.run(async_database.importRecords(filename, create_enum_values = True)) == (2, None)
+            assert database_impl.enums['cuisines'] == CUISINES + ['Ramen', 'Noodles']
+            assert [r['name'] for r in database_impl.query(cuisines=['Ramen'])] == ['Noodle Bar', 'Ramen Shop']
+            assert database_impl.getRecordByKey(('Noodle Bar',)).fields == dict(rows[1], cuisines=('Noodles', 'Ramen'))
+            assert asyncio.run(database_impl.autocompleteEnumValues('ramen', 'cuisines'))[0] == 'Ramen'
+
+
+# The checks that FieldType.validate made before the validators were compiled, with its fixes since: single ENUM values
+# are checked (it used to raise a NameError), records store REPEATED fields as tuples, and HOURS are checked like STR.
+def uncompiledValidate(field_type, value, enum_values):
+    if value is None:
+        return field_type.mode == FieldType.OPTIONAL
+    if field_type.mode == FieldType.REPEATED:
+        return isinstance(value, (list, tuple)) and all(uncompiledValidateValue(field_type, v, enum_values) for v in value)
+    return uncompiledValidateValue(field_type, value, enum_values)
+
+
+def uncompiledValidateValue(field_type, value, enum_values):
+    if field_type.base_type == FieldType.INT:
+        return isinstance(value, int)
+    if field_type.base_type in (FieldType.STR, FieldType.HOURS):
+        return isinstance(value, str)
+    if enum_values is None:
+        raise Exception(f'When validating field_type of "{field_type.enum_name}", unexpected enum_values: None')
+    return isinstance(value, str) and value in enum_values
+
+
+VALIDATOR_VALUES = [
+    None, 0, -3, True, 1.5, '', 'Thai', 'Ramen', 'Mon-Fri 11am-9pm', [], (), ['Thai'], ('Thai', 'Pizza'), ['Thai', 'Ramen'],
+    [1, 2], ['a', 1], [None], [['Thai']], {'Thai'}, {'Thai': 1},
+]
+
+
+def test_compiled_validators():
+    enum_values = frozenset(CUISINES)
+    for base_type, mode in itertools.product(FieldType.ALL_TYPES, FieldType.ALL_MODES):
+        field_type = FieldType(base_type, mode, 'cuisines' if base_type == FieldType.ENUM else None)
+        validator = field_type.compileValidator()
+        for value in VALIDATOR_VALUES:
+            expected = uncompiledValidate(field_type, value, enum_values)
+            assert validator(value, enum_values) == expected, (base_type, mode, value)
+            assert field_type.validate(value, enum_values) == expected, (base_type, mode, value)
+            # Lists of enum values work too, like the enums of a database before they're sets.
+            assert validator(value, CUISINES) == expected, (base_type, mode, value)
+
+    try:
+        FieldType(FieldType.ENUM, FieldType.REQUIRED, 'cuisines').compileValidator()('Thai', None)
+        assert False
+    except Exception as e:
+        assert str(e) == 'When validating field_type of "cuisines", unexpected enum_values: None'
+
+
+# Returns the message of the exception that validateRecord raised, or None if the record is valid.
+def validationError(database_impl, record, **kwargs):
+    try:
+        database_impl.validateRecord(record, **kwargs)
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def test_validate_record():
+    database_impl = newDatabase()
+    schema = database.recordSchema(RECORD_STRUCT)
+    valid = schema.record({'name': 'Ramen Shop', 'cuisines': ['Thai'], 'hours': None, 'url': None, 'rating': 4})
+    unknown_enum_value = valid.replace(cuisines=['Thai', 'Ramen'])
+    invalid_rating = valid.replace(rating='4')
+    assert validationError(database_impl, valid) is None
+    assert validationError(database_impl, unknown_enum_value) == 'DB "test": Record has invalid value for field "cuisines": (\'Thai\', \'Ramen\')'
+    assert validationError(database_impl, invalid_rating) == 'DB "test": Record has invalid value for field "rating": 4'
+
+    # Imports check the records against the enums with the values that they'll add.
+    enum_value_sets = {'cuisines': set(CUISINES) | {'Ramen'}}
+    assert validationError(database_impl, unknown_enum_value, enum_value_sets = enum_value_sets) is None
+    assert validationError(database_impl, invalid_rating, enum_value_sets = enum_value_sets) is not None
+    assert validationError(database_impl, valid, enum_value_sets = {}) == 'DB "test": Unknown enum "cuisines"'
+    # The override doesn't change the database's own enums.
+    assert validationError(database_impl, unknown_enum_value) is not None
+
+    # Updates only check the fields that they change.
+    assert validationError(database_impl, unknown_enum_value, field_names = ['name', 'rating']) is None
+    assert validationError(database_impl, unknown_enum_value, field_names = ['cuisines']) is not None
+    assert validationError(database_impl, invalid_rating, field_names = {'rating': '4'}) is not None
+    assert validationError(database_impl, invalid_rating, field_names = []) is None
+
+    try:
+        database_impl.updateRecordByKey(('Slice',), rating = 'five')
+        assert False
+    except Exception as e:
+        assert str(e) == 'DB "test": Record has invalid value for field "rating": five'
+    assert database_impl.getRecordByKey(('Slice',))['rating'] == 3
+    record, err = database_impl.updateRecordByKey(('Slice',), rating = 5)
+    assert err is None and record['rating'] == 5 and database_impl.getRecordByKey(('Slice',)) is record
+
+    # The validators follow the enums as they change.
+    database_impl.addEnumValue('cuisines', 'Ramen')
+    assert validationError(database_impl, unknown_enum_value) is None
+    database_impl.updateEnumValue('cuisines', 'Thai', 'Thai Food')
+    assert validationError(database_impl, unknown_enum_value) is not None
+    # The same holds after a pickle round trip, which compiles the validators again.
+    loaded = pickle.loads(pickle.dumps(database_impl))
+    assert validationError(loaded, unknown_enum_value.replace(cuisines=['Thai Food', 'Ramen'])) is None
+    assert validationError(loaded, unknown_enum_value) is not None
+
+
+def test_database_registry():
+    async def run(registry, lazy_database):
+        assert not lazy_database.isLoaded()
+        # The first use opens the database.
+        record, err = await lazy_database.addRecord(name='Curry House', cuisines=['Thai'], hours=None, url=None, rating=2)
+        assert err is None
+        assert lazy_database.isLoaded()
+        # It was just used, so it isn't idle.
+        await registry.unloadIdleDatabases()
+        assert lazy_database.isLoaded()
+
+        lazy_database.last_used -= registry.idle_seconds
+        await registry.unloadIdleDatabases()
+        assert not lazy_database.isLoaded()
+        assert not await lazy_database.unload()
+
+        # It's opened again with the changes that were made before it was closed.
+        assert [r['name'] for r in await lazy_database.query(cuisines=['Thai'])] == ['Curry House']
+        assert lazy_database.isLoaded()
+        assert not await lazy_database.unload()
+
+        # A call that is still using the database keeps it open, even when unloading it isn't only if idle.
+        release = asyncio.Event()
+        async_database = lazy_database.async_database
+        query = async_database.query
+        async def slowQuery(*conditions, **kwargs):
+            await release.wait()
+            return await query(*conditions, **kwargs)
+        async_database.query = slowQuery
+        task = asyncio.create_task(lazy_database.query(cuisines=['Thai']))
+        await asyncio.sleep(0)
+        assert not await lazy_database.unload(only_if_idle = False)
+        release.set()
+        assert [r['name'] for r in await task] == ['Curry House']
+        assert await lazy_database.unload(only_if_idle = False)
+        await registry.unloadAll()
+        assert not lazy_database.isLoaded()
+        assert (await lazy_database.autocompleteEnumValues('tha', 'cuisines'))[0] == 'Thai'
+
+    with tempfile.TemporaryDirectory() as dirname:
+        for filename in ['test.pickle', 'test.sqlite']:
+            registry = database.DatabaseRegistry(idle_seconds = 60)
+            lazy_database = registry.define(database.DatabaseDefinition(
+                'test', os.path.join(dirname, filename), KEYS, RECORD_STRUCT, {'cuisines': list(CUISINES)}, SEARCH_FIELDS))
+            assert registry.getDatabase('test') is lazy_database
+            asyncio.run(run(registry, lazy_database))
+            asyncio.run(registry.unloadAll())
+
+            try:
+                registry.define(database.DatabaseDefinition('test', os.path.join(dirname, filename), KEYS, RECORD_STRUCT, {}))
+                assert False
+            except Exception as e:
+                assert str(e) == 'Database "test" is already defined'
+
+
+def test_database_registry_discord_commands():
+    with tempfile.TemporaryDirectory() as dirname:
+        registry = database.DatabaseRegistry()
+        database.RestaurantDatabase(os.path.join(dirname, 'test.sqlite'), os.path.join(dirname, 'test.pickle'), registry = registry)
+        lazy_database = registry.getDatabase('restaurants')
+        [command_group] = registry.getDiscordCommands()
+        # The commands use the registry's database, so they open it again after it is unloaded.
+        assert command_group.restaurant_database.async_database is lazy_database
+        assert not lazy_database.isLoaded()
+        assert asyncio.run(command_group.restaurant_database.query()) == []
+        assert lazy_database.isLoaded()
+        asyncio.run(registry.unloadAll())
+        assert asyncio.run(command_group.restaurant_database.addEnumValue('cuisines', 'Thai')) is None
+        assert lazy_database.isLoaded()
+        asyncio.run(registry.unloadAll())
+
+
+if __name__ == '__main__':
+    test_query_conditions()
+    test_query_plan_cache()
+    test_parse_hours()
+    test_weekly_interval_index()
+    test_open_now()
+    test_import_export_round_trip()
+    test_import_unknown_enum_values()
+    test_compiled_validators()
+    test_validate_record()
+    test_database_registry()
+    test_database_registry_discord_commands()
@@ -1,6 +1,14 @@
-import logging
+import asyncio
+import collections
+import heapq
+import itertools
+import math
+import time
+import typing
 import unicodedata
 
+import numpy as np
+
 _CHAR_KEYBOARD_POSITION = {
     'q': (1.5, 3.0),
     'w': (2.5, 3.0),
@@ -55,15 +63,21 @@ _CHAR_KEYBOARD_POSITION = {
     ')': (10.0, 4.0),
 }
 
-_CHAR_KEYBOARD_DISTANCE = {
-    (c1, c2): ((pos1[0]-pos2[0])**2 + (pos1[1]-pos2[1])**2)**0.5
-    for c1, pos1 in _CHAR_KEYBOARD_POSITION.items()
-    for c2, pos2 in _CHAR_KEYBOARD_POSITION.items()
-}
-
 # This is the value to use if the character isn't in the above map. This will always be needed since we will compare to "None".
 _CHAR_KEYBOARD_UNKNOWN_DIST = 10.0
 
+# Characters are encoded as small, dense ints so that scorers can look up character distances in a table instead of
+# comparing characters. _PAD_CODE fills out the end of shorter strings when scoring in batches and never adds to a
+# score. _NONE_CODE is the encoding of None (i.e. a position outside of the string). Only a fixed alphabet gets codes of
+# its own, so that the tables can't grow with whatever users type. Every other character is _OTHER_CODE, which is as far
+# from every character (even itself) as an unknown character is. _CODE_CHARS maps back from codes.
+_PAD_CODE = 0
+_NONE_CODE = 1
+_OTHER_CODE = 2
+_CODE_CHARS: list[str|None] = [None, None, None] + sorted(set(map(chr, range(256))) | set(_CHAR_KEYBOARD_POSITION))
+_CHAR_CODES: dict[str, int] = {c: code for code, c in enumerate(_CODE_CHARS) if c is not None}
+
+
 def remove_accents(char_or_string):
     # 'NFD' separates characters into their base character and their accent
     normalized = unicodedata.normalize('NFD', char_or_string)
@@ -75,6 +89,12 @@ class Options:
     # Algo type
     SIMPLE = '_simple'
     WORD = '_word'
+    # Slides the shorter string within the longer one, so extra characters in the longer string are free.
+    CONTAINED = '_contained'
+    # True edit distances, where insertions and deletions cost the same as comparing a character to None.
+    LEVENSHTEIN = '_levenshtein'
+    # Levenshtein that also allows transposing two adjacent characters (i.e. optimal string alignment distance).
+    DAMERAU_LEVENSHTEIN = '_damerau_levenshtein'
     # TODO Add a hybrid methodd that is _simple but applies different weights if the words align vs. not
     # TODO Add a earth mover distance that can allow up to k gaps in between the words.
 
@@ -96,25 +116,68 @@ class Options:
             v = remove_accents(v)
         return v
 
-    def characterDistance(self, c1: str, c2: str) -> float:
-        if self.char_distance_type == Options.CHAR_EQUALITY:
-            if c1 == c2:
-                return 0
-            return 1
-        elif self.char_distance_type == Options.CHAR_KEYBORAD_DISTANCE:
-            if c1 is not None:
-                c1 = c1.lower()
-            if c2 is not None:
-                c2 = c2.lower()
-            if c1 not in _CHAR_KEYBOARD_POSITION or c2 not in _CHAR_KEYBOARD_POSITION:
-                if c1 not in _CHAR_KEYBOARD_POSITION:
-                    logging.warning(f'Unknown character: "{c1}"')
-                if c2 not in _CHAR_KEYBOARD_POSITION:
-                    logging.warning(f'Unknown character: "{c2}"')
-                return _CHAR_KEYBOARD_UNKNOWN_DIST
-            if (c1, c2) not in _CHAR_KEYBOARD_DISTANCE:
-                raise Exception(f'Both characters are in _CHAR_KEYBOARD_POSITION, but combo is not in _CHAR_KEYBOARD_DISTANCE: "{c1}", "{c2}"')
-            return _CHAR_KEYBOARD_DISTANCE[(c1, c2)]
+    def characterDistance(self, c1: str|None, c2: str|None) -> float:
+        return self.compile().characterDistance(c1, c2)
+
+    # Returns the CompiledScorer for char_distance_type. Scorers are shared between all Options, so this is cheap to call.
+    def compile(self) -> 'CompiledScorer':
+        scorer = _SCORERS.get(self.char_distance_type)
+        if scorer is None:
+            scorer = CompiledScorer(self.char_distance_type)
+            _SCORERS[self.char_distance_type] = scorer
+        return scorer
+
+
+def _equalityDistance(c1: str|None, c2: str|None) -> float:
+    if c1 == c2:
+        return 0
+    return 1
+
+
+def _keyboardDistance(c1: str|None, c2: str|None) -> float:
+    pos1 = None if c1 is None else _CHAR_KEYBOARD_POSITION.get(c1.lower())
+    pos2 = None if c2 is None else _CHAR_KEYBOARD_POSITION.get(c2.lower())
+    if pos1 is None or pos2 is None:
+        return _CHAR_KEYBOARD_UNKNOWN_DIST
+    return ((pos1[0]-pos2[0])**2 + (pos1[1]-pos2[1])**2)**0.5
+
+
+# Character distances for one char_distance_type, resolved into a dense table so that cost[code1][code2] is the
+# distance between the characters with those codes (see _CHAR_CODES).
+class CompiledScorer:
+    def __init__(self, char_distance_type: str):
+        if char_distance_type == Options.CHAR_EQUALITY:
+            self._distance = _equalityDistance
+            self._other_distance = 1.0
+        elif char_distance_type == Options.CHAR_KEYBORAD_DISTANCE:
+            self._distance = _keyboardDistance
+            self._other_distance = _CHAR_KEYBOARD_UNKNOWN_DIST
+        else:
+            raise Exception(f'Unknown char distance type: {char_distance_type}')
+        self.char_distance_type = char_distance_type
+        self.cost: list[list[float]] = [
+            [self._codeDistance(code1, code2) for code2 in range(len(_CODE_CHARS))]
+            for code1 in range(len(_CODE_CHARS))
+        ]
+
+    def _codeDistance(self, code1: int, code2: int) -> float:
+        if code1 == _PAD_CODE or code2 == _PAD_CODE:
+            return 0.0
+        if code1 == _OTHER_CODE or code2 == _OTHER_CODE:
+            return self._other_distance
+        return self._distance(_CODE_CHARS[code1], _CODE_CHARS[code2])
+
+    def encode(self, v: str) -> list[int]:
+        return [_CHAR_CODES.get(c, _OTHER_CODE) for c in v]
+
+    def characterDistance(self, c1: str|None, c2: str|None) -> float:
+        code1 = _NONE_CODE if c1 is None else _CHAR_CODES.get(c1, _OTHER_CODE)
+        code2 = _NONE_CODE if c2 is None else _CHAR_CODES.get(c2, _OTHER_CODE)
+        return self.cost[code1][code2]
+
+
+# Map of char_distance_type to its CompiledScorer.
+_SCORERS: dict[str, CompiledScorer] = {}
 
 
 def compute(v1: str, v2: str, options: Options|None = None) -> float:
@@ -122,34 +185,65 @@ def compute(v1: str, v2: str, options: Options|None = None) -> float:
         options = Options()
     v1 = options.preprocess(v1)
     v2 = options.preprocess(v2)
-    if len(v1) == 0 or len(v2) == 0:
+    return _boundedCompute(v1, None, v2, None, options, math.inf)
+
+
+# Computes the edit distance between the already preprocessed v1 and v2. Alignments are abandoned as soon as their
+# partial score exceeds bound, and if every alignment is abandoned then math.inf is returned. v1_inds and v2_inds are
+# the word indexes of v1 and v2, and are computed if they are None.
+def _boundedCompute(v1: str, v1_inds: list[int]|None, v2: str, v2_inds: list[int]|None, options: Options, bound: float) -> float:
+    is_levenshtein = options.edit_distance_type in (Options.LEVENSHTEIN, Options.DAMERAU_LEVENSHTEIN)
+    if (len(v1) == 0 or len(v2) == 0) and not is_levenshtein:
         return 0.0
+    scorer = options.compile()
+    codes1 = scorer.encode(v1)
+    codes2 = scorer.encode(v2)
+    if len(v1) == 0 or len(v2) == 0:
+        # Every character of the other string is inserted or deleted.
+        score = sum(scorer.cost[c][_NONE_CODE] for c in codes1) + sum(scorer.cost[_NONE_CODE][c] for c in codes2)
+        return math.inf if score > bound else score
     if options.edit_distance_type == Options.SIMPLE:
-        return _simple(v1, v2, options)
+        return _simple(codes1, codes2, scorer.cost, bound)
     elif options.edit_distance_type == Options.WORD:
-        return _word(v1, v2, options)
+        if v1_inds is None:
+            v1_inds = _getWordIndexes(v1)
+        if v2_inds is None:
+            v2_inds = _getWordIndexes(v2)
+        return _word(codes1, v1_inds, codes2, v2_inds, scorer.cost, bound)
+    elif options.edit_distance_type == Options.CONTAINED:
+        return _contained(codes1, codes2, scorer.cost, bound)
+    elif options.edit_distance_type in (Options.LEVENSHTEIN, Options.DAMERAU_LEVENSHTEIN):
+        transpositions = options.edit_distance_type == Options.DAMERAU_LEVENSHTEIN
+        if options.char_distance_type == Options.CHAR_EQUALITY:
+            # Each edit costs 1, so the distance is at least the difference in length.
+            if abs(len(v1) - len(v2)) > bound:
+                return math.inf
+            score = _bitParallelLevenshtein(v1, v2, transpositions)
+            return math.inf if score > bound else score
+        return _bandedLevenshtein(codes1, codes2, scorer.cost, transpositions, bound)
     raise Exception(f'Unknown edit distance type: {options.edit_distance_type}')
 
 
-def _getChar(v: str, i: int) -> str|None:
-    if i < 0 or i >= len(v):
-        return None
-    return v[i]
+# The scorers below take strings encoded by CompiledScorer.encode and that scorer's cost table.
 
 
-def _simple(v1: str, v2: str, options: Options) -> float:
+def _simple(v1: list[int], v2: list[int], cost: list[list[float]], bound: float = math.inf) -> float:
+    # Pad v1 with None so that every alignment of v2 stays within v1. Alignment i compares v1[i+j] with v2[j].
+    padding = [_NONE_CODE] * (len(v2) - 1)
+    v1 = padding + v1 + padding
     best_score = None
-    for i in range(1-len(v2), len(v1), 1):
+    for i in range(len(v1) - len(v2) + 1):
         this_score = 0
-        for j in range(len(v2)):
-            c1 = _getChar(v1, i+j)
-            c2 = _getChar(v2, j)
-            this_score += options.characterDistance(c1, c2)
-        if best_score is None or this_score < best_score:
+        for j, c2 in enumerate(v2):
+            this_score += cost[v1[i+j]][c2]
+            # Stop once this alignment can't beat the best alignment or the bound.
+            if this_score > bound or (best_score is not None and this_score >= best_score):
+                break
+        else:
             best_score = this_score
-        if best_score == 0:
-            return best_score
-    return best_score
+            if best_score == 0:
+                return best_score
+    return math.inf if best_score is None else best_score
 
 
 def _getWordIndexes(v: str) -> list[int]:
@@ -163,20 +257,729 @@ def _getWordIndexes(v: str) -> list[int]:
     return indexes
 
 
-def _word(v1: str, v2: str, options: Options) -> float:
+def _word(v1: list[int], v1_inds: list[int], v2: list[int], v2_inds: list[int], cost: list[list[float]], bound: float = math.inf) -> float:
+    # Pad v1 with None so that every alignment of v2 stays within v1.
+    offset = len(v2) - 1
+    padding = [_NONE_CODE] * offset
+    v1 = padding + v1 + padding
     best_score = None
-    v1_inds = _getWordIndexes(v1)
-    v2_inds = _getWordIndexes(v2)
     for i in v1_inds:
         this_score = 0
+        abandoned = False
         for v2_align in v2_inds:
             # Compare with aligning v1[i] with v2[v2_align]
-            for j in range(len(v2)):
-                c1 = _getChar(v1, i+j-v2_align)
-                c2 = _getChar(v2, j)
-                this_score += options.characterDistance(c1, c2)
-        if best_score is None or this_score < best_score:
+            start = i - v2_align + offset
+            for j, c2 in enumerate(v2):
+                this_score += cost[v1[start+j]][c2]
+                # Stop once this alignment can't beat the best alignment or the bound.
+                if this_score > bound or (best_score is not None and this_score >= best_score):
+                    abandoned = True
+                    break
+            if abandoned:
+                break
+        if not abandoned:
+            best_score = this_score
+            if best_score == 0:
+                return best_score
+    return math.inf if best_score is None else best_score
+
+
+def _contained(v1: list[int], v2: list[int], cost: list[list[float]], bound: float = math.inf) -> float:
+    # Swap the strings if v2 is longer, so that v2 always fits within v1.
+    if len(v2) > len(v1):
+        v1, v2 = v2, v1
+
+    best_score = None
+    for i in range(len(v1) - len(v2) + 1):
+        this_score = 0
+        for j, c2 in enumerate(v2):
+            this_score += cost[v1[i+j]][c2]
+            # Stop once this alignment can't beat the best alignment or the bound.
+            if this_score > bound or (best_score is not None and this_score >= best_score):
+                break
+        else:
             best_score = this_score
-        if best_score == 0:
-            return best_score
-    return best_score
+            if best_score == 0:
+                return best_score
+    return math.inf if best_score is None else best_score
+
+
+# Myers' bit-parallel edit distance, in the global form from Hyyro (who also added transpositions). Bit i of vp/vn is
+# set if the DP value increases/decreases between rows i and i+1 of the current column, where rows are v1's characters
+# and columns are v2's characters. Python ints are arbitrary precision, so v1 can be any length.
+def _bitParallelLevenshtein(v1: str, v2: str, transpositions: bool) -> int:
+    peq: dict[str, int] = {}
+    for i, c in enumerate(v1):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    mask = (1 << len(v1)) - 1
+    last_bit = 1 << (len(v1) - 1)
+    vp = mask
+    vn = 0
+    d0 = 0
+    prev_eq = 0
+    score = len(v1)
+    for c in v2:
+        eq = peq.get(c, 0)
+        # Transpositions are diagonal matches from two columns ago that aren't already a zero diagonal.
+        tr = (((~d0 & eq) << 1) & prev_eq) if transpositions else 0
+        d0 = (((eq & vp) + vp) ^ vp) | eq | vn | tr
+        hp = vn | (~(d0 | vp) & mask)
+        hn = vp & d0
+        if hp & last_bit:
+            score += 1
+        elif hn & last_bit:
+            score -= 1
+        hp = ((hp << 1) | 1) & mask
+        hn = (hn << 1) & mask
+        vp = hn | (~(d0 | hp) & mask)
+        vn = hp & d0
+        prev_eq = eq
+    return score
+
+
+# Weighted edit distance where substitutions cost cost[c1][c2], transpositions cost cost[c1][c2] of the swapped
+# characters, and insertions and deletions cost cost[c][_NONE_CODE].
+# Only cells within band_width of the diagonal are computed (Ukkonen's cutoff). Any path that leaves the band needs more
+# than band_width insertions and deletions, so the result is exact once it is no more than that. The band starts from
+# bound and doubles until the result is exact. Returns math.inf if the distance is more than bound.
+def _bandedLevenshtein(v1: list[int], v2: list[int], cost: list[list[float]], transpositions: bool, bound: float = math.inf) -> float:
+    v1_indel = [cost[c][_NONE_CODE] for c in v1]
+    v2_indel = [cost[_NONE_CODE][c] for c in v2]
+    min_indel = min(v1_indel + v2_indel)
+    max_width = max(len(v1), len(v2))
+
+    if min_indel <= 0 or bound == math.inf:
+        band_width = max(abs(len(v1) - len(v2)), 1)
+    else:
+        band_width = int(bound // min_indel)
+        if band_width < abs(len(v1) - len(v2)):
+            return math.inf
+
+    while True:
+        band_width = min(band_width, max_width)
+        score = _levenshteinBand(v1, v1_indel, v2, v2_indel, cost, transpositions, band_width, bound)
+        if score > bound:
+            return math.inf
+        if band_width >= max_width or score <= (band_width + 1) * min_indel:
+            return score
+        band_width *= 2
+
+
+def _levenshteinBand(v1: list[int], v1_indel: list[float], v2: list[int], v2_indel: list[float], cost: list[list[float]], transpositions: bool, band_width: int, bound: float) -> float:
+    # Rows are v1's characters and columns are v2's characters. Cells outside of the band are math.inf.
+    prev_prev_row = None
+    prev_row = [math.inf] * (len(v2) + 1)
+    prev_row[0] = 0
+    for j in range(1, min(len(v2), band_width) + 1):
+        prev_row[j] = prev_row[j-1] + v2_indel[j-1]
+
+    for i in range(1, len(v1) + 1):
+        row = [math.inf] * (len(v2) + 1)
+        if i <= band_width:
+            row[0] = prev_row[0] + v1_indel[i-1]
+        for j in range(max(1, i - band_width), min(len(v2), i + band_width) + 1):
+            score = min(
+                prev_row[j-1] + cost[v1[i-1]][v2[j-1]],
+                prev_row[j] + v1_indel[i-1],
+                row[j-1] + v2_indel[j-1],
+            )
+            if transpositions and i > 1 and j > 1 and v1[i-1] == v2[j-2] and v1[i-2] == v2[j-1]:
+                score = min(score, prev_prev_row[j-2] + cost[v1[i-1]][v1[i-2]])
+            row[j] = score
+        # Every path passes through this row, so stop once it can't be within the bound.
+        if min(row) > bound:
+            return math.inf
+        prev_prev_row = prev_row
+        prev_row = row
+    return prev_row[len(v2)]
+
+
+# ----------------------------------------
+# |                                      |
+# |          Vectorized Scoring          |
+# |                                      |
+# ----------------------------------------
+
+# Map of (char_distance_type, is_contained) to the cost matrix for all of the codes in _CHAR_CODES.
+_COST_MATRICES: dict[(str, bool), np.ndarray] = {}
+
+# Upper bound on the number of (candidate, alignment, character) cells that are scored in one NumPy operation.
+_MAX_BATCH_CELLS = 1 << 22
+
+# Source of AutocompleteIndex.version.
+_INDEX_VERSIONS = itertools.count()
+
+# Indexes built with an ngram_size are only prefiltered once they have at least PREFILTER_MIN_CANDIDATES candidates, and
+# then only the PREFILTER_SHORTLIST_SIZE candidates that share the most n-grams with the query are scored.
+NGRAM_SIZE = 3
+PREFILTER_MIN_CANDIDATES = 500
+PREFILTER_SHORTLIST_SIZE = 200
+
+
+# Returns the n-grams of v, padded with spaces so that the start and end of v form their own n-grams.
+def _ngrams(v: str, n: int) -> set[str]:
+    padded = f' {v} '
+    return {padded[i:i+n] for i in range(len(padded) - n + 1)}
+
+
+def _encode(v: str) -> np.ndarray:
+    return np.fromiter((_CHAR_CODES.get(c, _OTHER_CODE) for c in v), dtype=np.int32, count=len(v))
+
+
+def _costMatrix(options: Options) -> np.ndarray:
+    is_contained = options.edit_distance_type == Options.CONTAINED
+    cost = _COST_MATRICES.get((options.char_distance_type, is_contained))
+    if cost is not None:
+        return cost
+
+    cost = np.array(options.compile().cost)
+    if is_contained:
+        # The shorter string always fits within the longer one, so overhanging characters are free.
+        cost[_NONE_CODE, :] = 0.0
+    _COST_MATRICES[(options.char_distance_type, is_contained)] = cost
+    return cost
+
+
+# Scores each row of v1 against the same row of v2. Either side can have a single row, which is broadcast against the
+# other side. v1 must be padded with _NONE_CODE and v2 must be padded with _PAD_CODE. v1_starts and v2_starts mark the
+# start of each word, and are only needed for Options.WORD.
+def _scoreBatch(
+        v1: np.ndarray, len1: np.ndarray, v1_starts: np.ndarray,
+        v2: np.ndarray, len2: np.ndarray, v2_starts: np.ndarray,
+        options: Options, cost: np.ndarray,
+) -> np.ndarray:
+    l1 = v1.shape[1]
+    l2 = v2.shape[1]
+
+    # Column t of raw_scores is the score of aligning v1[t-(l2-1)] with v2[0], i.e. the inner loop of _simple.
+    v1_padded = np.full((v1.shape[0], l1 + 2 * (l2 - 1)), _NONE_CODE, dtype=np.int32)
+    v1_padded[:, l2-1:l2-1+l1] = v1
+    window = np.arange(l1 + l2 - 1)[:, None] + np.arange(l2)[None, :]
+    raw_scores = cost[v1_padded[:, window], v2[:, None, :]].sum(axis=2)
+
+    shifts = np.arange(l1 + l2 - 1)[None, :] - (l2 - 1)
+    if options.edit_distance_type == Options.SIMPLE:
+        valid = (shifts >= (1 - len2)[:, None]) & (shifts <= (len1 - 1)[:, None])
+        scores = np.where(valid, raw_scores, np.inf).min(axis=1)
+    elif options.edit_distance_type == Options.WORD:
+        # Aligning word i of v1 with word j of v2 uses the alignment at shift i-j.
+        align = np.arange(l1)[:, None] - np.arange(l2)[None, :] + (l2 - 1)
+        word_scores = (raw_scores[:, align] * v2_starts[:, None, :]).sum(axis=2)
+        scores = np.where(v1_starts, word_scores, np.inf).min(axis=1)
+    elif options.edit_distance_type == Options.CONTAINED:
+        delta = (len1 - len2)[:, None]
+        valid = (shifts >= np.minimum(delta, 0)) & (shifts <= np.maximum(delta, 0))
+        scores = np.where(valid, raw_scores, np.inf).min(axis=1)
+    else:
+        raise Exception(f'Unknown edit distance type: {options.edit_distance_type}')
+
+    return np.where((len1 == 0) | (len2 == 0), 0.0, scores)
+
+
+# Preprocessed and encoded set of candidates that can be scored against many queries. Candidates are reference counted,
+# so a value can be added multiple times and is only dropped from the index once every copy has been removed.
+class AutocompleteIndex:
+    def __init__(self, candidates: typing.Iterable[str] = (), options: Options|None = None, candidates_first: bool = False, ngram_size: int|None = None):
+        if options is None:
+            options = Options()
+        self.options = options
+        # If set, candidates are scored as compute(candidate, query), otherwise as compute(query, candidate).
+        self.candidates_first = candidates_first
+
+        # If set, candidates are also indexed by their n-grams so that top_k can shortlist large indexes. This is for
+        # candidate sets that grow without limit, since the shortlist can miss candidates that share no n-grams.
+        self.ngram_size = ngram_size
+        self._ngram_candidates: dict[str, set[str]] = {}
+
+        # Row i of the index holds candidates[i]. Removing a candidate moves the last row into its place.
+        self.candidates: list[str] = []
+        self.preprocessed: list[str] = []
+        self.word_indexes: list[list[int]] = []
+        self.counts: dict[str, int] = {}
+        self._rows: dict[str, int] = {}
+
+        # Encoded candidates padded with _PAD_CODE. These have spare rows and columns so that adds are cheap.
+        self._codes = np.full((0, 1), _PAD_CODE, dtype=np.int32)
+        self._lens = np.zeros(0, dtype=np.int64)
+        self._word_starts = np.zeros((0, 1), dtype=bool)
+
+        # Rows sorted by length so that similarly sized candidates are scored together. Reset whenever a row changes.
+        self._length_order = None
+
+        # Changes whenever the set of candidates changes, and is unique across all indexes, so that results computed
+        # from this index can be cached under (query, version).
+        self.version = next(_INDEX_VERSIONS)
+
+        for candidate in candidates:
+            self.add(candidate)
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def __contains__(self, candidate: str) -> bool:
+        return candidate in self.counts
+
+    def _reserve(self, num_rows: int, width: int):
+        capacity, current_width = self._codes.shape
+        if num_rows <= capacity and width <= current_width:
+            return
+        new_capacity = max(capacity, 16)
+        while new_capacity < num_rows:
+            new_capacity *= 2
+        new_width = max(current_width, width)
+
+        codes = np.full((new_capacity, new_width), _PAD_CODE, dtype=np.int32)
+        codes[:capacity, :current_width] = self._codes
+        self._codes = codes
+        lens = np.zeros(new_capacity, dtype=np.int64)
+        lens[:capacity] = self._lens
+        self._lens = lens
+        word_starts = np.zeros((new_capacity, new_width), dtype=bool)
+        word_starts[:capacity, :current_width] = self._word_starts
+        self._word_starts = word_starts
+
+    def add(self, candidate: str):
+        if candidate in self.counts:
+            self.counts[candidate] += 1
+            return
+        self.counts[candidate] = 1
+
+        preprocessed = self.options.preprocess(candidate)
+        codes = _encode(preprocessed)
+        word_indexes = _getWordIndexes(preprocessed)
+
+        row = len(self.candidates)
+        self._reserve(row + 1, len(codes))
+        self._codes[row, :] = _PAD_CODE
+        self._codes[row, :len(codes)] = codes
+        self._lens[row] = len(codes)
+        self._word_starts[row, :] = False
+        self._word_starts[row, word_indexes] = True
+
+        self.candidates.append(candidate)
+        self.preprocessed.append(preprocessed)
+        self.word_indexes.append(word_indexes)
+        self._rows[candidate] = row
+        self._length_order = None
+        self.version = next(_INDEX_VERSIONS)
+
+        if self.ngram_size is not None:
+            for ngram in _ngrams(preprocessed, self.ngram_size):
+                self._ngram_candidates.setdefault(ngram, set()).add(candidate)
+
+    def remove(self, candidate: str):
+        if candidate not in self.counts:
+            raise Exception(f'Unknown autocomplete candidate "{candidate}"')
+        self.counts[candidate] -= 1
+        if self.counts[candidate] > 0:
+            return
+        del self.counts[candidate]
+
+        row = self._rows.pop(candidate)
+        if self.ngram_size is not None:
+            for ngram in _ngrams(self.preprocessed[row], self.ngram_size):
+                self._ngram_candidates[ngram].discard(candidate)
+                if len(self._ngram_candidates[ngram]) == 0:
+                    del self._ngram_candidates[ngram]
+
+        last_row = len(self.candidates) - 1
+        if row != last_row:
+            self._codes[row] = self._codes[last_row]
+            self._lens[row] = self._lens[last_row]
+            self._word_starts[row] = self._word_starts[last_row]
+            self.candidates[row] = self.candidates[last_row]
+            self.preprocessed[row] = self.preprocessed[last_row]
+            self.word_indexes[row] = self.word_indexes[last_row]
+            self._rows[self.candidates[row]] = row
+        self.candidates.pop()
+        self.preprocessed.pop()
+        self.word_indexes.pop()
+        self._length_order = None
+        self.version = next(_INDEX_VERSIONS)
+
+    # Whether top_k shortlists the candidates for the already preprocessed query.
+    def _prefilters(self, query: str) -> bool:
+        return self.ngram_size is not None and len(self.candidates) >= PREFILTER_MIN_CANDIDATES and len(query) >= self.ngram_size
+
+    # Returns the rows of the candidates that share the most n-grams with the already preprocessed query, or None if
+    # fewer than k candidates share any and every row should be scored instead.
+    def _shortlist(self, query: str, k: int) -> list[int]|None:
+        shared_counts = collections.Counter()
+        for ngram in _ngrams(query, self.ngram_size):
+            shared_counts.update(self._ngram_candidates.get(ngram, ()))
+        if len(shared_counts) < k:
+            return None
+        return [self._rows[candidate] for candidate, _ in shared_counts.most_common(max(k, PREFILTER_SHORTLIST_SIZE))]
+
+    # Returns the score of every candidate against query, in the same order as self.candidates.
+    def scores(self, query: str, candidates_first: bool|None = None) -> np.ndarray:
+        if candidates_first is None:
+            candidates_first = self.candidates_first
+
+        num_rows = len(self.candidates)
+        scores = np.zeros(num_rows)
+        query = self.options.preprocess(query)
+        if num_rows == 0:
+            return scores
+
+        if self.options.edit_distance_type in (Options.LEVENSHTEIN, Options.DAMERAU_LEVENSHTEIN):
+            # The DP doesn't fit the shifted alignments that _scoreBatch vectorizes, so score each candidate on its own.
+            for row, candidate in enumerate(self.preprocessed):
+                if candidates_first:
+                    scores[row] = _boundedCompute(candidate, None, query, None, self.options, math.inf)
+                else:
+                    scores[row] = _boundedCompute(query, None, candidate, None, self.options, math.inf)
+            return scores
+
+        if len(query) == 0:
+            return scores
+        query_codes = _encode(query)[None, :]
+        query_lens = np.array([len(query)])
+        query_starts = np.zeros(query_codes.shape, dtype=bool)
+        query_starts[0, _getWordIndexes(query)] = True
+        cost = _costMatrix(self.options)
+
+        if self._length_order is None:
+            self._length_order = np.argsort(self._lens[:num_rows], kind='stable')
+        sorted_lens = self._lens[self._length_order]
+        batch_cells = (len(query) + sorted_lens) * np.maximum(len(query), sorted_lens)
+
+        start = 0
+        while start < num_rows:
+            # The rows are sorted by length, so the last row in the batch determines the padded size.
+            end = min(num_rows, start + max(1, _MAX_BATCH_CELLS // int(batch_cells[start])))
+            while end - start > 1 and (end - start) * int(batch_cells[end-1]) > _MAX_BATCH_CELLS:
+                end = start + max(1, _MAX_BATCH_CELLS // int(batch_cells[end-1]))
+
+            batch = self._length_order[start:end]
+            width = max(1, int(sorted_lens[end-1]))
+            codes = self._codes[batch, :width]
+            lens = self._lens[batch]
+            word_starts = self._word_starts[batch, :width]
+            if candidates_first:
+                codes = np.where(codes == _PAD_CODE, _NONE_CODE, codes)
+                scores[batch] = _scoreBatch(codes, lens, word_starts, query_codes, query_lens, query_starts, self.options, cost)
+            else:
+                scores[batch] = _scoreBatch(query_codes, query_lens, query_starts, codes, lens, word_starts, self.options, cost)
+            start = end
+
+        return scores
+
+
+# Equivalent to [compute(query, candidate, options) for candidate in candidates], or to
+# [compute(candidate, query, options) for candidate in candidates] if candidates_first is set, but scores all of the
+# candidates in a handful of NumPy operations.
+def compute_many(query: str, candidates: list[str], options: Options|None = None, candidates_first: bool = False) -> np.ndarray:
+    index = AutocompleteIndex(candidates, options, candidates_first)
+    scores = index.scores(query)
+    return scores[[index._rows[candidate] for candidate in candidates]]
+
+
+# ----------------------------------------
+# |                                      |
+# |             Top-k Search             |
+# |                                      |
+# ----------------------------------------
+
+AUTOCOMPLETE_LIMIT = 25
+# Seconds that top_k_async scores for before returning the best results so far.
+AUTOCOMPLETE_BUDGET = 0.2
+# Number of candidates that top_k_async scores between yields to the event loop.
+_ASYNC_CHUNK_SIZE = 256
+
+
+# Entry in the bounded heap used by top_k. The comparison is reversed so that heapq keeps the worst entry on top.
+class _HeapEntry:
+    __slots__ = ('key', 'candidate')
+
+    def __init__(self, key: tuple, candidate: str):
+        self.key = key
+        self.candidate = candidate
+
+    def __lt__(self, other: '_HeapEntry') -> bool:
+        return other.key < self.key
+
+
+# Returns the k best (score, candidate) pairs in index for query, sorted by score and then by tiebreak(candidate) (which
+# defaults to the candidate itself). Only a heap of the k best candidates is kept, and each candidate's alignments are
+# abandoned as soon as they score worse than the current k-th best candidate. Large indexes with an ngram_size only score
+# the candidates that share the most n-grams with query.
+def top_k(query: str, index: AutocompleteIndex, k: int = AUTOCOMPLETE_LIMIT, tiebreak: typing.Callable[[str], typing.Any]|None = None) -> list[(float, str)]:
+    scan = _topKScan(query, index, k, tiebreak)
+    scan.run()
+    return scan.results()
+
+
+# Same as top_k, but scores the candidates in chunks and yields to the event loop between them. Once budget seconds have
+# passed, the best of the candidates scored so far are returned, so a large index can't stall other interactions.
+async def top_k_async(
+        query: str, index: AutocompleteIndex, k: int = AUTOCOMPLETE_LIMIT,
+        tiebreak: typing.Callable[[str], typing.Any]|None = None, budget: float = AUTOCOMPLETE_BUDGET,
+) -> list[(float, str)]:
+    scan = _topKScan(query, index, k, tiebreak)
+    await scan.runAsync(budget)
+    return scan.results()
+
+
+def _topKScan(query: str, index: AutocompleteIndex, k: int, tiebreak: typing.Callable[[str], typing.Any]|None) -> '_TopKScan':
+    query = index.options.preprocess(query)
+    rows = None
+    if index._prefilters(query):
+        rows = index._shortlist(query, k)
+    if rows is None:
+        rows = range(len(index.candidates))
+    return _TopKScan(query, index, rows, k, tiebreak)
+
+
+# Scores the given rows of index against the already preprocessed query, keeping the best k as in top_k. If
+# lower_bounds is given, it must hold a lower bound on the score of every row and rows must be sorted by it. Scanning then
+# stops once no remaining row can make the top k, and lower_bounds is tightened with the scores that were computed.
+class _TopKScan:
+    def __init__(
+            self, query: str, index: AutocompleteIndex, rows: typing.Iterable[int], k: int,
+            tiebreak: typing.Callable[[str], typing.Any]|None, lower_bounds: np.ndarray|None = None,
+    ):
+        if tiebreak is None:
+            tiebreak = lambda candidate: candidate
+        self.query = query
+        self.query_inds = _getWordIndexes(query)
+        self.index = index
+        self.version = index.version
+        self.rows = iter(rows)
+        self.k = k
+        self.tiebreak = tiebreak
+        self.lower_bounds = lower_bounds
+        self.heap: list[_HeapEntry] = []
+        self.done = k <= 0
+
+    # Scores up to max_rows more rows (or all of them). Returns whether the scan is done.
+    def step(self, max_rows: int|None = None) -> bool:
+        # The rows are only valid for the version of the index that they came from.
+        if self.done or self.index.version != self.version:
+            self.done = True
+            return self.done
+
+        index = self.index
+        heap = self.heap
+        num_rows = 0
+        for row in itertools.islice(self.rows, max_rows):
+            num_rows += 1
+            bound = heap[0].key[0] if len(heap) >= self.k else math.inf
+            if self.lower_bounds is not None and self.lower_bounds[row] - _LOWER_BOUND_TOLERANCE > bound:
+                self.done = True
+                break
+            candidate = index.candidates[row]
+            if index.candidates_first:
+                score = _boundedCompute(index.preprocessed[row], index.word_indexes[row], self.query, self.query_inds, index.options, bound)
+            else:
+                score = _boundedCompute(self.query, self.query_inds, index.preprocessed[row], index.word_indexes[row], index.options, bound)
+            if self.lower_bounds is not None:
+                # An abandoned score is known to be more than bound.
+                self.lower_bounds[row] = max(self.lower_bounds[row], bound) if score > bound else score
+            if score > bound:
+                continue
+
+            entry = _HeapEntry((score, self.tiebreak(candidate)), candidate)
+            if len(heap) < self.k:
+                heapq.heappush(heap, entry)
+            elif entry.key < heap[0].key:
+                heapq.heapreplace(heap, entry)
+        else:
+            # islice only stops short if the rows ran out.
+            if max_rows is None or num_rows < max_rows:
+                self.done = True
+        return self.done
+
+    def run(self):
+        while not self.done:
+            self.step()
+
+    async def runAsync(self, budget: float):
+        deadline = time.monotonic() + budget
+        while not self.step(_ASYNC_CHUNK_SIZE) and time.monotonic() < deadline:
+            await asyncio.sleep(0)
+
+    def results(self) -> list[(float, str)]:
+        return [(entry.key[0], entry.candidate) for entry in sorted(self.heap, reverse=True)]
+
+
+# ----------------------------------------
+# |                                      |
+# |               Caching                |
+# |                                      |
+# ----------------------------------------
+
+CACHE_SIZE = 4096
+
+
+# Bounded cache that evicts the least recently used entry once it holds max_size entries. hits and misses count the
+# results of get, so that the cache's usefulness can be checked.
+class LruCache:
+    def __init__(self, max_size: int = CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Returns the cached value for key, or None if key isn't cached.
+    def get(self, key: typing.Hashable) -> typing.Any:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: typing.Hashable, value: typing.Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Same as compute(v1, v2, options), but remembers the results in cache. Every call that uses a cache must pass the same
+# options, since they aren't part of the key.
+def cachedCompute(v1: str, v2: str, options: Options, cache: LruCache) -> float:
+    v1 = options.preprocess(v1)
+    v2 = options.preprocess(v2)
+    score = cache.get((v1, v2))
+    if score is None:
+        score = _boundedCompute(v1, None, v2, None, options, math.inf)
+        cache.put((v1, v2), score)
+    return score
+
+
+# ----------------------------------------
+# |                                      |
+# |        Autocomplete Sessions         |
+# |                                      |
+# ----------------------------------------
+
+# Seconds that an autocomplete session is kept after its last request.
+AUTOCOMPLETE_SESSION_TTL = 60.0
+MAX_AUTOCOMPLETE_SESSIONS = 1024
+
+# Lower bounds and scores are summed in different orders by NumPy and by the scorers, so they are only compared up to
+# this tolerance.
+_LOWER_BOUND_TOLERANCE = 1e-9
+
+
+class _AutocompleteSession:
+    __slots__ = ('index', 'version', 'query', 'lower_bounds', 'expires')
+
+    def __init__(self, index: AutocompleteIndex, query: str, lower_bounds: np.ndarray, expires: float):
+        self.index = index
+        self.version = index.version
+        self.query = query
+        self.lower_bounds = lower_bounds
+        self.expires = expires
+
+
+# Remembers a lower bound on every candidate's score from the last request of each session (e.g. a (user, command,
+# option) tuple). When the next query extends the last one, the bounds are loosened to cover the appended characters
+# and only the candidates that could still make the top k are rescored. The results are the same as top_k.
+class AutocompleteSessions:
+    def __init__(self, ttl: float = AUTOCOMPLETE_SESSION_TTL, max_sessions: int = MAX_AUTOCOMPLETE_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # Ordered from least to most recently used, which is also the order that they expire in.
+        self._sessions: collections.OrderedDict[typing.Hashable, _AutocompleteSession] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self, now: float):
+        while len(self._sessions) > 0:
+            key, session = next(iter(self._sessions.items()))
+            if session.expires > now and len(self._sessions) < self.max_sessions:
+                break
+            del self._sessions[key]
+
+    def topK(
+            self, session_key: typing.Hashable, query: str, index: AutocompleteIndex, k: int = AUTOCOMPLETE_LIMIT,
+            tiebreak: typing.Callable[[str], typing.Any]|None = None,
+    ) -> list[(float, str)]:
+        scan = self._scan(session_key, query, index, k, tiebreak)
+        scan.run()
+        return scan.results()
+
+    # Same as topK, but with the time budget of top_k_async. The bounds of the candidates that weren't scored in time are
+    # still valid, so the session can be extended afterwards.
+    async def topKAsync(
+            self, session_key: typing.Hashable, query: str, index: AutocompleteIndex, k: int = AUTOCOMPLETE_LIMIT,
+            tiebreak: typing.Callable[[str], typing.Any]|None = None, budget: float = AUTOCOMPLETE_BUDGET,
+    ) -> list[(float, str)]:
+        scan = self._scan(session_key, query, index, k, tiebreak)
+        await scan.runAsync(budget)
+        return scan.results()
+
+    def _scan(
+            self, session_key: typing.Hashable, query: str, index: AutocompleteIndex, k: int,
+            tiebreak: typing.Callable[[str], typing.Any]|None,
+    ) -> _TopKScan:
+        now = time.monotonic()
+        self._evict(now)
+        query = index.options.preprocess(query)
+        if index._prefilters(query):
+            # Shortlisting already avoids scoring most of the candidates, and doesn't give bounds for the rest.
+            self._sessions.pop(session_key, None)
+            return _topKScan(query, index, k, tiebreak)
+
+        lower_bounds = None
+        session = self._sessions.pop(session_key, None)
+        if session is not None and session.index is index and session.version == index.version and query.startswith(session.query):
+            lower_bounds = _extendLowerBounds(index, session.query, query, session.lower_bounds)
+        if lower_bounds is None:
+            lower_bounds = index.scores(query)
+
+        # The scan tightens lower_bounds in place, so the session sees its progress.
+        self._sessions[session_key] = _AutocompleteSession(index, query, lower_bounds, now + self.ttl)
+        return _TopKScan(query, index, np.argsort(lower_bounds, kind='stable'), k, tiebreak, lower_bounds)
+
+
+# Returns lower bounds on the scores of index's candidates against new_query, given lower bounds on their scores against
+# old_query, where new_query extends old_query. Returns None if there isn't a useful bound.
+def _extendLowerBounds(index: AutocompleteIndex, old_query: str, new_query: str, lower_bounds: np.ndarray) -> np.ndarray|None:
+    num_appended = len(new_query) - len(old_query)
+    if num_appended == 0:
+        return lower_bounds.copy()
+
+    options = index.options
+    scorer = options.compile()
+    old_codes = scorer.encode(old_query)
+    scorer.encode(new_query)
+    none_costs = scorer.cost[_NONE_CODE][_NONE_CODE+1:]
+    lens = index._lens[:len(index.candidates)]
+
+    if options.edit_distance_type == Options.CONTAINED:
+        # While the query fits within the candidate, appending to it only adds to the score of every alignment.
+        return np.where(lens < len(new_query), 0.0, lower_bounds)
+    if index.candidates_first:
+        if options.edit_distance_type == Options.WORD:
+            # Appending to v2 only adds to the score of every alignment.
+            return lower_bounds.copy()
+        if options.edit_distance_type == Options.SIMPLE:
+            # Appending to v2 only adds to the score of the existing alignments. The new alignments compare all of
+            # old_query to None.
+            return np.minimum(lower_bounds, sum(scorer.cost[_NONE_CODE][code] for code in old_codes))
+    else:
+        # Appending to v1 replaces None with a character in up to num_appended places per alignment of each word.
+        max_decrease = num_appended * max(none_costs)
+        if options.edit_distance_type == Options.WORD:
+            # New words in v1 add alignments that aren't bounded by the old ones.
+            if _getWordIndexes(new_query) != _getWordIndexes(old_query):
+                return None
+            word_counts = index._word_starts[:len(index.candidates)].sum(axis=1)
+            return lower_bounds - max_decrease * word_counts
+        if options.edit_distance_type == Options.SIMPLE:
+            # The new alignments still compare all but num_appended of the candidate's characters to None.
+            return np.minimum(lower_bounds - max_decrease, np.maximum(lens - num_appended, 0) * min(none_costs))
+    return None
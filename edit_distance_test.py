@@ -1,7 +1,155 @@
+import asyncio
+
 import edit_distance
 
 # TODO Add some simple tests to double check the algos
 
+ALL_OPTIONS = [
+    edit_distance.Options(edit_distance_type, char_distance_type)
+    for edit_distance_type in [
+        edit_distance.Options.SIMPLE, edit_distance.Options.WORD, edit_distance.Options.CONTAINED,
+        edit_distance.Options.LEVENSHTEIN, edit_distance.Options.DAMERAU_LEVENSHTEIN,
+    ]
+    for char_distance_type in [edit_distance.Options.CHAR_EQUALITY, edit_distance.Options.CHAR_KEYBORAD_DISTANCE]
+]
+
+CANDIDATES = ['Reinhardt', 'King\'s Row', 'Watchpoint: Gibraltar', 'Lúcio', 'Route 66', 'a  b', '']
+QUERIES = ['rein', 'kings row', 'gibralter', 'lucio', ' 6', '']
+
+
+def test_compute_many_matches_compute():
+    for options in ALL_OPTIONS:
+        for query in QUERIES:
+            scores = edit_distance.compute_many(query, CANDIDATES, options)
+            reversed_scores = edit_distance.compute_many(query, CANDIDATES, options, candidates_first = True)
+            for candidate, score, reversed_score in zip(CANDIDATES, scores, reversed_scores):
+                assert abs(score - edit_distance.compute(query, candidate, options)) < 1e-9
+                assert abs(reversed_score - edit_distance.compute(candidate, query, options)) < 1e-9
+
+
+def test_autocomplete_index_add_and_remove():
+    options = ALL_OPTIONS[0]
+    index = edit_distance.AutocompleteIndex(CANDIDATES, options)
+    index.add('Reinhardt')
+    index.remove('Reinhardt')
+    index.remove('Route 66')
+    index.add('Ramattra')
+    assert sorted(index.candidates) == sorted(set(CANDIDATES) - {'Route 66'} | {'Ramattra'})
+    for candidate, score in zip(index.candidates, index.scores('rein')):
+        assert abs(score - edit_distance.compute('rein', candidate, options)) < 1e-9
+
+
+def test_top_k_matches_sorted_scores():
+    for options in ALL_OPTIONS:
+        for candidates_first in [False, True]:
+            index = edit_distance.AutocompleteIndex(CANDIDATES, options, candidates_first)
+            for query in QUERIES:
+                expected = sorted(zip(index.scores(query).tolist(), index.candidates))[:3]
+                assert [c for _, c in edit_distance.top_k(query, index, 3)] == [c for _, c in expected]
+
+
+def test_levenshtein():
+    options = edit_distance.Options(edit_distance.Options.LEVENSHTEIN, edit_distance.Options.CHAR_EQUALITY)
+    assert edit_distance.compute('kitten', 'sitting', options) == 3
+    assert edit_distance.compute('ca', 'abc', options) == 3
+    options = edit_distance.Options(edit_distance.Options.DAMERAU_LEVENSHTEIN, edit_distance.Options.CHAR_EQUALITY)
+    assert edit_distance.compute('ca', 'abc', options) == 3
+    assert edit_distance.compute('reinhadrt', 'reinhardt', options) == 1
+    for edit_distance_type in [edit_distance.Options.LEVENSHTEIN, edit_distance.Options.DAMERAU_LEVENSHTEIN]:
+        # Against an empty string, every character is inserted or deleted.
+        equality = edit_distance.Options(edit_distance_type, edit_distance.Options.CHAR_EQUALITY)
+        assert edit_distance.compute('', 'abc', equality) == 3
+        assert edit_distance.compute('abc', '', equality) == 3
+        assert edit_distance.compute('', '', equality) == 0
+        keyboard = edit_distance.Options(edit_distance_type, edit_distance.Options.CHAR_KEYBORAD_DISTANCE)
+        assert edit_distance.compute('', 'ab', keyboard) == 2 * keyboard.characterDistance('a', None)
+    # The other types treat an empty string as matching anything.
+    assert edit_distance.compute('', 'abc', edit_distance.Options(edit_distance.Options.SIMPLE)) == 0
+    for edit_distance_type in [edit_distance.Options.LEVENSHTEIN, edit_distance.Options.DAMERAU_LEVENSHTEIN]:
+        equality = edit_distance.Options(edit_distance_type, edit_distance.Options.CHAR_EQUALITY)
+        keyboard = edit_distance.Options(edit_distance_type, edit_distance.Options.CHAR_KEYBORAD_DISTANCE)
+        for query in QUERIES:
+            for candidate in CANDIDATES:
+                if query and candidate:
+                    # With unit costs the banded DP must agree with the bit-parallel one.
+                    scorer = equality.compile()
+                    v1 = scorer.encode(equality.preprocess(query))
+                    v2 = scorer.encode(equality.preprocess(candidate))
+                    transpositions = edit_distance_type == edit_distance.Options.DAMERAU_LEVENSHTEIN
+                    assert edit_distance._bandedLevenshtein(v1, v2, scorer.cost, transpositions) == edit_distance.compute(query, candidate, equality)
+                assert edit_distance.compute(query, candidate, keyboard) == edit_distance.compute(candidate, query, keyboard)
+
+
+def test_other_characters_share_a_code():
+    for options in ALL_OPTIONS:
+        scorer = options.compile()
+        size = len(scorer.cost)
+        assert edit_distance.compute_many('日本', [chr(c) * 3 for c in range(0x4e00, 0x4e00 + 500)], options) is not None
+        assert len(scorer.cost) == size and len(edit_distance._CODE_CHARS) == size
+        assert scorer.characterDistance('日', 'a') == scorer.characterDistance('本', 'a') == scorer._other_distance
+
+
+def test_lru_cache():
+    cache = edit_distance.LruCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    options = ALL_OPTIONS[0]
+    assert edit_distance.cachedCompute('Rein', 'reinhardt', options, cache) == edit_distance.compute('rein', 'reinhardt', options)
+    assert edit_distance.cachedCompute('rein', 'Reinhardt', options, cache) == edit_distance.compute('rein', 'reinhardt', options)
+    assert cache.hits == 4
+
+    index = edit_distance.AutocompleteIndex(CANDIDATES, options)
+    version = index.version
+    index.add('Ramattra')
+    assert index.version != version
+
+
+def test_autocomplete_sessions_match_top_k():
+    for options in ALL_OPTIONS:
+        for candidates_first in [False, True]:
+            index = edit_distance.AutocompleteIndex(CANDIDATES, options, candidates_first)
+            sessions = edit_distance.AutocompleteSessions()
+            for query in ['k', 'ki', 'kin', 'kings', 'kings r', 'kings row', 'g', 'gi', 'gib raltar']:
+                expected = edit_distance.top_k(query, index, 3)
+                assert [c for _, c in sessions.topK('user', query, index, 3)] == [c for _, c in expected]
+            assert len(sessions) == 1
+
+
+def test_ngram_prefilter():
+    options = edit_distance.Options(edit_distance.Options.WORD, edit_distance.Options.CHAR_KEYBORAD_DISTANCE)
+    names = [f'{a} {b}' for a in ['Pho', 'Taco', 'Pizza', 'Burger', 'Noodle', 'Sushi', 'Curry'] for b in range(100)]
+    index = edit_distance.AutocompleteIndex(names, options, candidates_first = True, ngram_size = edit_distance.NGRAM_SIZE)
+    assert index._prefilters('taco 42')
+    shortlist = [index.candidates[row] for row in index._shortlist('taco 42', 25)]
+    assert shortlist[0] == 'Taco 42' and len(shortlist) < len(names) / 2
+    assert edit_distance.top_k('taco 42', index, 1)[0][1] == 'Taco 42'
+    for name in names[1:]:
+        index.remove(name)
+    assert index._ngram_candidates.keys() == edit_distance._ngrams('pho 0', edit_distance.NGRAM_SIZE)
+
+
+def test_top_k_async():
+    options = ALL_OPTIONS[0]
+    index = edit_distance.AutocompleteIndex(CANDIDATES * 100 + [f'{c} {i}' for c in CANDIDATES for i in range(200)], options)
+    for query in QUERIES:
+        assert asyncio.run(edit_distance.top_k_async(query, index, 3, budget = 60)) == edit_distance.top_k(query, index, 3)
+    # Even without any budget, the first chunk is scored.
+    assert len(asyncio.run(edit_distance.top_k_async('rein', index, 3, budget = 0))) == 3
+
+
 if __name__ == '__main__':
-    # TODO Run tests
-    pass
\ No newline at end of file
+    test_compute_many_matches_compute()
+    test_autocomplete_index_add_and_remove()
+    test_top_k_matches_sorted_scores()
+    test_levenshtein()
+    test_other_characters_share_a_code()
+    test_lru_cache()
+    test_autocomplete_sessions_match_top_k()
+    test_ngram_prefilter()
+    test_top_k_async()
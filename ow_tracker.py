@@ -6,6 +6,7 @@ import typing
 import os
 import os.path
 import pickle
+import shutil
 from datetime import date as date_cls, datetime, time, timedelta
 import logging
 import pytz
@@ -20,26 +21,66 @@ DPS = 'DPS'
 SUPPORT = 'Support'
 ROLES = [TANK, DPS, SUPPORT]
 
-# Load maps, heroes, and stadium heroes constants from human-readable JSON
-with open('data/overwatch_data.json', 'r', encoding='utf-8') as f:
-    _ow_data = json.load(f)
+# Move this to a central util file.
+# TODO Update each call location to use different options.
+CUSTOM_EDIT_DISTANCE_OPTIONS = edit_distance.Options(
+    edit_distance_type = edit_distance.Options.WORD,
+    char_distance_type = edit_distance.Options.CHAR_KEYBORAD_DISTANCE,
+    ignore_case = True,
+)
+
+OW_DATA_FILENAME = 'data/overwatch_data.json'
+
+
+# Load maps, heroes, and stadium heroes constants from human-readable JSON, along with the autocomplete indexes for
+# them. Each index scores candidates with CUSTOM_EDIT_DISTANCE_OPTIONS.
+def loadOwData():
+    global MAPS, HEROES, STADIUM_HEROES
+    global MAP_INDEX, HERO_INDEX, HERO_INDEXES_BY_ROLE, STADIUM_HERO_INDEX, STADIUM_POWER_INDEXES, ALL_STADIUM_POWER_INDEX
+
+    with open(OW_DATA_FILENAME, 'r', encoding='utf-8') as f:
+        ow_data = json.load(f)
+
+    MAPS = ow_data['MAPS']
+    HEROES = ow_data['HEROES']
+    STADIUM_HEROES = ow_data['STADIUM_HEROES']
+
+    MAP_INDEX = edit_distance.AutocompleteIndex(MAPS, CUSTOM_EDIT_DISTANCE_OPTIONS, candidates_first = True)
+    HERO_INDEX = edit_distance.AutocompleteIndex(HEROES, CUSTOM_EDIT_DISTANCE_OPTIONS, candidates_first = True)
+    HERO_INDEXES_BY_ROLE = {
+        role: edit_distance.AutocompleteIndex(
+            [hero for hero, hero_role in HEROES.items() if hero_role == role],
+            CUSTOM_EDIT_DISTANCE_OPTIONS,
+            candidates_first = True,
+        )
+        for role in ROLES
+    }
+    STADIUM_HERO_INDEX = edit_distance.AutocompleteIndex(STADIUM_HEROES, CUSTOM_EDIT_DISTANCE_OPTIONS, candidates_first = True)
+    STADIUM_POWER_INDEXES = {
+        hero: edit_distance.AutocompleteIndex(powers, CUSTOM_EDIT_DISTANCE_OPTIONS, candidates_first = True)
+        for hero, powers in STADIUM_HEROES.items()
+    }
+    ALL_STADIUM_POWER_INDEX = edit_distance.AutocompleteIndex(
+        [power for _, powers in STADIUM_HEROES.items() for power in powers],
+        CUSTOM_EDIT_DISTANCE_OPTIONS,
+        candidates_first = True,
+    )
 
-MAPS = _ow_data['MAPS']
-HEROES = _ow_data['HEROES']
-STADIUM_HEROES = _ow_data['STADIUM_HEROES']
 
+loadOwData()
 
-# Move this to a central util file.
-def customEditDistance(v1, v2):
-    # TODO Update each call location to use different options.
-    options = edit_distance.Options(
-        edit_distance_type = edit_distance.Options.WORD,
-        char_distance_type = edit_distance.Options.CHAR_KEYBORAD_DISTANCE,
-        ignore_case = True,
-    )
-    return edit_distance.compute(v1, v2, options)
+# Cache of (normalized input, index version) to the result of getMap/getHero.
+RESOLVE_CACHE = edit_distance.LruCache()
 
 
+def _resolve(value, index):
+    key = (CUSTOM_EDIT_DISTANCE_OPTIONS.preprocess(value), index.version)
+    resolved = RESOLVE_CACHE.get(key)
+    if resolved is None:
+        resolved = index.candidates[index.scores(value, candidates_first = False).argmin()]
+        RESOLVE_CACHE.put(key, resolved)
+    return resolved
+
 
 def formatNum(v, digits = 2):
     sv = str(v)
@@ -49,31 +90,19 @@ def formatNum(v, digits = 2):
 
 def getMap(map):
     if map not in MAPS:
-        best_match = None
-        best_ed = None
-        for m in MAPS:
-            m_ed = customEditDistance(map, m)
-            if best_match is None or m_ed < best_ed:
-                best_match = m
-                best_ed = m_ed
-        map = best_match
+        map = _resolve(map, MAP_INDEX)
     return map
 
 
 def getHero(hero):
     if hero not in HEROES:
-        best_match = None
-        best_ed = None
-        for h, _ in HEROES.items():
-            h_ed = customEditDistance(hero, h)
-            if best_match is None or h_ed < best_ed:
-                best_match = h
-                best_ed = h_ed
-        hero = best_match
+        hero = _resolve(hero, HERO_INDEX)
     return hero
 
 
 OW_TRACKER_FILENAME = 'data/ow_tracker.pickle'
+# Each user's OverwatchTracker is pickled to its own file in this directory.
+OW_TRACKER_DIRNAME = 'data/ow_tracker'
 SEASON_FILENAME = 'data/season.pickle'
 HERO_CHALLENGE_FILENAME = 'data/hero_challenge.pickle'
 
@@ -96,32 +125,19 @@ class OwTrackerDiscordCommands(app_commands.Group):
         # This is a workaround to make hero_autocomplete accept an optional role.
         self.autocomplete_role = None
 
-    MAP_CHOICES = [app_commands.Choice(name=map, value=map) for map in MAPS]
+        # Reuses the work from the previous keystroke of each (user, command, option).
+        self.autocomplete_sessions = edit_distance.AutocompleteSessions()
 
     async def map_autocomplete(
             self, interaction: discord.Interaction,
             current: str) -> typing.List[app_commands.Choice[str]]:
-        map_choices = list(OwTrackerDiscordCommands.MAP_CHOICES)
-
-        # Get the edit distance between the current string and map name.
-        map_edit_distance = {
-            map: customEditDistance(map, current)
-            for map in MAPS
-        }
-
-        # Sort maps by edit distance
-        map_choices.sort(
-            key=lambda map: (map_edit_distance[map.value], map.value))
-
-        if len(map_choices) > AUTOCOMPLETE_LIMIT:
-            map_choices = map_choices[:AUTOCOMPLETE_LIMIT]
-
-        return map_choices
-
-    HERO_CHOICES = [
-        app_commands.Choice(name=hero, value=hero)
-        for hero, _ in HEROES.items()
-    ]
+        # Get the closest maps by edit distance (and then by name).
+        return [
+            app_commands.Choice(name=map, value=map)
+            for _, map in await self.autocomplete_sessions.topKAsync(
+                (interaction.user.id, interaction.command.qualified_name, 'map'),
+                current, MAP_INDEX, AUTOCOMPLETE_LIMIT)
+        ]
 
     async def hero_autocomplete_with_role(
             self, interaction: discord.Interaction,
@@ -134,55 +150,35 @@ class OwTrackerDiscordCommands(app_commands.Group):
     async def hero_autocomplete(
             self, interaction: discord.Interaction,
             current: str) -> typing.List[app_commands.Choice[str]]:
-        hero_choices = [
-            v for v in OwTrackerDiscordCommands.HERO_CHOICES
-            if self.autocomplete_role is None
-            or HEROES[v.value] == self.autocomplete_role
-        ]
+        if self.autocomplete_role is None:
+            hero_index = HERO_INDEX
+        else:
+            hero_index = HERO_INDEXES_BY_ROLE[self.autocomplete_role]
         # This is a workaround to make hero_autocomplete accept an optional role.
         self.autocomplete_role = None
 
-        # Get the edit distance between the current string and heroes. Subtract
-        # out the difference between the hero name and current string to account
-        # for extra characters.
-        hero_edit_distance = {
-            hero: customEditDistance(hero, current)
-            for hero, _ in HEROES.items()
-        }
-
         # Get the usage rate of the heroes
         hero_usage = self.ow_tracker_manager.getHeroUsage(interaction.user.id)
 
         # The heroes are sorted by (hero edit distance ascending, hero usage descending, hero name ascending)
-        hero_choices.sort(key=lambda hero: (hero_edit_distance[
-            hero.value], -hero_usage.get(hero.value, 0.0), hero.value))
-
-        if len(hero_choices) > AUTOCOMPLETE_LIMIT:
-            hero_choices = hero_choices[:AUTOCOMPLETE_LIMIT]
-
-        return hero_choices
+        return [
+            app_commands.Choice(name=hero, value=hero)
+            for _, hero in await self.autocomplete_sessions.topKAsync(
+                (interaction.user.id, interaction.command.qualified_name, 'hero'),
+                current, hero_index, AUTOCOMPLETE_LIMIT,
+                tiebreak=lambda hero: (-hero_usage.get(hero, 0.0), hero))
+        ]
 
     async def stadium_hero_autocomplete(
             self, interaction: discord.Interaction,
             current: str) -> typing.List[app_commands.Choice[str]]:
-        hero_choices = [
-            v for v in OwTrackerDiscordCommands.HERO_CHOICES
-            if v.value in STADIUM_HEROES.keys()
-        ]
-
-        # Get the edit distance between the current string and heroes.
-        hero_edit_distance = {
-            hero: customEditDistance(hero, current)
-            for hero, _ in STADIUM_HEROES.items()
-        }
-
         # The heroes are sorted by (hero edit distance ascending, hero name ascending)
-        hero_choices.sort(key=lambda hero: (hero_edit_distance[hero.value], hero.value))
-
-        if len(hero_choices) > AUTOCOMPLETE_LIMIT:
-            hero_choices = hero_choices[:AUTOCOMPLETE_LIMIT]
-
-        return hero_choices
+        return [
+            app_commands.Choice(name=hero, value=hero)
+            for _, hero in await self.autocomplete_sessions.topKAsync(
+                (interaction.user.id, interaction.command.qualified_name, 'hero'),
+                current, STADIUM_HERO_INDEX, AUTOCOMPLETE_LIMIT)
+        ]
 
     async def power_autocomplete(
             self, interaction: discord.Interaction,
@@ -191,26 +187,16 @@ class OwTrackerDiscordCommands(app_commands.Group):
         logging.info(f'power_autocomplete: interaction.namespace["hero"] = "{current_hero}"')
 
         if current_hero in STADIUM_HEROES:
-            powers = [power for power in STADIUM_HEROES[current_hero]]
+            power_index = STADIUM_POWER_INDEXES[current_hero]
         else:
-            powers = [power for _, powers in STADIUM_HEROES for power in powers]
-
+            power_index = ALL_STADIUM_POWER_INDEX
 
-        power_choices = [
+        return [
             app_commands.Choice(name=power, value=power)
-            for power in powers
+            for _, power in await self.autocomplete_sessions.topKAsync(
+                (interaction.user.id, interaction.command.qualified_name, 'power'),
+                current, power_index, AUTOCOMPLETE_LIMIT)
         ]
-        power_edit_distances = {
-            power: customEditDistance(power, current)
-            for power in powers
-        }
-
-        power_choices.sort(key=lambda power: (power_edit_distances[power.value], power.value))
-
-        if len(power_choices) > AUTOCOMPLETE_LIMIT:
-            power_choices = power_choices[:AUTOCOMPLETE_LIMIT]
-
-        return power_choices
 
     @app_commands.command(name='add-win', description='Record win')
     @app_commands.describe(
@@ -822,11 +808,30 @@ class OwTrackerDiscordCommands(app_commands.Group):
         ]
 
 
+# TODO Remove this debug code. This is to migrate the goal from a single int to an object.
+def migrateOwTracker(owt):
+    if not hasattr(owt, 'weekly_tracker') or owt.weekly_tracker is None:
+        return
+    for week in [owt.weekly_tracker.current_week] + owt.weekly_tracker.previous_weeks:
+        if week is None:
+            continue
+        # Handle case where week goal might be uninitialized
+        if week.goal is not None and isinstance(week.goal, int):
+            week.goal = Goal(week.goal)
+        if not hasattr(week, 'skipped'):
+            week.skipped = False
+
+
 class OverwatchTrackerManager: 
 
-    def __init__(self, ow_tracker_fname=OW_TRACKER_FILENAME, event_calendar=None, discord_client=None):
+    # ow_tracker_fname is the file that all of the trackers used to be pickled to. It's split into a file per user in
+    # ow_tracker_dirname, which defaults to ow_tracker_fname without its extension.
+    def __init__(self, ow_tracker_fname=OW_TRACKER_FILENAME, event_calendar=None, discord_client=None, ow_tracker_dirname=None):
         self.discord_client = discord_client
         self.ow_tracker_fname = ow_tracker_fname
+        if ow_tracker_dirname is None:
+            ow_tracker_dirname = os.path.splitext(ow_tracker_fname)[0]
+        self.ow_tracker_dirname = ow_tracker_dirname
         self.loadTrackersFromFile()
 
         self.event_calendar = event_calendar
@@ -838,105 +843,164 @@ class OverwatchTrackerManager:
     def getDiscordCommands(self):
         return [OwTrackerDiscordCommands(self)]
 
+    # Only lists the users that have a tracker, each one is loaded by _getOwTrackerForUser the first time it's used.
     # TODO make this async
     def loadTrackersFromFile(self):
-        # If file does not exist, then init self.overwatch_trackers to empty dict
-        if not os.path.exists(self.ow_tracker_fname):
-            self.overwatch_trackers = {}
-            self.saveTrackersToFile()
-            return
-
-        f = open(self.ow_tracker_fname, 'rb')
-        self.overwatch_trackers = pickle.load(f)
-
-        # TODO Remove this debug code. This is to migrate the goal from a single int to an object.
-        for _, owt in self.overwatch_trackers.items():
-            if not hasattr(owt, 'weekly_tracker') or owt.weekly_tracker is None:
-                continue
-            for week in [owt.weekly_tracker.current_week] + owt.weekly_tracker.previous_weeks:
-                if week is None:
-                    continue
-                # Handle case where week goal might be uninitialized
-                if week.goal is not None and isinstance(week.goal, int):
-                    week.goal = Goal(week.goal)
-                if not hasattr(week, 'skipped'):
-                    week.skipped = False
-
+        # Key is user_id, value is the OverwatchTracker of every user that has been loaded or created so far.
+        self.overwatch_trackers = {}
+        if not os.path.exists(self.ow_tracker_dirname):
+            self._splitTrackersFile()
+        self.tracker_user_ids = set(
+            self._userIdFromTrackerFilename(fname)
+            for fname in os.listdir(self.ow_tracker_dirname)
+            if fname.endswith('.pickle'))
+
+    # Copies the trackers from ow_tracker_fname to a file per user. The directory is filled in next to its final
+    # location, so a failed split is retried from scratch.
+    def _splitTrackersFile(self):
+        tmp_dirname = self.ow_tracker_dirname + '.tmp'
+        if os.path.exists(tmp_dirname):
+            shutil.rmtree(tmp_dirname)
+        os.makedirs(tmp_dirname)
+        if os.path.exists(self.ow_tracker_fname):
+            with open(self.ow_tracker_fname, 'rb') as f:
+                overwatch_trackers = pickle.load(f)
+            for user_id, owt in overwatch_trackers.items():
+                migrateOwTracker(owt)
+                self._writeTracker(self._trackerFilename(user_id, tmp_dirname), owt)
+            # They're already loaded, so keep them.
+            self.overwatch_trackers = overwatch_trackers
+        os.replace(tmp_dirname, self.ow_tracker_dirname)
+
+    def _trackerFilename(self, user_id, dirname=None):
+        if dirname is None:
+            dirname = self.ow_tracker_dirname
+        return os.path.join(dirname, '{}.pickle'.format(user_id))
+
+    # User ids are ints, except in tests.
+    def _userIdFromTrackerFilename(self, fname):
+        user_id = fname[:-len('.pickle')]
+        return int(user_id) if user_id.isdigit() else user_id
+
+    # Write to a temporary file and then replace the old one, so a crash can't leave a partially written tracker.
+    def _writeTracker(self, fname, owt):
+        tmp_fname = fname + '.tmp'
+        with open(tmp_fname, 'wb') as f:
+            pickle.dump(owt, f)
+        os.replace(tmp_fname, fname)
+
+    # Saves just the tracker of user_id, so a change costs I/O proportional to that user's history.
     # TODO make this async
     # TODO Add a lock for this
-    def saveTrackersToFile(self):
-        f = open(self.ow_tracker_fname, 'wb')
-        pickle.dump(self.overwatch_trackers, f)
+    def saveTrackerToFile(self, user_id):
+        self._writeTracker(self._trackerFilename(user_id), self.overwatch_trackers[user_id])
+        self.tracker_user_ids.add(user_id)
 
     def addGame(self, user_id, overwatch_game):
         overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
         rv = overwatch_tracker.addGame(overwatch_game)
-        self.saveTrackersToFile()
+        self.saveTrackerToFile(user_id)
         return rv
 
+    # Like updateGame, this only changes a tracker that has a selected game, so it doesn't create one.
     def addHeroToSelectedGame(self, user_id, hero, weight):
-        overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return None
         result = overwatch_tracker.addHeroToSelectedGame(hero, weight)
         if result is not None:
-            self.saveTrackersToFile()
+            self.saveTrackerToFile(user_id)
         return result
 
+    # Methods that only read a tracker use _getOwTrackerForUser, so that users without one don't get an empty one.
     def getGamesFromPastDays(self, user_id, num_days=7):
-        overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return []
         return overwatch_tracker.getGamesFromPastDays(num_days=num_days)
 
     def getRecentGames(self, user_id, num_games=10):
-        overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return []
         return overwatch_tracker.getRecentGames(num_games=num_games)
 
     def selectGame(self, user_id, game_ind):
-        overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return None
         return overwatch_tracker.selectGame(game_ind)
 
     def updateGame(self, user_id, result, map, hero, weight, season):
-        overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return None
         updated_game = overwatch_tracker.updateGame(result, map, hero, weight,
                                                     season)
         if updated_game is not None:
-            self.saveTrackersToFile()
+            self.saveTrackerToFile(user_id)
         return updated_game
 
-    def _getOrCreateOwTrackerForUser(self, user_id):
+    # Returns None if the user doesn't have a tracker.
+    def _getOwTrackerForUser(self, user_id):
         if user_id not in self.overwatch_trackers:
-            self.overwatch_trackers[user_id] = OverwatchTracker()
+            if user_id not in self.tracker_user_ids:
+                return None
+            with open(self._trackerFilename(user_id), 'rb') as f:
+                owt = pickle.load(f)
+            migrateOwTracker(owt)
+            self.overwatch_trackers[user_id] = owt
         return self.overwatch_trackers[user_id]
 
+    # Only the methods that save the tracker right after should create one.
+    def _getOrCreateOwTrackerForUser(self, user_id):
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            overwatch_tracker = OverwatchTracker()
+            self.overwatch_trackers[user_id] = overwatch_tracker
+        return overwatch_tracker
+
     def getSeason(self, user_id):
-        overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return OverwatchTracker.DEFAULT_SEASON
         return overwatch_tracker.season
 
     def updateSeason(self, user_id, new_season):
         overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
         season_changed = overwatch_tracker.updateSeason(new_season)
         if season_changed:
-            self.saveTrackersToFile()
+            self.saveTrackerToFile(user_id)
 
     def getHeroUsage(self, user_id):
-        return self._getOrCreateOwTrackerForUser(user_id).getHeroUsage()
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return {}
+        return overwatch_tracker.getHeroUsage()
 
     def getHeroUsageByResult(self, user_id):
-        return self._getOrCreateOwTrackerForUser(
-            user_id).getHeroUsageByResult()
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return {}
+        return overwatch_tracker.getHeroUsageByResult()
 
     def getSelectedRole(self, user_id):
-        if user_id not in self.overwatch_trackers:
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
             return None
-        return self._getOrCreateOwTrackerForUser(user_id).getSelectedRole()
+        return overwatch_tracker.getSelectedRole()
 
     def getWeeklyTracker(self, user_id):
-        if user_id not in self.overwatch_trackers:
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
             return None
-        return self._getOrCreateOwTrackerForUser(user_id).getWeeklyTracker()
+        return overwatch_tracker.getWeeklyTracker()
 
     def getWeeklyGoal(self, user_id):
-        if user_id not in self.overwatch_trackers:
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
             return None
-        return self._getOrCreateOwTrackerForUser(user_id).getWeeklyGoal()
+        return overwatch_tracker.getWeeklyGoal()
     
     def setWeeklyGoal(self, user_id, new_weekly_goal=None, skip=None):
         tracker = self._getOrCreateOwTrackerForUser(user_id)
@@ -948,13 +1012,19 @@ class OverwatchTrackerManager:
                 tracker.weekly_tracker = WeeklyTracker()
                 weekly_tracker = tracker.weekly_tracker
             weekly_tracker.getCurrentWeek().skipped = skip
-        self.saveTrackersToFile()
+        self.saveTrackerToFile(user_id)
 
     def getCurrentWeeklyGoalStatus(self, user_id):
-        return self._getOrCreateOwTrackerForUser(user_id).getCurrentWeeklyGoal()
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return None
+        return overwatch_tracker.getCurrentWeeklyGoal()
 
     async def upateWeeklyChallenge(self):
-        for user_id, tracker in self.overwatch_trackers.items():
+        # This goes through every user, so the trackers that it loads are dropped again once it's done with them.
+        for user_id in list(self.tracker_user_ids | self.overwatch_trackers.keys()):
+            was_loaded = user_id in self.overwatch_trackers
+            tracker = self._getOwTrackerForUser(user_id)
             weekly_tracker = tracker.getWeeklyTracker() 
 
             # Check the status of the weekly Goal
@@ -1037,12 +1107,18 @@ class OverwatchTrackerManager:
                 except Exception as e:
                     print(f'Got exception when trying to send message:\n{str(e)}')
                     msg += f'\n\nGot the following exception when trying to advance week: {str(e)}'
+                # Only advancing the week changes the tracker.
+                self.saveTrackerToFile(user_id)
             else:
                 days_left = 1 - now.weekday()
                 if days_left <= 0:
                     days_left += 7
                 msg += f'\n\nThere {"are" if days_left != 1 else "is"} {days_left} day{"s" if days_left != 1 else ""} left in this week.'
 
+            # Any change was saved above, and the message doesn't need the tracker anymore.
+            if not was_loaded:
+                self.overwatch_trackers.pop(user_id, None)
+
             print(f'Trying to send the following msg:\n"{msg}"')
 
             # Send message directly to the user
@@ -1052,7 +1128,6 @@ class OverwatchTrackerManager:
             except Exception as e:
                 print(f'Got exception when trying to send message:\n{str(e)}')
 
-        self.saveTrackersToFile()
         return EC.Event(self.getNextWeeklyGoalEventTime(), self.upateWeeklyChallenge)
 
     def getNextWeeklyGoalEventTime(self, everyday = True):
@@ -1076,24 +1151,29 @@ class OverwatchTrackerManager:
         return et
     
     def recomputeWeeklyGoals(self, user_id):
-        if user_id not in self.overwatch_trackers:
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
             return None
-        return self._getOrCreateOwTrackerForUser(user_id).recomputeWeeklyGoals()
+        return overwatch_tracker.recomputeWeeklyGoals()
 
     # Stadium
     def addStadiumGame(self, user_id, stadium_game):
         overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
         rv = overwatch_tracker.addStadiumGame(stadium_game)
-        self.saveTrackersToFile()
+        self.saveTrackerToFile(user_id)
         return rv
 
     def getStadiumGamesFromPastDays(self, user_id, num_days=7):
-        overwatch_tracker = self._getOrCreateOwTrackerForUser(user_id)
+        overwatch_tracker = self._getOwTrackerForUser(user_id)
+        if overwatch_tracker is None:
+            return []
         return overwatch_tracker.getStadiumGamesFromPastDays(num_days=num_days)
 
 
 # Tracks OW games for a single person
 class OverwatchTracker:
+    # The season of a tracker that hasn't had its season set yet.
+    DEFAULT_SEASON = -1
 
     def __init__(self):
         # List of OverwatchGames (regular comp)
@@ -1108,7 +1188,7 @@ class OverwatchTracker:
         self.selected_stadium_game = None
 
         # Season is shared between Regular comp + Stadium
-        self.season = -1
+        self.season = OverwatchTracker.DEFAULT_SEASON
 
         # Tracker for weekly goal of number of games.
         self.weekly_tracker = WeeklyTracker()
@@ -1711,34 +1791,15 @@ class HeroChallengeDiscordCommands(app_commands.Group):
     DATE_REGEX = re.compile(
         r'^(?P<month>\d{1,2})\/(?P<day>\d{1,2})(?:\/(?P<year>\d{2}|\d{4}))?$')
 
-    HERO_CHOICES = [
-        app_commands.Choice(name=hero, value=hero)
-        for hero, _ in HEROES.items()
-    ]
-
     async def hero_autocomplete(
             self, interaction: discord.Interaction,
             current: str) -> typing.List[app_commands.Choice[str]]:
-        hero_choices = [
-            v for v in HeroChallengeDiscordCommands.HERO_CHOICES
+        # The heroes are sorted by (hero edit distance ascending, hero name ascending)
+        return [
+            app_commands.Choice(name=hero, value=hero)
+            for _, hero in await edit_distance.top_k_async(current, HERO_INDEX, AUTOCOMPLETE_LIMIT)
         ]
 
-        # Get the edit distance between the current string and heroes. Subtract
-        # out the difference between the hero name and current string to account
-        # for extra characters.
-        hero_edit_distance = {
-            hero: customEditDistance(hero, current)
-            for hero, _ in HEROES.items()
-        }
-
-        # The heroes are sorted by (hero edit distance ascending, hero usage descending, hero name ascending)
-        hero_choices.sort(key=lambda hero: (hero_edit_distance[hero.value], hero.value))
-
-        if len(hero_choices) > AUTOCOMPLETE_LIMIT:
-            hero_choices = hero_choices[:AUTOCOMPLETE_LIMIT]
-
-        return hero_choices
-
     @app_commands.command(
         name='random-heroes',
         description='Gives some random heroes for the hero challenge.',
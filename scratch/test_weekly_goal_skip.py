@@ -1,6 +1,7 @@
 import os
 import sys
 import pickle
+import shutil
 from datetime import datetime, timedelta
 import pytz
 
@@ -144,8 +145,12 @@ def test_pickle_migration():
             self.season = 3
             
     test_fname = "scratch/test_ow_tracker.pickle"
+    # The manager splits test_fname into a file per user in this directory.
+    test_dirname = "scratch/test_ow_tracker"
     if os.path.exists(test_fname):
         os.remove(test_fname)
+    if os.path.exists(test_dirname):
+        shutil.rmtree(test_dirname)
         
     old_data = {"test_user": OldOverwatchTracker()}
     with open(test_fname, "wb") as f:
@@ -155,15 +160,17 @@ def test_pickle_migration():
     manager = OverwatchTrackerManager(ow_tracker_fname=test_fname)
     
     # Verify skipped has been initialized to False on loaded weeks
-    owt = manager.overwatch_trackers["test_user"]
+    owt = manager._getOwTrackerForUser("test_user")
     assert hasattr(owt.weekly_tracker.current_week, "skipped"), "current_week should have skipped field"
     assert owt.weekly_tracker.current_week.skipped is False, "current_week.skipped should be False"
     assert hasattr(owt.weekly_tracker.previous_weeks[0], "skipped"), "previous_week should have skipped field"
     assert owt.weekly_tracker.previous_weeks[0].skipped is False, "previous_week.skipped should be False"
     
-    # Clean up test file
+    # Clean up test files
     if os.path.exists(test_fname):
         os.remove(test_fname)
+    if os.path.exists(test_dirname):
+        shutil.rmtree(test_dirname)
         
     print("test_pickle_migration passed!")
 
@@ -0,0 +1,168 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.append('.')
+import edit_distance
+
+# Run from the repo root, e.g.:
+#   python scripts/benchmark_edit_distance.py --sizes 1000 10000 --output before.json
+
+OW_DATA_FILENAME = 'data/overwatch_data.json'
+
+EDIT_DISTANCE_TYPES = {
+    'SIMPLE': edit_distance.Options.SIMPLE,
+    'WORD': edit_distance.Options.WORD,
+}
+CHAR_DISTANCE_TYPES = {
+    'CHAR_EQUALITY': edit_distance.Options.CHAR_EQUALITY,
+    'CHAR_KEYBORAD_DISTANCE': edit_distance.Options.CHAR_KEYBORAD_DISTANCE,
+}
+
+RESTAURANT_ADJECTIVES = [
+    'Golden', 'Little', 'Happy', 'Lucky', 'Royal', 'Blue', 'Red', 'Old Town', 'Corner', 'Sunny', 'Spicy', 'Urban',
+    'Mama\'s', 'Big', 'Hidden', 'Jade', 'Silver', 'Rustic', 'Fresh', 'Smoky',
+]
+RESTAURANT_CUISINES = [
+    'Pho', 'Taco', 'Pizza', 'Burger', 'Noodle', 'Sushi', 'Curry', 'Dumpling', 'Ramen', 'BBQ', 'Bagel', 'Bistro',
+    'Teriyaki', 'Falafel', 'Gyro', 'Crepe', 'Poke', 'Banh Mi', 'Dim Sum', 'Tandoori',
+]
+RESTAURANT_SUFFIXES = ['House', 'Kitchen', 'Express', 'Cafe', 'Grill', 'Bar', 'Place', 'Shop', 'Garden', 'Palace']
+COMMAND_WORDS = [
+    'hello', 'gg', 'rules', 'schedule', 'meme', 'clip', 'stream', 'discord', 'help', 'rank', 'team', 'scrim', 'vod',
+    'patch', 'tier', 'list', 'comp', 'map', 'pool', 'bans', 'cat', 'dog', 'lol', 'hype', 'pog', 'sad', 'win', 'loss',
+]
+QUERY_CHARS = 'abcdefghijklmnopqrstuvwxyz '
+
+
+def make_restaurant_corpus(size, rng):
+    names = set()
+    while len(names) < size:
+        name = f'{rng.choice(RESTAURANT_ADJECTIVES)} {rng.choice(RESTAURANT_CUISINES)} {rng.choice(RESTAURANT_SUFFIXES)}'
+        if len(names) >= len(RESTAURANT_ADJECTIVES) * len(RESTAURANT_CUISINES) * len(RESTAURANT_SUFFIXES) // 2:
+            # Number the names once the combinations start to run out, like chains with many locations.
+            name = f'{name} {rng.randint(1, size)}'
+        names.add(name)
+    return sorted(names)
+
+
+def make_command_corpus(size, rng):
+    names = set()
+    while len(names) < size:
+        words = rng.sample(COMMAND_WORDS, rng.randint(1, 3))
+        if rng.random() < 0.5:
+            words.append(str(rng.randint(1, size)))
+        names.add(rng.choice(['-', '_', ' ']).join(words))
+    return sorted(names)
+
+
+# Queries look like autocomplete input: a prefix of a real candidate, sometimes with a typo.
+def make_queries(corpus, num_queries, rng):
+    queries = []
+    for _ in range(num_queries):
+        candidate = rng.choice(corpus)
+        query = list(candidate[:rng.randint(1, len(candidate))].lower())
+        if len(query) > 2 and rng.random() < 0.5:
+            query[rng.randrange(len(query))] = rng.choice(QUERY_CHARS)
+        queries.append(''.join(query))
+    return queries
+
+
+def load_corpora(sizes, rng):
+    with open(OW_DATA_FILENAME, 'r', encoding='utf-8') as f:
+        ow_data = json.load(f)
+
+    corpora = {
+        'maps': list(ow_data['MAPS']),
+        'heroes': list(ow_data['HEROES']),
+    }
+    for size in sizes:
+        corpora[f'restaurants_{size}'] = make_restaurant_corpus(size, rng)
+        corpora[f'commands_{size}'] = make_command_corpus(size, rng)
+    return corpora
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'queries': len(latencies),
+        'throughput_qps': len(latencies) / total if total > 0 else None,
+        'p50_ms': 1000 * statistics.median(latencies),
+        'p99_ms': 1000 * latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+        'max_ms': 1000 * latencies[-1],
+    }
+
+
+def run_benchmark(corpus, queries, options, k):
+    start = time.perf_counter()
+    index = edit_distance.AutocompleteIndex(corpus, options, candidates_first=True)
+    build_seconds = time.perf_counter() - start
+
+    results = {'candidates': len(corpus), 'build_ms': 1000 * build_seconds}
+    methods = {
+        'top_k': lambda query: edit_distance.top_k(query, index, k),
+        'scores': lambda query: index.scores(query),
+    }
+    for method_name, method in methods.items():
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            method(query)
+            latencies.append(time.perf_counter() - start)
+        results[method_name] = summarize(latencies)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks edit_distance autocomplete scoring and prints JSON results.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Sizes of the synthetic restaurant and command corpora.')
+    parser.add_argument('--queries', type=int, default=20, help='Number of queries per corpus.')
+    parser.add_argument('--k', type=int, default=edit_distance.AUTOCOMPLETE_LIMIT, help='Number of results per query.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='File to write the JSON results to, instead of stdout.')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpora = load_corpora(args.sizes, rng)
+
+    benchmarks = []
+    for corpus_name, corpus in corpora.items():
+        queries = make_queries(corpus, args.queries, rng)
+        for edit_distance_name, edit_distance_type in EDIT_DISTANCE_TYPES.items():
+            for char_distance_name, char_distance_type in CHAR_DISTANCE_TYPES.items():
+                options = edit_distance.Options(edit_distance_type, char_distance_type)
+                print(f'Running {corpus_name} {edit_distance_name} {char_distance_name}...', file=sys.stderr)
+                result = run_benchmark(corpus, queries, options, args.k)
+                result.update({
+                    'corpus': corpus_name,
+                    'edit_distance_type': edit_distance_name,
+                    'char_distance_type': char_distance_name,
+                })
+                benchmarks.append(result)
+
+    output = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'args': vars(args),
+        'benchmarks': benchmarks,
+    }
+    if args.output is None:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()